@@ -0,0 +1,20 @@
+# accounts/backends.py
+
+from django.contrib.auth.backends import ModelBackend
+
+from .models import User
+from .roles import PROFILE_RELATIONS
+
+
+class ProfileBackend(ModelBackend):
+    """
+    ModelBackend whose per-request user load also fetches both profiles,
+    so dashboards and role checks (accounts.roles) need no second user query.
+    """
+
+    def get_user(self, user_id):
+        try:
+            user = User._default_manager.select_related(*PROFILE_RELATIONS).get(pk=user_id)
+        except User.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
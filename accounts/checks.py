@@ -0,0 +1,8 @@
+# accounts/checks.py
+
+from pointRide.checks import require_shared_cache
+
+require_shared_cache(
+    'RATELIMIT_CACHE', 'accounts.E001',
+    "each worker would keep its own buckets, multiplying every limit by the number of workers",
+)
@@ -0,0 +1,126 @@
+# accounts/health.py
+
+"""
+Liveness, readiness and platform statistics.
+
+Liveness never touches the database. Readiness runs SELECT 1 on a
+dedicated worker thread so a hung database turns into a fast 503 instead
+of a hung probe. Platform stats are computed in one aggregate query and
+cached for STATS_TTL seconds; only one caller at a time refreshes them, the
+rest get the previous rollup.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count, Q
+
+from .models import User
+
+STARTED_AT = time.time()
+
+STATS_KEY = 'accounts.health.stats'
+STATS_LOCK_KEY = STATS_KEY + '.refreshing'
+
+# A single worker keeps at most one probe query in flight
+_probe_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='readyz')
+_probe_lock = threading.Lock()
+_pending_probe = None
+
+
+def stats_ttl():
+    return getattr(settings, 'PLATFORM_STATS_TTL', 60)
+
+
+def readiness_timeout():
+    return getattr(settings, 'READINESS_TIMEOUT', 2.0)
+
+
+def liveness():
+    """Process state only"""
+    return {
+        'status': 'ok',
+        'pid': os.getpid(),
+        'uptime_seconds': round(time.time() - STARTED_AT, 1),
+    }
+
+
+def _select_one():
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                timeout_ms = int(readiness_timeout() * 1000)
+                cursor.execute('SET statement_timeout = %s', [timeout_ms])
+            cursor.execute('SELECT 1')
+            return cursor.fetchone()[0] == 1
+    except Exception:
+        # Drop a broken connection so the next probe reconnects
+        connection.close()
+        raise
+
+
+def check_database(timeout=None):
+    """(ok, error) for SELECT 1 finishing within timeout seconds"""
+    global _pending_probe
+    timeout = readiness_timeout() if timeout is None else timeout
+
+    with _probe_lock:
+        if _pending_probe is not None and not _pending_probe.done():
+            return False, 'previous check still running'
+        _pending_probe = future = _probe_pool.submit(_select_one)
+
+    try:
+        return future.result(timeout=timeout), None
+    except FutureTimeout:
+        return False, f'timed out after {timeout}s'
+    except Exception as e:
+        return False, str(e)
+
+
+def compute_stats():
+    """User and ride counts in two aggregate queries"""
+    from rides.lifecycle import OPEN_RIDE_STATUSES
+    from rides.models import Ride
+
+    users = User.objects.aggregate(
+        users=Count('id'),
+        drivers=Count('id', filter=Q(is_driver=True)),
+        travellers=Count('id', filter=Q(is_traveller=True)),
+    )
+    rides = Ride.objects.aggregate(
+        rides=Count('id'),
+        open_rides=Count('id', filter=Q(status__in=OPEN_RIDE_STATUSES)),
+    )
+    return {**users, **rides}
+
+
+def refresh_stats():
+    """Recompute and cache the rollup; returns it"""
+    stats = compute_stats()
+    cache.set(STATS_KEY, (time.time(), stats), timeout=None)
+    return stats
+
+
+def platform_stats():
+    """
+    Cached rollup as (stats, computed_at).
+
+    A stale rollup is refreshed by whichever request takes the refresh lock;
+    concurrent requests keep serving the old numbers meanwhile.
+    """
+    cached = cache.get(STATS_KEY)
+    if cached is not None:
+        computed_at, stats = cached
+        if time.time() - computed_at < stats_ttl() or not cache.add(STATS_LOCK_KEY, 1, timeout=30):
+            return stats, computed_at
+
+    try:
+        stats = refresh_stats()
+    finally:
+        cache.delete(STATS_LOCK_KEY)
+    return stats, time.time()
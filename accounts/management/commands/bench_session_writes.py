@@ -0,0 +1,55 @@
+# accounts/management/commands/bench_session_writes.py
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounts.models import User
+
+ENGINES = [
+    ('before', 'django.contrib.sessions.backends.db'),
+    ('after', 'accounts.sessions'),
+]
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Count django_session writes per N logged-in page views, before and after write coalescing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        for label, engine in ENGINES:
+            writes = self.measure(engine, options['requests'])
+            self.stdout.write(f'{label:<7} {engine:<40} {writes:>5} writes / {options["requests"]} requests')
+
+    def measure(self, engine, requests):
+        """Run the requests inside a transaction that is rolled back afterwards"""
+        writes = 0
+        try:
+            with transaction.atomic(), override_settings(
+                SESSION_ENGINE=engine, SESSION_SAVE_EVERY_REQUEST=True, ALLOWED_HOSTS=['testserver'],
+            ):
+                User.objects.create_user(username='session-bench', password='session-bench',
+                                         full_legal_name='Session Bench')
+                client = Client()
+                client.login(username='session-bench', password='session-bench')
+                url = reverse('home')
+
+                with CaptureQueriesContext(connection) as queries:
+                    for _ in range(requests):
+                        client.get(url)
+                writes = sum(
+                    1 for query in queries
+                    if 'django_session' in query['sql'] and query['sql'].lstrip().upper().startswith(('INSERT', 'UPDATE'))
+                )
+                raise Rollback
+        except Rollback:
+            pass
+        return writes
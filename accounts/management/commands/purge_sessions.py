@@ -0,0 +1,16 @@
+# accounts/management/commands/purge_sessions.py
+
+from django.core.management.base import BaseCommand, CommandError
+from accounts.sessions import SessionStore
+
+class Command(BaseCommand):
+    help = 'Delete expired sessions in small batches instead of one large DELETE'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        removed = SessionStore.clear_expired(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Removed {removed} expired session(s)'))
@@ -0,0 +1,17 @@
+# accounts/management/commands/ratelimit_stats.py
+
+import json
+
+from django.core.management.base import BaseCommand
+
+# Importing the views registers their rate limit scopes
+import accounts.views  # noqa: F401
+import rides.views  # noqa: F401
+from pointRide.ratelimit import counters
+
+
+class Command(BaseCommand):
+    help = 'Print allowed/blocked request counters for each rate limit scope as JSON'
+
+    def handle(self, *args, **options):
+        self.stdout.write(json.dumps(counters(), indent=2, sort_keys=True))
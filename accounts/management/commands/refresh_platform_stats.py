@@ -0,0 +1,14 @@
+# accounts/management/commands/refresh_platform_stats.py
+
+import json
+
+from django.core.management.base import BaseCommand
+
+from accounts.health import refresh_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the cached platform stats rollup (run from cron to keep /accounts/health/ warm)'
+
+    def handle(self, *args, **options):
+        self.stdout.write(json.dumps(refresh_stats(), sort_keys=True))
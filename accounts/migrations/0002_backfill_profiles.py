@@ -0,0 +1,41 @@
+# Profiles used to be created lazily by login and the dashboards; they are now
+# only created at registration, so make sure every existing user has theirs.
+
+from django.db import migrations
+
+
+def create_missing_profiles(apps, schema_editor):
+    User = apps.get_model('accounts', 'User')
+    DriverProfile = apps.get_model('accounts', 'DriverProfile')
+    TravellerProfile = apps.get_model('accounts', 'TravellerProfile')
+
+    drivers = User.objects.filter(is_driver=True, driver_profile__isnull=True).only('id', 'username')
+    DriverProfile.objects.bulk_create([
+        DriverProfile(
+            user_id=user.id,
+            account_status='PENDING',
+            license_number='PENDING_VERIFICATION',
+            vehicle_make='Not Specified',
+            vehicle_model='Not Specified',
+            vehicle_year=2020,
+            vehicle_registration_number=f'TEMP_{user.id}_{user.username}',
+        )
+        for user in drivers.iterator()
+    ], batch_size=1000)
+
+    travellers = User.objects.filter(is_traveller=True, traveller_profile__isnull=True).values_list('id', flat=True)
+    TravellerProfile.objects.bulk_create(
+        [TravellerProfile(user_id=user_id) for user_id in travellers.iterator()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_missing_profiles, migrations.RunPython.noop),
+    ]
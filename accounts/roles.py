@@ -0,0 +1,77 @@
+# accounts/roles.py
+
+from django.core.exceptions import ObjectDoesNotExist
+
+from .models import User, DriverProfile, TravellerProfile
+
+PROFILE_RELATIONS = ('driver_profile', 'traveller_profile')
+
+
+def _related_or_none(user, name):
+    """Reverse one-to-one profile already fetched by select_related, or None"""
+    try:
+        return getattr(user, name)
+    except ObjectDoesNotExist:
+        return None
+
+
+def build_role_info(user):
+    """Role information for a user whose profiles were loaded with select_related"""
+    driver_profile = _related_or_none(user, 'driver_profile')
+    traveller_profile = _related_or_none(user, 'traveller_profile')
+
+    return {
+        'user': user,
+        'is_driver': user.is_driver,
+        'is_traveller': user.is_traveller,
+        'has_driver_profile': driver_profile is not None,
+        'has_traveller_profile': traveller_profile is not None,
+        'driver_profile': driver_profile,
+        'traveller_profile': traveller_profile,
+    }
+
+
+def ensure_profiles(user):
+    """
+    Create the profiles a user's roles need but that are missing, e.g. for
+    users made in the admin or given a role after registration. No queries
+    when the profiles were loaded with select_related and exist.
+    """
+    if user.is_traveller and _related_or_none(user, 'traveller_profile') is None:
+        user.traveller_profile, _ = TravellerProfile.objects.get_or_create(user=user)
+    if user.is_driver and _related_or_none(user, 'driver_profile') is None:
+        user.driver_profile, _ = DriverProfile.objects.get_or_create(
+            user=user, defaults={'account_status': 'PENDING'}
+        )
+
+
+def load_user_with_profiles(user_id):
+    """User plus both profiles in a single query"""
+    return User.objects.select_related(*PROFILE_RELATIONS).get(pk=user_id)
+
+
+def load_role_info(request):
+    """
+    Role information for the logged-in user, memoized on the request.
+
+    The auth middleware's user load already fetches the profiles
+    (accounts.backends.ProfileBackend), so this normally runs no query. A
+    user loaded without them, e.g. from a session made through another
+    backend, is reloaded once with select_related and request.user is
+    swapped for it. A profile missing for one of the user's roles is created
+    (ensure_profiles). Returns None for anonymous users.
+    """
+    if hasattr(request, '_role_info'):
+        return request._role_info
+
+    role_info = None
+    if request.user.is_authenticated:
+        user = request.user
+        if not all(getattr(User, name).is_cached(user) for name in PROFILE_RELATIONS):
+            user = load_user_with_profiles(user.pk)
+        ensure_profiles(user)
+        request.user = user
+        role_info = build_role_info(user)
+
+    request._role_info = role_info
+    return role_info
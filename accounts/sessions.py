@@ -0,0 +1,116 @@
+# accounts/sessions.py
+
+"""
+Session engine that coalesces writes.
+
+Reads go to the cache first and fall back to the database. Saves only hit the
+database when the session data changed or the stored expiry is about to run
+out, so SESSION_SAVE_EVERY_REQUEST keeps sliding the cookie without turning
+every page view into an UPDATE on django_session.
+
+Because the database expiry is only pushed forward once the remaining time
+drops below SESSION_REFRESH_THRESHOLD, an idle session can end up to that
+many seconds before the cookie does.
+
+The cache is only used when every worker shares it. With a per-process
+cache (LocMemCache) one worker would keep serving a session that another
+logged out or changed, so reads then go to the database every time and
+only the write coalescing remains.
+"""
+
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+from django.contrib.sessions.models import Session
+from django.utils import timezone
+
+from pointRide.checks import is_process_local
+
+KEY_PREFIX = 'accounts.sessions.'
+
+logger = logging.getLogger('django.contrib.sessions')
+
+
+def refresh_threshold():
+    """Seconds of remaining lifetime below which an unchanged session is re-saved"""
+    return getattr(settings, 'SESSION_REFRESH_THRESHOLD', settings.SESSION_COOKIE_AGE // 2)
+
+
+class SessionStore(CachedDBStore):
+    cache_key_prefix = KEY_PREFIX
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        self._stored_expiry = None  # expire_date of the row in the database
+
+    @property
+    def cache_is_shared(self):
+        return not is_process_local(settings.SESSION_CACHE_ALIAS)
+
+    def load(self):
+        # Cached entries are (data, expire_date) so the expiry is known without the DB
+        try:
+            cached = self._cache.get(self.cache_key) if self.session_key and self.cache_is_shared else None
+        except Exception:
+            cached = None
+
+        if cached is not None:
+            data, expiry = cached
+            if expiry > timezone.now():
+                self._stored_expiry = expiry
+                return data
+            self._session_key = None
+            return {}
+
+        s = self._get_session_from_db()
+        if s is None:
+            return {}
+        data = self.decode(s.session_data)
+        self._stored_expiry = s.expire_date
+        self._cache_set(data, s.expire_date)
+        return data
+
+    def needs_write(self):
+        """True if the database row is missing, stale or about to expire"""
+        if self.modified or self._stored_expiry is None:
+            return True
+        remaining = (self._stored_expiry - timezone.now()).total_seconds()
+        return remaining < refresh_threshold()
+
+    def save(self, must_create=False):
+        if self.session_key is not None and not must_create and not self.needs_write():
+            return
+        # Skip the parent's cache write; ours also records the expiry
+        super(CachedDBStore, self).save(must_create)
+        self._stored_expiry = self.get_expiry_date()
+        self._cache_set(self._session, self._stored_expiry)
+
+    def _cache_set(self, data, expiry):
+        if not self.cache_is_shared:
+            return
+        try:
+            self._cache.set(self.cache_key, (data, expiry), self.get_expiry_age(expiry=expiry))
+        except Exception:
+            logger.exception("Error saving to cache (%s)", self._cache)
+
+    async def aload(self):
+        return await sync_to_async(self.load)()
+
+    async def asave(self, must_create=False):
+        return await sync_to_async(self.save)(must_create)
+
+    @classmethod
+    def clear_expired(cls, batch_size=1000):
+        """Delete expired rows in primary-key batches; returns the number removed"""
+        removed = 0
+        now = timezone.now()
+        while True:
+            keys = list(
+                Session.objects.filter(expire_date__lt=now).values_list('session_key', flat=True)[:batch_size]
+            )
+            if not keys:
+                return removed
+            Session.objects.filter(session_key__in=keys).delete()
+            removed += len(keys)
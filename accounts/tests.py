@@ -1,3 +1,389 @@
-from django.test import TestCase
+# accounts/tests.py
 
-# Create your tests here.
+from django.test import TestCase, Client
+from django.urls import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from .models import User, DriverProfile, TravellerProfile
+
+
+class RoleLoaderTest(TestCase):
+    """Test profiles are loaded once per request and never created on login"""
+
+    def setUp(self):
+        """Set up test data"""
+        self.client = Client()
+        self.driver = User.objects.create_user(
+            username='testdriver',
+            password='testpass123',
+            full_legal_name='Test Driver',
+            is_driver=True,
+            is_traveller=False
+        )
+        DriverProfile.objects.create(user=self.driver, account_status='VERIFIED')
+
+    def profile_queries(self, queries):
+        return [q['sql'] for q in queries if 'accounts_driverprofile' in q['sql']]
+
+    def test_driver_dashboard_loads_profile_in_one_query(self):
+        """Test the auth middleware, the dashboard and its template share a single user query"""
+        self.client.login(username='testdriver', password='testpass123')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('accounts:driver_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['profile'].account_status, 'VERIFIED')
+
+        profile_queries = self.profile_queries(queries)
+        self.assertEqual(len(profile_queries), 1)
+        self.assertIn('JOIN', profile_queries[0])
+        user_queries = [q['sql'] for q in queries if 'FROM "accounts_user"' in q['sql']]
+        self.assertEqual(user_queries, profile_queries)  # The auth middleware's load is the only one
+
+    def test_login_does_not_touch_profiles(self):
+        """Test logging in no longer reads or creates profiles"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('accounts:login'), {
+                'username': 'testdriver',
+                'password': 'testpass123',
+                'login_role': 'driver',
+            })
+        self.assertRedirects(response, reverse('accounts:driver_dashboard'), fetch_redirect_response=False)
+        self.assertEqual(self.profile_queries(queries), [])
+        self.assertFalse(TravellerProfile.objects.filter(user=self.driver).exists())
+
+    def test_missing_profile_is_created_on_first_use(self):
+        """Test a driver without a profile (e.g. made in the admin) can still update it"""
+        User.objects.create_user(
+            username='admindriver', password='testpass123', full_legal_name='Admin Driver', is_driver=True
+        )
+        self.client.login(username='admindriver', password='testpass123')
+        response = self.client.post(reverse('accounts:update_driver'), {
+            'vehicle_make': 'Honda', 'vehicle_model': 'Civic', 'vehicle_year': 2021,
+        })
+        self.assertRedirects(response, reverse('accounts:edit_profile'), fetch_redirect_response=False)
+        profile = DriverProfile.objects.get(user__username='admindriver')
+        self.assertEqual((profile.account_status, profile.vehicle_make), ('PENDING', 'Honda'))
+
+
+class CoalescingSessionTest(TestCase):
+    """Test the write-coalescing session engine"""
+
+    def setUp(self):
+        """Set up a saved session behind a cache shared across processes (on disk)"""
+        import shutil
+        import tempfile
+        from django.core.cache import cache
+        from django.test import override_settings
+        from .sessions import SessionStore
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        shared = override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory},
+        })
+        shared.enable()
+        self.addCleanup(shared.disable)
+        cache.clear()
+        self.store_class = SessionStore
+        session = SessionStore()
+        session['cart'] = 'toronto-ottawa'
+        session.save()
+        self.session_key = session.session_key
+
+    def session_writes(self, queries):
+        return [q for q in queries if q['sql'].lstrip().upper().startswith(('INSERT', 'UPDATE'))]
+
+    def test_unchanged_session_is_not_written(self):
+        """Test reading and re-saving an unchanged session skips the database"""
+        session = self.store_class(self.session_key)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(session['cart'], 'toronto-ottawa')
+            session.save()
+        self.assertEqual(len(queries), 0)
+
+    def test_changed_or_expiring_session_is_written(self):
+        """Test changes and near-expiry sessions are persisted"""
+        from django.test import override_settings
+
+        session = self.store_class(self.session_key)
+        session['cart'] = 'barrie-toronto'
+        with CaptureQueriesContext(connection) as queries:
+            session.save()
+        self.assertEqual(len(self.session_writes(queries)), 1)
+
+        with override_settings(SESSION_REFRESH_THRESHOLD=10 ** 9):
+            session = self.store_class(self.session_key)
+            session.load()
+            with CaptureQueriesContext(connection) as queries:
+                session.save()
+        self.assertEqual(len(self.session_writes(queries)), 1)
+
+    def test_cache_miss_falls_back_to_database(self):
+        """Test sessions survive a cache flush"""
+        from django.core.cache import cache
+        cache.clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.store_class(self.session_key)['cart'], 'toronto-ottawa')
+
+    def test_process_local_cache_reads_the_database(self):
+        """Test a LocMemCache is bypassed, so a logout in one worker is seen by all"""
+        from django.test import override_settings
+
+        from django.contrib.sessions.models import Session
+
+        local = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with override_settings(CACHES=local):
+            session = self.store_class(self.session_key)
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(session['cart'], 'toronto-ottawa')
+                session.save()
+            self.assertEqual(len(queries), 1)  # Read from the database, still not rewritten
+
+            Session.objects.filter(session_key=self.session_key).delete()  # Logged out by another worker
+            self.assertNotIn('cart', self.store_class(self.session_key))
+
+    def test_clear_expired_in_batches(self):
+        """Test expired sessions are purged batch by batch"""
+        from datetime import timedelta
+        from django.contrib.sessions.models import Session
+        from django.utils import timezone
+
+        past = timezone.now() - timedelta(days=1)
+        Session.objects.bulk_create([
+            Session(session_key=f'expired{i}', session_data='', expire_date=past) for i in range(5)
+        ])
+        self.assertEqual(self.store_class.clear_expired(batch_size=2), 5)
+        self.assertTrue(Session.objects.filter(session_key=self.session_key).exists())
+
+    def test_page_views_do_not_write_sessions(self):
+        """Test logged-in page views stop writing once the session is stored"""
+        User.objects.create_user(username='reader', password='testpass123', full_legal_name='Reader')
+        self.client.login(username='reader', password='testpass123')
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(20):
+                self.client.get(reverse('home'))
+        self.assertEqual(
+            [q for q in self.session_writes(queries) if 'django_session' in q['sql']], []
+        )
+
+
+class RateLimitTest(TestCase):
+    """Test token-bucket rate limiting on login and the JSON APIs"""
+
+    def setUp(self):
+        """Start each test with empty buckets"""
+        from django.core.cache import cache
+        cache.clear()
+        User.objects.create_user(username='target', password='testpass123', full_legal_name='Target')
+
+    def attempt_login(self, username='target', ip='10.0.0.1'):
+        return self.client.post(
+            reverse('accounts:login'),
+            {'username': username, 'password': 'wrong', 'login_role': 'traveller'},
+            REMOTE_ADDR=ip,
+        )
+
+    def test_bucket_refills_over_time(self):
+        """Test a bucket allows a burst, blocks, then refills one token per interval"""
+        from pointRide.ratelimit import consume
+
+        self.assertTrue(all(consume('unit:a', '3/m', now=1000)[0] for _ in range(3)))
+        allowed, retry_after = consume('unit:a', '3/m', now=1000)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(retry_after, 20.0)
+        self.assertTrue(consume('unit:a', '3/m', now=1020)[0])
+
+    def test_login_flood_gets_429(self):
+        """Test login attempts past the limit are rejected with Retry-After"""
+        from django.test import override_settings
+        from pointRide.ratelimit import counters
+
+        with override_settings(RATELIMITS={'login': '3/m'}):
+            statuses = [self.attempt_login().status_code for _ in range(4)]
+            response = self.attempt_login()
+        self.assertEqual(statuses, [200, 200, 200, 429])
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(int(response['Retry-After']) >= 1)
+        self.assertEqual(counters()['login'], {'allowed': 3, 'blocked': 2})
+
+    def test_flooding_a_username_does_not_lock_out_its_owner(self):
+        """Test failed attempts for a username only empty the attacker's (username, IP) bucket"""
+        from django.test import override_settings
+
+        with override_settings(RATELIMITS={'login': '3/m'}):
+            statuses = [self.attempt_login(ip='10.0.1.1').status_code for _ in range(4)]
+            owner = self.client.post(
+                reverse('accounts:login'),
+                {'username': 'target', 'password': 'testpass123', 'login_role': 'traveller'},
+                REMOTE_ADDR='10.0.2.1',
+            )
+        self.assertEqual(statuses[-1], 429)
+        self.assertRedirects(owner, reverse('accounts:traveller_dashboard'), fetch_redirect_response=False)
+
+    def test_api_limited_per_user(self):
+        """Test the JSON APIs return a JSON 429 once a user's bucket is empty"""
+        from django.test import override_settings
+
+        self.client.login(username='target', password='testpass123')
+        with override_settings(RATELIMITS={'api_cities': '2/m'}):
+            for _ in range(2):
+                self.assertEqual(self.client.get(reverse('rides:api_cities')).status_code, 200)
+            response = self.client.get(reverse('rides:api_cities'))
+            # Each endpoint has its own budget
+            other = self.client.get(reverse('rides:api_validate_location'), {'location': 'Toronto'})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.json()['error'], 'Too many requests')
+        self.assertNotEqual(other.status_code, 429)
+
+    def test_client_ip_from_trusted_proxy(self):
+        """Test the proxy's forwarded address is used and a client-supplied prefix is ignored"""
+        from django.test import override_settings
+
+        with override_settings(RATELIMITS={'login': '2/m'}, RATELIMIT_IP_HEADER='HTTP_X_FORWARDED_FOR'):
+            statuses = [
+                self.client.post(
+                    reverse('accounts:login'),
+                    {'username': f'user{i}', 'password': 'wrong', 'login_role': 'traveller'},
+                    REMOTE_ADDR='10.9.9.9', HTTP_X_FORWARDED_FOR=f'1.2.3.{i}, 203.0.113.7',
+                ).status_code
+                for i in range(3)
+            ]
+            elsewhere = self.client.post(
+                reverse('accounts:login'), {'username': 'user9', 'password': 'wrong', 'login_role': 'traveller'},
+                REMOTE_ADDR='10.9.9.9', HTTP_X_FORWARDED_FOR='203.0.113.8',
+            )
+        self.assertEqual(statuses, [200, 200, 429])
+        self.assertEqual(elsewhere.status_code, 200)
+
+    def test_deploy_check_requires_shared_cache(self):
+        """Test check --deploy rejects per-process rate limit buckets"""
+        from django.core.checks import run_checks
+
+        errors = run_checks(include_deployment_checks=True, tags=['caches'])
+        self.assertIn('accounts.E001', [error.id for error in errors])
+
+
+class HealthEndpointTest(TestCase):
+    """Test liveness, readiness and the cached stats rollup"""
+
+    def setUp(self):
+        """Start with no cached rollup"""
+        from django.core.cache import cache
+        cache.clear()
+        User.objects.create_user(username='driver1', password='testpass123', full_legal_name='D', is_driver=True)
+
+    def test_healthz_does_not_query(self):
+        """Test liveness touches no database"""
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('healthz'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'ok')
+
+    def test_readyz_checks_database(self):
+        """Test readiness reports the database, and 503 when it is unreachable"""
+        from unittest import mock
+
+        response = self.client.get(reverse('readyz'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['database'], 'ok')
+
+        with mock.patch('accounts.health._select_one', side_effect=RuntimeError('connection refused')):
+            response = self.client.get(reverse('readyz'))
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('connection refused', response.json()['database'])
+
+    def stats_queries(self, queries):
+        return [q for q in queries if 'COUNT(' in q['sql'].upper()]
+
+    def test_public_health_is_status_and_latency(self):
+        """Test anonymous callers get no stats or counters, and nothing is aggregated for them"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('accounts:health_check'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()), {'status', 'latency_ms'})
+        self.assertEqual(self.stats_queries(queries), [])
+
+    def test_stats_are_served_from_rollup(self):
+        """Test staff get stats computed once and then served from cache"""
+        self.client.force_login(User.objects.create_user(
+            username='ops', password='testpass123', full_legal_name='Ops', is_staff=True
+        ))
+        with CaptureQueriesContext(connection) as queries:
+            first = self.client.get(reverse('accounts:health_check')).json()
+        self.assertEqual(len(self.stats_queries(queries)), 2)
+        self.assertEqual(first['stats']['drivers'], 1)
+        self.assertIn('rate_limits', first)
+        self.assertIn('log_records_dropped', first)
+
+        User.objects.create_user(username='driver2', password='testpass123', full_legal_name='E', is_driver=True)
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(reverse('accounts:health_check')).json()
+        self.assertEqual(self.stats_queries(queries), [])
+        self.assertEqual(second['stats']['drivers'], 1)
+
+
+class StructuredLoggingTest(TestCase):
+    """Test request ids, sampling and the queued JSON handler"""
+
+    def test_request_id_is_echoed(self):
+        """Test a valid incoming request id is kept and a bad one replaced"""
+        response = self.client.get(reverse('healthz'), HTTP_X_REQUEST_ID='abc12345-trace')
+        self.assertEqual(response['X-Request-ID'], 'abc12345-trace')
+        response = self.client.get(reverse('healthz'), HTTP_X_REQUEST_ID='bad id\n')
+        self.assertRegex(response['X-Request-ID'], r'^[0-9a-f]{32}$')
+
+    def test_sampling_is_per_logger_and_keeps_warnings(self):
+        """Test the most specific rate applies and warnings always pass"""
+        import logging
+        from pointRide.log import SamplingFilter
+
+        sampler = SamplingFilter(rates={'accounts': 0.0, 'accounts.views': 1.0})
+        record = lambda name, level: logging.LogRecord(name, level, '', 0, 'msg', None, None)
+        self.assertFalse(sampler.filter(record('accounts.roles', logging.INFO)))
+        self.assertTrue(sampler.filter(record('accounts.roles', logging.WARNING)))
+        self.assertTrue(sampler.filter(record('accounts.views', logging.INFO)))
+
+    def test_queued_handler_writes_json_with_request_id(self):
+        """Test records are written as JSON lines with extra fields and no form data"""
+        import io
+        import json
+        import logging
+        from pointRide.log import QueuedStreamHandler, RequestIDFilter
+
+        stream = io.StringIO()
+        handler = QueuedStreamHandler(stream=stream)
+        handler.addFilter(RequestIDFilter())
+        logger = logging.getLogger('accounts.views')
+        logger.addHandler(handler)
+        try:
+            User.objects.create_user(username='logger', password='testpass123', full_legal_name='L', is_traveller=True)
+            self.client.post(
+                reverse('accounts:login'),
+                {'username': 'logger', 'password': 'testpass123', 'login_role': 'traveller'},
+                HTTP_X_REQUEST_ID='req-00000001',
+            )
+        finally:
+            logger.removeHandler(handler)
+            handler.close()
+
+        entries = [json.loads(line) for line in stream.getvalue().splitlines()]
+        login_entry = next(e for e in entries if e['message'] == 'User logged in')
+        self.assertEqual(login_entry['request_id'], 'req-00000001')
+        self.assertEqual(login_entry['role'], 'traveller')
+        self.assertNotIn('testpass123', stream.getvalue())
+
+    def test_full_queue_drops_and_reports(self):
+        """Test records past a full queue are dropped and show up in dropped_records()"""
+        import logging
+        from pointRide.log import QueuedStreamHandler, dropped_records
+
+        handler = QueuedStreamHandler(maxsize=1)
+        handler.stop()  # Nothing drains the queue
+        before = dropped_records()
+        try:
+            for _ in range(3):
+                handler.handle(logging.LogRecord('accounts', logging.INFO, '', 0, 'msg', None, None))
+            self.assertEqual(handler.dropped, 2)
+            self.assertEqual(dropped_records(), before + 2)
+        finally:
+            handler.close()
@@ -1,6 +1,9 @@
 # accounts/views.py
+import logging
+import time
+
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponseForbidden
+from django.http import HttpResponseForbidden, JsonResponse
 from django.shortcuts import render, redirect
 from django.urls import reverse_lazy
 from django.contrib.auth.views import LoginView, LogoutView
@@ -12,37 +15,30 @@ from django.contrib.auth import authenticate, login, logout
 from django.db import transaction
 from django.core.exceptions import ValidationError
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import never_cache
+
+from pointRide.log import dropped_records
+from pointRide.ratelimit import counters as ratelimit_counters, ratelimit
 
 from .models import User, DriverProfile, TravellerProfile
 from .forms import UserRegistrationForm
+from . import health
+from .roles import build_role_info, load_role_info, load_user_with_profiles
+
+logger = logging.getLogger(__name__)
 
 
 # ===================================
 # UTILITY FUNCTIONS
 # ===================================
 
-def print_debug(message):
-    """Debug helper function"""
-    print(f"🐛 DEBUG: {message}")
-
-
 def get_user_role_info(user):
-    """Get comprehensive user role information"""
+    """Get comprehensive user role information (one query; see accounts.roles)"""
     try:
-        driver_profile = DriverProfile.objects.filter(user=user).first()
-        traveller_profile = TravellerProfile.objects.filter(user=user).first()
-
-        return {
-            'user': user,
-            'is_driver': user.is_driver,
-            'is_traveller': user.is_traveller,
-            'has_driver_profile': driver_profile is not None,
-            'has_traveller_profile': traveller_profile is not None,
-            'driver_profile': driver_profile,
-            'traveller_profile': traveller_profile
-        }
+        return build_role_info(load_user_with_profiles(user.pk))
     except Exception as e:
-        print_debug(f"Error getting user role info: {e}")
+        logger.exception("Could not load role info", extra={'user_id': user.pk})
         return None
 
 
@@ -59,6 +55,7 @@ def home(request):
 # REGISTRATION VIEWS
 # ===================================
 
+@method_decorator(ratelimit('register', '10/h'), name='dispatch')
 class TravellerRegistrationView(CreateView):
     """Class-based traveller registration (your version)"""
     model = User
@@ -88,6 +85,7 @@ class TravellerRegistrationView(CreateView):
         return super().form_invalid(form)
 
 
+@method_decorator(ratelimit('register', '10/h'), name='dispatch')
 class DriverRegistrationStep1View(CreateView):
     """Class-based driver registration (your version)"""
     model = User
@@ -117,59 +115,53 @@ class DriverRegistrationStep1View(CreateView):
         return super().form_invalid(form)
 
 
+@ratelimit('register', '10/h')
 def traveller_register(request):
     """Function-based traveller registration (their version)"""
-    print_debug("=== TRAVELLER REGISTRATION START ===")
-
     if request.method == 'POST':
         form = UserRegistrationForm(request.POST)
 
         if form.is_valid():
             try:
                 with transaction.atomic():
-                    print_debug("Form is valid, creating user...")
                     user = form.save(commit=False)
                     user.is_traveller = True
                     user.is_driver = False
                     user.save()
 
-                    DriverProfile.objects.filter(user=user).delete()
                     traveller_profile = TravellerProfile.objects.create(user=user)
+                    logger.info("User registered", extra={'user_id': user.pk, 'role': 'traveller'})
 
                     login(request, user)
                     messages.success(request, f"Welcome {user.full_legal_name}!")
                     return redirect('accounts:traveller_dashboard')
 
             except Exception as e:
-                print_debug(f"Registration error: {e}")
+                logger.exception("Registration failed")
                 messages.error(request, f"Registration failed: {str(e)}")
         else:
-            print_debug(f"Form errors: {form.errors}")
+            logger.info("Registration form invalid", extra={'fields': sorted(form.errors)})
             messages.error(request, "Please correct the errors below.")
     else:
         form = UserRegistrationForm()
-        print_debug("Displaying traveller registration form")
 
     return render(request, 'accounts/traveller_registration.html', {'form': form})
 
 
+@ratelimit('register', '10/h')
 def driver_register(request):
     """Function-based driver registration (their version)"""
-    print_debug("=== DRIVER REGISTRATION START ===")
-
     if request.method == 'POST':
         form = UserRegistrationForm(request.POST)
 
         if form.is_valid():
             try:
                 with transaction.atomic():
-                    print_debug("Form is valid, creating driver...")
                     user = form.save(commit=False)
                     user.is_driver = True
                     user.is_traveller = False
                     user.save()
 
-                    TravellerProfile.objects.filter(user=user).delete()
                     driver_profile = DriverProfile.objects.create(
                         user=user,
                         account_status='PENDING',
@@ -179,20 +171,20 @@ def driver_register(request):
                         vehicle_year=2020,
                         vehicle_registration_number=f'TEMP_{user.id}_{user.username}'
                     )
+                    logger.info("User registered", extra={'user_id': user.pk, 'role': 'driver'})
 
                     login(request, user)
                     messages.success(request, f"Welcome {user.full_legal_name}!")
                     return redirect('accounts:driver_dashboard')
 
             except Exception as e:
-                print_debug(f"Registration error: {e}")
+                logger.exception("Registration failed")
                 messages.error(request, f"Registration failed: {str(e)}")
         else:
-            print_debug(f"Form errors: {form.errors}")
+            logger.info("Registration form invalid", extra={'fields': sorted(form.errors)})
             messages.error(request, "Please correct the errors below.")
     else:
         form = UserRegistrationForm()
-        print_debug("Displaying driver registration form")
 
     return render(request, 'accounts/driver_registration_step1.html', {'form': form})
 
@@ -201,6 +193,7 @@ def driver_register(request):
 # AUTHENTICATION VIEWS
 # ===================================
 
+@method_decorator(ratelimit('login', '10/m', keys=('ip', 'post:username')), name='dispatch')
 class CustomLoginView(LoginView):
     """Your class-based login view"""
     template_name = 'accounts/login.html'
@@ -244,10 +237,9 @@ class CustomLogoutView(LogoutView):
     next_page = reverse_lazy('home')
 
 
+@ratelimit('login', '10/m', keys=('ip', 'post:username+ip'))
 def user_login(request):
     """Their function-based login view"""
-    print_debug("=== LOGIN ATTEMPT START ===")
-
     if request.method == 'POST':
         form = AuthenticationForm(request, data=request.POST)
         login_role = request.POST.get('login_role')
@@ -262,34 +254,25 @@ def user_login(request):
             user = authenticate(request, username=username, password=password)
 
             if user is not None:
-                print_debug(f"User authenticated: {user.username}")
-                role_info = get_user_role_info(user)
-
+                # Profiles are created at registration; the dashboards load them
                 if login_role == 'traveller' and user.is_traveller:
-                    traveller_profile, created = TravellerProfile.objects.get_or_create(user=user)
                     login(request, user)
+                    logger.info("User logged in", extra={'user_id': user.pk, 'role': login_role})
                     messages.success(request, f"Welcome back, {user.full_legal_name}!")
                     return redirect('accounts:traveller_dashboard')
                 elif login_role == 'driver' and user.is_driver:
-                    driver_profile, created = DriverProfile.objects.get_or_create(
-                        user=user,
-                        defaults={
-                            'account_status': 'PENDING',
-                            'license_number': 'PENDING_VERIFICATION',
-                            'vehicle_make': 'Not Specified',
-                            'vehicle_model': 'Not Specified',
-                            'vehicle_year': 2020,
-                            'vehicle_registration_number': f'TEMP_{user.id}_{user.username}'
-                        }
-                    )
                     login(request, user)
+                    logger.info("User logged in", extra={'user_id': user.pk, 'role': login_role})
                     messages.success(request, f"Welcome back, {user.full_legal_name}!")
                     return redirect('accounts:driver_dashboard')
                 else:
+                    logger.info("Login rejected", extra={'user_id': user.pk, 'reason': 'role_mismatch'})
                     messages.error(request, "Role mismatch.")
             else:
+                logger.info("Login rejected", extra={'reason': 'invalid_credentials'})
                 messages.error(request, "Invalid credentials.")
         else:
+            logger.info("Login rejected", extra={'reason': 'invalid_form'})
             messages.error(request, "Please correct the errors below.")
     else:
         form = AuthenticationForm()
@@ -299,7 +282,7 @@ def user_login(request):
 
 def user_logout(request):
     """Their function-based logout view"""
-    print_debug(f"User logout: {request.user.username if request.user.is_authenticated else 'Anonymous'}")
+    logger.info("User logged out", extra={'user_id': request.user.pk})
     logout(request)
     messages.success(request, "You have been logged out successfully.")
     return redirect('home')
@@ -315,10 +298,10 @@ def traveller_dashboard(request):
     if not request.user.is_traveller:
         return HttpResponseForbidden("Access denied.")
 
-    traveller_profile, created = TravellerProfile.objects.get_or_create(user=request.user)
+    role_info = load_role_info(request)
     context = {
-        'user': request.user,
-        'profile': traveller_profile
+        'user': role_info['user'],
+        'profile': role_info['traveller_profile']
     }
     return render(request, 'accounts/traveller_dashboard.html', context)
 
@@ -329,20 +312,10 @@ def driver_dashboard(request):
     if not request.user.is_driver:
         return HttpResponseForbidden("Access denied.")
 
-    driver_profile, created = DriverProfile.objects.get_or_create(
-        user=request.user,
-        defaults={
-            'account_status': 'PENDING',
-            'license_number': 'PENDING_VERIFICATION',
-            'vehicle_make': 'Not Specified',
-            'vehicle_model': 'Not Specified',
-            'vehicle_year': 2020,
-            'vehicle_registration_number': f'TEMP_{request.user.id}_{request.user.username}'
-        }
-    )
+    role_info = load_role_info(request)
     context = {
-        'user': request.user,
-        'profile': driver_profile
+        'user': role_info['user'],
+        'profile': role_info['driver_profile']
     }
     return render(request, 'accounts/driver_dashboard.html', context)
 
@@ -352,7 +325,7 @@ class UpdateDriverProfileView(LoginRequiredMixin, View):
             messages.error(request, "You are not authorized to update driver information.")
             return redirect('accounts:edit_profile')
 
-        driver_profile = request.user.driver_profile
+        driver_profile = load_role_info(request)['driver_profile']
 
         driver_profile.license_number = request.POST.get('license_number')
         driver_profile.license_expiry_date = request.POST.get('license_expiry_date')
@@ -385,22 +358,21 @@ class EditProfileView(LoginRequiredMixin, UpdateView):
     template_name = 'accounts/edit_profile.html'
 
     def get_object(self):
-        return self.request.user
+        return load_role_info(self.request)['user']
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         if self.request.user.is_driver:
-            context['driver_profile'] = self.request.user.driver_profile
+            context['driver_profile'] = load_role_info(self.request)['driver_profile']
         return context
 
     def form_valid(self, form):
         response = super().form_valid(form)
 
         # Handle DriverProfile update if driver
-        if self.request.user.is_driver:
-            driver_profile = self.request.user.driver_profile
+        driver_profile = load_role_info(self.request)['driver_profile']
+        if self.request.user.is_driver and driver_profile is not None:
             post = self.request.POST
-            print(post)
             driver_profile.license_number = post.get('license_number')
             driver_profile.license_expiry_date = post.get('license_expiry_date')
             driver_profile.vehicle_make = post.get('vehicle_make')
@@ -434,14 +406,42 @@ def profile_view(request):
 # UTILITY VIEWS
 # ===================================
 
+@never_cache
+def healthz(request):
+    """Liveness probe: the process is up and serving requests"""
+    return JsonResponse(health.liveness())
+
+
+@never_cache
+def readyz(request):
+    """Readiness probe: the database answers SELECT 1 within READINESS_TIMEOUT"""
+    ok, error = health.check_database()
+    payload = {'status': 'ok' if ok else 'unavailable', 'database': 'ok' if ok else error}
+    return JsonResponse(payload, status=200 if ok else 503)
+
+
+@never_cache
 def health_check(request):
-    """Health check view"""
-    return render(request, 'accounts/health_check.html', {
-        'status': 'healthy',
-        'user_count': User.objects.count(),
-        'driver_count': User.objects.filter(is_driver=True).count(),
-        'traveller_count': User.objects.filter(is_traveller=True).count(),
-    })
+    """
+    Health and database latency as JSON; staff also get the platform stats
+    (from the cached rollup), the rate limiter counters and how many log
+    records this process dropped
+    """
+    started = time.perf_counter()
+    ok, _ = health.check_database()
+    payload = {
+        'status': 'healthy' if ok else 'unhealthy',
+        'latency_ms': round((time.perf_counter() - started) * 1000, 1),
+    }
+    if request.user.is_authenticated and request.user.is_staff:
+        stats, computed_at = health.platform_stats()
+        payload.update({
+            'stats': stats,
+            'stats_age_seconds': round(max(0.0, time.time() - computed_at), 1),
+            'rate_limits': ratelimit_counters(),
+            'log_records_dropped': dropped_records(),
+        })
+    return JsonResponse(payload, status=200 if ok else 503)
 
 
 # ===================================
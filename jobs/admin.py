@@ -0,0 +1,26 @@
+# jobs/admin.py
+
+from django.contrib import admin
+from .models import Job, DeadJob
+from .queue import requeue_dead
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'status', 'attempts', 'max_attempts', 'run_at', 'locked_by']
+    list_filter = ['status', 'name']
+    readonly_fields = ['created_at', 'locked_at', 'locked_by', 'last_error']
+    ordering = ['run_at', 'id']
+
+
+@admin.register(DeadJob)
+class DeadJobAdmin(admin.ModelAdmin):
+    list_display = ['job_id', 'name', 'attempts', 'failed_at']
+    list_filter = ['name']
+    readonly_fields = ['job_id', 'name', 'payload', 'attempts', 'error', 'created_at', 'failed_at']
+    actions = ['requeue_selected']
+
+    @admin.action(description='Requeue selected jobs')
+    def requeue_selected(self, request, queryset):
+        count = requeue_dead(list(queryset.values_list('id', flat=True)))
+        self.message_user(request, f'{count} job(s) requeued.')
@@ -0,0 +1,211 @@
+# jobs/delivery.py
+
+"""
+Pooled SMTP delivery.
+
+ConnectionPool keeps up to EMAIL_POOL_SIZE open connections to
+JOBS_EMAIL_BACKEND and hands them out to worker threads. Idle connections
+are checked with NOOP after EMAIL_KEEPALIVE seconds and replaced if the
+server dropped them; a connection is recycled after
+EMAIL_MAX_MESSAGES_PER_CONNECTION messages.
+
+deliver_queued_mail() claims a batch of jobs.send_email jobs and sends them
+over the pool at once, instead of one job (and one SMTP handshake) at a time.
+"""
+
+import logging
+import queue
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from .mail import delivery_connection, deserialize
+from .models import Job
+from .queue import claim, fail, worker_name
+
+logger = logging.getLogger(__name__)
+
+MAIL_JOB = 'jobs.send_email'
+
+
+class PooledConnection:
+    def __init__(self):
+        self.backend = delivery_connection(fail_silently=False)
+        self.backend.open()
+        self.sent = 0
+        self.last_used = time.monotonic()
+
+    @property
+    def smtp(self):
+        # Only the SMTP backend has a socket to keep alive
+        return getattr(self.backend, 'connection', None)
+
+    def alive(self, keepalive):
+        if self.smtp is None or time.monotonic() - self.last_used < keepalive:
+            return True
+        try:
+            return self.smtp.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def send(self, message):
+        # send_messages() leaves an already open connection open
+        self.backend.send_messages([message])
+        self.sent += 1
+        self.last_used = time.monotonic()
+
+    def close(self):
+        try:
+            self.backend.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    def __init__(self, size=None, keepalive=None, max_messages=None):
+        self.size = size or getattr(settings, 'EMAIL_POOL_SIZE', 4)
+        self.keepalive = keepalive if keepalive is not None else getattr(settings, 'EMAIL_KEEPALIVE', 30)
+        self.max_messages = max_messages or getattr(settings, 'EMAIL_MAX_MESSAGES_PER_CONNECTION', 100)
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self.opened = 0
+
+    def _checkout(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                self.opened += 1
+                return PooledConnection()
+            if conn.alive(self.keepalive):
+                return conn
+            conn.close()
+
+    @contextmanager
+    def connection(self):
+        """An open connection for the duration of the block; blocks while all are in use"""
+        with self._slots:
+            conn = self._checkout()
+            try:
+                yield conn
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException):
+                # The server answered (e.g. refused a recipient): the connection itself is fine.
+                # Caught first, as every SMTPException is also an OSError.
+                self._checkin(conn)
+                raise
+            except (smtplib.SMTPServerDisconnected, OSError):
+                conn.close()
+                raise
+            except Exception:
+                self._checkin(conn)
+                raise
+            self._checkin(conn)
+
+    def _checkin(self, conn):
+        if conn.sent >= self.max_messages:
+            conn.close()
+        else:
+            self._idle.put(conn)
+
+    def send(self, message):
+        try:
+            with self.connection() as conn:
+                conn.send(message)
+        except smtplib.SMTPServerDisconnected:
+            # The server can drop an idle connection between the NOOP and the send
+            with self.connection() as conn:
+                conn.send(message)
+
+    def send_many(self, messages):
+        """
+        Send messages over up to `size` connections in parallel.
+
+        Returns a list with None for each message sent, or the exception
+        that stopped it.
+        """
+        chunks = [list(range(i, len(messages), self.size)) for i in range(min(self.size, len(messages)))]
+        results = [None] * len(messages)
+
+        def send_chunk(indexes):
+            for i in indexes:
+                try:
+                    self.send(messages[i])
+                except Exception as e:
+                    results[i] = e
+
+        with ThreadPoolExecutor(max_workers=max(1, len(chunks))) as executor:
+            list(executor.map(send_chunk, chunks))
+        return results
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Process-wide pool shared by every job worker thread"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool()
+        return _pool
+
+
+@receiver(setting_changed)
+def reset_pool(setting, **kwargs):
+    """Drop pooled connections when the mail settings change (override_settings in tests)"""
+    global _pool
+    if setting.startswith('EMAIL_') or setting == 'JOBS_EMAIL_BACKEND':
+        with _pool_lock:
+            if _pool is not None:
+                _pool.close()
+            _pool = None
+
+
+def deliver_queued_mail(batch_size=200, pool=None):
+    """
+    Claim up to batch_size queued emails and send them over the pool.
+
+    Sent jobs are deleted in one statement; failures go through the normal
+    retry/dead-letter path. Returns (sent, failed, seconds).
+    """
+    pool = pool or get_pool()
+    started = time.monotonic()
+    claimed = claim(worker_name(), batch_size, names=[MAIL_JOB])
+    if not claimed:
+        return 0, 0, 0.0
+
+    messages, jobs = [], []
+    for job in claimed:
+        try:
+            messages.append(deserialize(job.payload['message']))
+            jobs.append(job)
+        except Exception as e:
+            fail(job, repr(e))
+
+    results = pool.send_many(messages)
+    sent = [job.id for job, error in zip(jobs, results) if error is None]
+    Job.objects.filter(id__in=sent).delete()
+    for job, error in zip(jobs, results):
+        if error is not None:
+            fail(job, repr(error))
+
+    elapsed = time.monotonic() - started
+    logger.info("Mail batch delivered", extra={
+        'sent': len(sent), 'failed': len(claimed) - len(sent),
+        'seconds': round(elapsed, 3), 'per_second': round(len(sent) / elapsed, 1) if elapsed else None,
+    })
+    return len(sent), len(claimed) - len(sent), elapsed
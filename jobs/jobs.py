@@ -0,0 +1,11 @@
+# jobs/jobs.py
+
+from .delivery import MAIL_JOB, get_pool
+from .mail import deserialize
+from .queue import job
+
+
+@job(MAIL_JOB)
+def send_email(message):
+    """Deliver one queued email over a pooled connection; an SMTP error fails the job so it is retried"""
+    get_pool().send(deserialize(message))
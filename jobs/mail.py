@@ -0,0 +1,85 @@
+# jobs/mail.py
+
+"""
+Email through the job queue.
+
+With EMAIL_BACKEND = 'jobs.mail.QueuedEmailBackend', send_mail() and
+friends (including the password reset view) only insert a job; a worker
+delivers it later through JOBS_EMAIL_BACKEND.
+"""
+
+import base64
+
+from django.conf import settings
+from django.core.mail import EmailMessage, EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+
+from .queue import enqueue
+
+
+def delivery_connection(**kwargs):
+    """Connection to the real backend; jobs must never send through the queued one"""
+    return get_connection(
+        getattr(settings, 'JOBS_EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend'), **kwargs
+    )
+
+
+def _encode(content):
+    if isinstance(content, bytes):
+        return {'b64': base64.b64encode(content).decode('ascii')}
+    return {'text': content}
+
+
+def _decode(content):
+    return base64.b64decode(content['b64']) if 'b64' in content else content['text']
+
+
+def serialize(message):
+    """EmailMessage -> JSON-safe dict"""
+    attachments = []
+    for attachment in message.attachments:
+        if not isinstance(attachment, tuple):
+            raise ValueError("MIME attachments cannot be queued; attach (filename, content, mimetype)")
+        filename, content, mimetype = attachment
+        attachments.append([filename, _encode(content), mimetype])
+    return {
+        'subject': message.subject,
+        'body': message.body,
+        'from_email': message.from_email,
+        'to': list(message.to),
+        'cc': list(message.cc),
+        'bcc': list(message.bcc),
+        'reply_to': list(message.reply_to),
+        'headers': dict(message.extra_headers),
+        'content_subtype': message.content_subtype,
+        'alternatives': [list(alt) for alt in getattr(message, 'alternatives', [])],
+        'attachments': attachments,
+    }
+
+
+def deserialize(data):
+    """dict from serialize() -> EmailMultiAlternatives"""
+    message = EmailMultiAlternatives(
+        subject=data['subject'], body=data['body'], from_email=data['from_email'],
+        to=data['to'], cc=data['cc'], bcc=data['bcc'], reply_to=data['reply_to'],
+        headers=data['headers'],
+    )
+    message.content_subtype = data['content_subtype']
+    for content, mimetype in data['alternatives']:
+        message.attach_alternative(content, mimetype)
+    for filename, content, mimetype in data['attachments']:
+        message.attach(filename, _decode(content), mimetype)
+    return message
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+    """Email backend that enqueues one job per message"""
+
+    def send_messages(self, email_messages):
+        sent = 0
+        for message in email_messages:
+            if not message.recipients():
+                continue
+            enqueue('jobs.send_email', {'message': serialize(message)})
+            sent += 1
+        return sent
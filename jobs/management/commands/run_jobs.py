@@ -0,0 +1,34 @@
+# jobs/management/commands/run_jobs.py
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from jobs.queue import Worker
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (emails, notifications) from the database job queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Jobs run concurrently (default: %(default)s)')
+        parser.add_argument('--pool', choices=['thread', 'process', 'inline'], default='thread',
+                            help='Threads for I/O-bound jobs, processes for CPU-bound ones, '
+                                 'inline to run one job at a time in this thread (debugging)')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait when the queue is empty (default: %(default)s)')
+        parser.add_argument('--stale-after', type=int, default=600,
+                            help='Seconds without a heartbeat after which a RUNNING job is assumed lost and requeued')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once no jobs are due, e.g. from cron')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError('--workers must be positive')
+        worker = Worker(
+            workers=options['workers'],
+            pool=options['pool'],
+            poll_interval=options['poll_interval'],
+            stale_after=timedelta(seconds=options['stale_after']),
+        )
+        processed = worker.run(once=options['once'])
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} job(s)'))
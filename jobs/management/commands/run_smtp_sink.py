@@ -0,0 +1,28 @@
+# jobs/management/commands/run_smtp_sink.py
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from jobs.smtp_sink import SMTPSink
+
+class Command(BaseCommand):
+    help = 'Accept and discard mail on EMAIL_HOST:EMAIL_PORT, for trying delivery locally'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default=settings.EMAIL_HOST)
+        parser.add_argument('--port', type=int, default=settings.EMAIL_PORT)
+        parser.add_argument('--quiet', action='store_true', help='Do not print each message')
+
+    def handle(self, *args, **options):
+        on_message = None if options['quiet'] else (
+            lambda recipients: self.stdout.write(f"Received message for {', '.join(recipients)}")
+        )
+        sink = SMTPSink(options['host'], options['port'], on_message=on_message).start()
+        self.stdout.write(self.style.SUCCESS(f"SMTP sink listening on {options['host']}:{sink.port}"))
+        try:
+            while True:
+                time.sleep(60)
+        except KeyboardInterrupt:
+            sink.stop()
+            self.stdout.write(f'{len(sink.messages)} message(s) over {sink.connections} connection(s)')
@@ -0,0 +1,47 @@
+# jobs/management/commands/send_queued_mail.py
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from jobs.delivery import ConnectionPool, deliver_queued_mail
+
+class Command(BaseCommand):
+    help = 'Deliver queued email in batches over a pool of persistent SMTP connections'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help='Messages claimed per batch (default: %(default)s)')
+        parser.add_argument('--connections', type=int, default=None,
+                            help='SMTP connections kept open (default: EMAIL_POOL_SIZE)')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Seconds to wait when no mail is queued (default: %(default)s)')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once the mail queue is empty')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        pool = ConnectionPool(size=options['connections'])
+        total_sent = total_failed = 0
+        elapsed = 0.0
+        try:
+            while True:
+                sent, failed, seconds = deliver_queued_mail(options['batch_size'], pool=pool)
+                total_sent += sent
+                total_failed += failed
+                elapsed += seconds
+                if sent or failed:
+                    rate = sent / seconds if seconds else 0
+                    self.stdout.write(f'Sent {sent}, failed {failed} in {seconds:.2f}s ({rate:.0f} msg/s)')
+                elif options['once']:
+                    break
+                else:
+                    time.sleep(options['interval'])
+        finally:
+            pool.close()
+
+        rate = total_sent / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Sent {total_sent}, failed {total_failed} over {pool.opened} connection(s) '
+            f'in {elapsed:.2f}s ({rate:.0f} msg/s)'
+        ))
@@ -0,0 +1,54 @@
+# jobs/models.py
+
+from django.db import models
+
+
+class Job(models.Model):
+    """
+    A unit of background work waiting to run, running, or waiting to retry.
+
+    Rows are deleted once the handler succeeds; jobs that exhaust their
+    attempts move to DeadJob.
+    """
+    STATUS_CHOICES = [
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+    ]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='QUEUED')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField()
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['run_at', 'id']
+        indexes = [
+            # Dequeue order, and the stale-lock sweep over RUNNING rows
+            models.Index(fields=['status', 'run_at', 'id'], name='job_dequeue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+
+class DeadJob(models.Model):
+    """A job that failed on every attempt, kept for inspection and requeueing"""
+    job_id = models.BigIntegerField()
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    attempts = models.PositiveIntegerField()
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+    failed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-failed_at']
+
+    def __str__(self):
+        return f"{self.name} #{self.job_id} (dead)"
@@ -0,0 +1,255 @@
+# jobs/queue.py
+
+"""
+A job queue stored in the application database.
+
+Handlers are registered with @job and called with the job's payload as
+keyword arguments. enqueue() is a plain INSERT, so a job enqueued inside a
+view's transaction is only visible to workers once that transaction commits,
+and is discarded if it rolls back.
+
+Workers claim due jobs with SELECT ... FOR UPDATE SKIP LOCKED, so any number
+of workers can poll the same table without blocking each other or running
+a job twice. A failed job is retried with exponential backoff; after
+max_attempts it is moved to the DeadJob table.
+
+While jobs run, their worker renews the claim (heartbeat()) every third of
+the stale window, so only jobs whose worker stopped renewing, most likely
+because it died, are released to run again, however long a batch takes.
+"""
+
+import logging
+import os
+import random
+import socket
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import timedelta
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import runner
+from .models import Job, DeadJob
+
+logger = logging.getLogger(__name__)
+
+HANDLERS = {}
+
+DEFAULT_MAX_ATTEMPTS = 5
+
+
+def job(name, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """Register a function as the handler for jobs called `name`"""
+    def decorator(func):
+        func.job_name = name
+        func.max_attempts = max_attempts
+        HANDLERS[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, payload=None, delay=None, max_attempts=None):
+    """
+    Queue a job and return its row.
+
+    Call it inside the transaction that makes the change the job reacts to.
+    """
+    if name not in HANDLERS:
+        raise KeyError(f"No job handler registered for {name!r}")
+    run_at = timezone.now() + (delay or timedelta())
+    return Job.objects.create(
+        name=name,
+        payload=payload or {},
+        run_at=run_at,
+        max_attempts=max_attempts or HANDLERS[name].max_attempts,
+    )
+
+
+def backoff(attempts):
+    """Delay before retry number `attempts`: doubling from JOBS_RETRY_BASE, capped, with jitter"""
+    base = getattr(settings, 'JOBS_RETRY_BASE', 10)
+    cap = getattr(settings, 'JOBS_RETRY_CAP', 3600)
+    delay = min(cap, base * 2 ** (attempts - 1))
+    return timedelta(seconds=delay * random.uniform(0.75, 1.25))
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim(worker_id, limit, now=None, names=None):
+    """Lock up to `limit` due jobs (optionally only those named) for this worker and mark them RUNNING"""
+    now = now or timezone.now()
+    with transaction.atomic():
+        due = Job.objects.select_for_update(skip_locked=True).filter(status='QUEUED', run_at__lte=now)
+        if names is not None:
+            due = due.filter(name__in=names)
+        jobs = list(due.order_by('run_at', 'id')[:limit])
+        if not jobs:
+            return []
+        for claimed in jobs:
+            claimed.status = 'RUNNING'
+            claimed.attempts += 1
+            claimed.locked_at = now
+            claimed.locked_by = worker_id
+        Job.objects.bulk_update(jobs, ['status', 'attempts', 'locked_at', 'locked_by'])
+    return jobs
+
+
+def heartbeat(job_ids, worker_id, now=None):
+    """Renew this worker's claim on jobs it is still running; returns the number renewed"""
+    return Job.objects.filter(id__in=job_ids, status='RUNNING', locked_by=worker_id).update(
+        locked_at=now or timezone.now()
+    )
+
+
+def execute(name, payload):
+    """Run one handler and release this thread's stale connections"""
+    try:
+        HANDLERS[name](**payload)
+    finally:
+        close_old_connections()
+
+
+def complete(claimed):
+    Job.objects.filter(id=claimed.id).delete()
+
+
+def fail(claimed, error, now=None):
+    """Schedule a retry, or move the job to the dead-letter table"""
+    now = now or timezone.now()
+    if claimed.attempts >= claimed.max_attempts:
+        with transaction.atomic():
+            DeadJob.objects.create(
+                job_id=claimed.id, name=claimed.name, payload=claimed.payload,
+                attempts=claimed.attempts, error=error, created_at=claimed.created_at,
+            )
+            Job.objects.filter(id=claimed.id).delete()
+        logger.error("Job dead-lettered", extra={'job_id': claimed.id, 'job': claimed.name})
+        return
+    Job.objects.filter(id=claimed.id).update(
+        status='QUEUED', run_at=now + backoff(claimed.attempts),
+        locked_at=None, locked_by='', last_error=error,
+    )
+    logger.warning("Job failed, retrying", extra={
+        'job_id': claimed.id, 'job': claimed.name, 'attempts': claimed.attempts,
+    })
+
+
+def release_stale(timeout, now=None):
+    """
+    Requeue RUNNING jobs whose worker has not renewed its claim for
+    `timeout` (the worker most likely died). Jobs that have already used all their
+    attempts, e.g. because they keep crashing the worker, are dead-lettered.
+    Returns the number released.
+    """
+    now = now or timezone.now()
+    stale = Job.objects.filter(status='RUNNING', locked_at__lt=now - timeout)
+    for exhausted in stale.filter(attempts__gte=F('max_attempts')):
+        fail(exhausted, 'Worker lost while running the job', now)
+    return stale.update(
+        status='QUEUED', run_at=now, locked_at=None, locked_by='',
+        last_error='Worker lost while running the job',
+    )
+
+
+def requeue_dead(dead_ids):
+    """Move dead jobs back onto the queue with fresh attempts"""
+    with transaction.atomic():
+        dead = list(DeadJob.objects.filter(id__in=dead_ids))
+        Job.objects.bulk_create([
+            Job(name=d.name, payload=d.payload, run_at=timezone.now(),
+                max_attempts=HANDLERS[d.name].max_attempts if d.name in HANDLERS else DEFAULT_MAX_ATTEMPTS)
+            for d in dead
+        ])
+        DeadJob.objects.filter(id__in=[d.id for d in dead]).delete()
+    return len(dead)
+
+
+class InlineExecutor:
+    """Runs each job in the calling thread; for debugging and tests"""
+
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class Worker:
+    """
+    Polls for due jobs and runs them on a thread or process pool.
+
+    Use threads for I/O-bound jobs such as email, processes for CPU-bound
+    ones, and 'inline' to run jobs one at a time in the worker's own
+    thread. Each poll claims at most `workers` jobs so none sit locked
+    while waiting for a free slot, and the claims are renewed while they
+    run so a slow job is never mistaken for a lost one.
+    """
+
+    def __init__(self, workers=4, pool='thread', poll_interval=1.0, stale_after=timedelta(minutes=10)):
+        self.workers = workers
+        self.pool = pool
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.worker_id = worker_name()
+        self._last_sweep = 0.0
+
+    def make_executor(self):
+        if self.pool == 'inline':
+            return InlineExecutor()
+        if self.pool == 'process':
+            return ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=get_context('spawn'), initializer=runner.setup
+            )
+        return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='job')
+
+    def run_batch(self, executor):
+        """Claim and run one batch; returns the number of jobs processed"""
+        if time.monotonic() - self._last_sweep > self.stale_after.total_seconds() / 2:
+            release_stale(self.stale_after)
+            self._last_sweep = time.monotonic()
+
+        claimed = claim(self.worker_id, self.workers)
+        entry = runner.execute if self.pool == 'process' else execute
+        futures = {executor.submit(entry, c.name, c.payload): c for c in claimed}
+        pending = set(futures)
+        renew_every = self.stale_after.total_seconds() / 3
+        while pending:
+            done, pending = wait(pending, timeout=renew_every, return_when=FIRST_COMPLETED)
+            for future in done:
+                current = futures[future]
+                try:
+                    future.result()
+                except Exception:
+                    fail(current, traceback.format_exc())
+                else:
+                    complete(current)
+            if pending:
+                heartbeat([futures[future].id for future in pending], self.worker_id)
+        return len(claimed)
+
+    def run(self, once=False):
+        """Process jobs until interrupted, or until the queue is drained if `once`"""
+        processed = 0
+        with self.make_executor() as executor:
+            while True:
+                count = self.run_batch(executor)
+                processed += count
+                if count == 0:
+                    if once:
+                        return processed
+                    time.sleep(self.poll_interval)
@@ -0,0 +1,18 @@
+# jobs/runner.py
+
+"""
+Entry points for --pool process workers.
+
+Spawned processes unpickle these before Django is set up, so this module
+must not import models at import time.
+"""
+
+
+def setup():
+    import django
+    django.setup()
+
+
+def execute(name, payload):
+    from .queue import execute as run
+    run(name, payload)
@@ -0,0 +1,87 @@
+# jobs/smtp_sink.py
+
+"""
+A minimal SMTP server that accepts every message and keeps it in memory.
+
+Used by the tests and by `manage.py run_smtp_sink` to exercise delivery
+locally on EMAIL_HOST:EMAIL_PORT without a real mail server. It speaks just
+enough SMTP for smtplib: EHLO/HELO, MAIL, RCPT, DATA, NOOP, RSET and QUIT.
+Recipients listed in `refused` are rejected with 550.
+"""
+
+import socketserver
+import threading
+from email import message_from_bytes
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode('ascii') + b'\r\n')
+
+    def handle(self):
+        sink = self.server
+        with sink.lock:
+            sink.connections += 1
+        self.reply('220 pointride-sink ESMTP')
+        sender, recipients = None, []
+
+        for raw in self.rfile:
+            command = raw.decode('utf-8', 'replace').rstrip('\r\n')
+            verb = command[:4].upper()
+            if verb in ('EHLO', 'HELO'):
+                self.reply('250 pointride-sink')
+            elif verb == 'MAIL':
+                sender, recipients = command.partition(':')[2].strip(), []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                recipient = command.partition(':')[2].strip().strip('<>')
+                if recipient in sink.refused:
+                    self.reply('550 No such user')
+                    continue
+                recipients.append(recipient)
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                lines = []
+                for data in self.rfile:
+                    if data in (b'.\r\n', b'.\n'):
+                        break
+                    lines.append(data[1:] if data.startswith(b'..') else data)
+                with sink.lock:
+                    sink.messages.append((recipients, message_from_bytes(b''.join(lines))))
+                if sink.on_message:
+                    sink.on_message(recipients)
+                self.reply('250 OK queued')
+            elif verb in ('NOOP', 'RSET'):
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='localhost', port=1025, on_message=None, refused=()):
+        super().__init__((host, port), SMTPHandler)
+        self.lock = threading.Lock()
+        self.messages = []
+        self.connections = 0
+        self.on_message = on_message
+        self.refused = set(refused)
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        """Serve on a background thread; returns self"""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,195 @@
+# jobs/tests.py
+
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.core import mail
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from .models import Job, DeadJob
+from .queue import job, enqueue, claim, heartbeat, release_stale, Worker
+
+CALLS = []
+
+
+@job('tests.record')
+def record(value):
+    CALLS.append(value)
+
+
+@job('tests.slow')
+def slow(seconds):
+    time.sleep(seconds)
+
+
+@job('tests.explode', max_attempts=2)
+def explode():
+    raise RuntimeError('boom')
+
+
+class JobQueueTest(TestCase):
+    """Test enqueueing, claiming, retries and dead-lettering"""
+
+    def setUp(self):
+        """Start with no recorded calls"""
+        CALLS.clear()
+
+    def test_worker_runs_and_deletes_jobs(self):
+        """Test due jobs run once and are removed; future jobs wait"""
+        enqueue('tests.record', {'value': 1})
+        enqueue('tests.record', {'value': 2}, delay=timedelta(hours=1))
+
+        self.assertEqual(Worker(workers=2).run(once=True), 1)
+        self.assertEqual(CALLS, [1])
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_claim_skips_running_jobs(self):
+        """Test a claimed job is not handed to a second worker"""
+        enqueue('tests.record', {'value': 1})
+        self.assertEqual(len(claim('worker-a', 10)), 1)
+        self.assertEqual(claim('worker-b', 10), [])
+
+    def test_failures_back_off_then_dead_letter(self):
+        """Test a failing job is retried later and dead-lettered after max_attempts"""
+        enqueue('tests.explode')
+
+        Worker(pool='inline').run(once=True)
+        queued = Job.objects.get()
+        self.assertEqual((queued.status, queued.attempts), ('QUEUED', 1))
+        self.assertGreater(queued.run_at, timezone.now())
+        self.assertIn('boom', queued.last_error)
+
+        Job.objects.update(run_at=timezone.now())
+        Worker(pool='inline').run(once=True)
+        self.assertFalse(Job.objects.exists())
+        dead = DeadJob.objects.get()
+        self.assertEqual((dead.name, dead.attempts), ('tests.explode', 2))
+
+    def test_stale_jobs_are_released(self):
+        """Test jobs held by a lost worker are requeued"""
+        enqueue('tests.record', {'value': 1})
+        claim('lost-worker', 10)
+        Job.objects.update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(release_stale(timedelta(minutes=10)), 1)
+        self.assertEqual(Job.objects.get().status, 'QUEUED')
+
+    def test_heartbeat_keeps_slow_jobs_claimed(self):
+        """Test a renewed claim is not released, and only the claiming worker can renew it"""
+        enqueue('tests.record', {'value': 1})
+        [claimed] = claim('busy-worker', 10)
+        Job.objects.update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(heartbeat([claimed.id], 'other-worker'), 0)
+        self.assertEqual(heartbeat([claimed.id], 'busy-worker'), 1)
+        self.assertEqual(release_stale(timedelta(minutes=10)), 0)
+        self.assertEqual(Job.objects.get().status, 'RUNNING')
+
+    def test_worker_renews_claims_while_jobs_run(self):
+        """Test a job running past a third of the stale window gets its claim renewed"""
+        from . import queue
+        enqueue('tests.slow', {'seconds': 0.5})
+        with mock.patch.object(queue, 'heartbeat', wraps=queue.heartbeat) as renew:
+            Worker(workers=1, stale_after=timedelta(seconds=0.6)).run(once=True)
+        self.assertTrue(renew.called)
+        self.assertFalse(Job.objects.exists())
+
+    def test_unknown_job_is_rejected(self):
+        """Test enqueueing a job nobody handles fails immediately"""
+        with self.assertRaises(KeyError):
+            enqueue('tests.missing')
+
+
+@override_settings(
+    EMAIL_BACKEND='jobs.mail.QueuedEmailBackend',
+    JOBS_EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+)
+class QueuedEmailTest(TestCase):
+    """Test email is queued by the request and delivered by the worker"""
+
+    def test_password_reset_email_is_queued(self):
+        """Test the password reset view sends nothing itself"""
+        User.objects.create_user(
+            username='forgetful', email='forgetful@test.com', password='testpass123', full_legal_name='F'
+        )
+        response = self.client.post(reverse('password_reset'), {'email': 'forgetful@test.com'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(Job.objects.filter(name='jobs.send_email').count(), 1)
+
+        Worker(pool='inline').run(once=True)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['forgetful@test.com'])
+
+
+class PooledDeliveryTest(TestCase):
+    """Test batched delivery over pooled connections against a local SMTP sink"""
+
+    def setUp(self):
+        """Start an SMTP sink on a free port and point delivery at it"""
+        from .smtp_sink import SMTPSink
+        self.sink = SMTPSink('localhost', 0).start()
+        self.addCleanup(self.sink.stop)
+        overrides = override_settings(
+            EMAIL_BACKEND='jobs.mail.QueuedEmailBackend',
+            JOBS_EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='localhost', EMAIL_PORT=self.sink.port, EMAIL_USE_TLS=False,
+            EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD='',
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def queue_mail(self, count):
+        from django.core.mail import send_mail
+        for i in range(count):
+            send_mail(f'Booking {i}', 'Your booking is confirmed.', 'noreply@pointride.com', [f'rider{i}@test.com'])
+
+    def test_batch_reuses_connections(self):
+        """Test a batch of 50 messages is sent over at most the pool's connections"""
+        from .delivery import ConnectionPool, deliver_queued_mail
+
+        self.queue_mail(50)
+        pool = ConnectionPool(size=3)
+        sent, failed, seconds = deliver_queued_mail(batch_size=100, pool=pool)
+        pool.close()
+
+        self.assertEqual((sent, failed), (50, 0))
+        self.assertEqual(len(self.sink.messages), 50)
+        self.assertLessEqual(self.sink.connections, 3)
+        self.assertEqual(pool.opened, self.sink.connections)
+        self.assertFalse(Job.objects.exists())
+
+    def test_connections_are_recycled(self):
+        """Test a connection is replaced after max_messages"""
+        from .delivery import ConnectionPool, deliver_queued_mail
+
+        self.queue_mail(6)
+        pool = ConnectionPool(size=1, max_messages=2)
+        deliver_queued_mail(pool=pool)
+        pool.close()
+        self.assertEqual(self.sink.connections, 3)
+
+    def test_refused_recipient_keeps_the_connection(self):
+        """Test a recipient-level refusal fails only that message and the connection is reused"""
+        from .delivery import ConnectionPool, deliver_queued_mail
+
+        self.sink.refused.add('rider0@test.com')
+        self.queue_mail(3)
+        pool = ConnectionPool(size=1)
+        sent, failed, seconds = deliver_queued_mail(pool=pool)
+        pool.close()
+        self.assertEqual((sent, failed), (2, 1))
+        self.assertEqual(self.sink.connections, 1)
+
+    def test_undeliverable_batch_is_retried(self):
+        """Test messages that cannot be sent go back on the queue for a retry"""
+        from .delivery import ConnectionPool, deliver_queued_mail
+
+        self.queue_mail(2)
+        self.sink.stop()
+        pool = ConnectionPool(size=2)
+        sent, failed, seconds = deliver_queued_mail(pool=pool)
+        self.assertEqual((sent, failed), (0, 2))
+        self.assertEqual(list(Job.objects.values_list('status', 'attempts')), [('QUEUED', 1)] * 2)
@@ -0,0 +1,37 @@
+# pointRide/checks.py
+
+"""
+Deployment checks for settings that name a cache every worker must share.
+
+A LocMemCache lives inside one process: what one worker stores or deletes
+there is invisible to the others. Each app registers the cache settings it
+depends on with require_shared_cache(); `manage.py check --deploy` then
+fails while any of them points at a process-local backend.
+"""
+
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+)
+
+
+def is_process_local(alias):
+    """True when the cache alias is private to each process"""
+    return settings.CACHES.get(alias, {}).get('BACKEND') in PROCESS_LOCAL_BACKENDS
+
+
+def require_shared_cache(setting, check_id, consequence):
+    """Register a deploy check that the cache named by `setting` is shared across processes"""
+    def check(app_configs, **kwargs):
+        alias = getattr(settings, setting)
+        if not is_process_local(alias):
+            return []
+        return [Error(
+            f"{setting} ('{alias}') is a per-process LocMemCache: {consequence}.",
+            hint="Point it at a cache all workers share, such as Redis or Memcached.",
+            id=check_id,
+        )]
+    check.__name__ = f'check_{setting.lower()}'
+    return register(check, Tags.caches, deploy=True)
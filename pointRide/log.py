@@ -0,0 +1,200 @@
+# pointRide/log.py
+
+"""
+Structured logging for request handlers.
+
+- RequestIDMiddleware gives every request an id (taken from a well-formed
+  X-Request-ID header or generated) and echoes it on the response.
+- RequestIDFilter stamps that id on every record logged while the request
+  is being handled.
+- SamplingFilter keeps a fraction of DEBUG/INFO records per logger. The
+  decision is made per request id, so a sampled request keeps all of its
+  lines. Warnings and errors are never sampled out.
+- QueuedStreamHandler formats records as JSON on a background thread. The
+  request thread only puts the record on a bounded queue; if the queue is
+  full the record is dropped and counted rather than blocking the request;
+  dropped_records() totals the count (shown in the staff health check).
+
+Pass context with `extra`, e.g. logger.info('login', extra={'user_id': 5});
+extra fields become keys in the JSON line.
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import queue
+import random
+import re
+import sys
+import uuid
+import weakref
+import zlib
+from logging.handlers import QueueHandler, QueueListener
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+_request_id = contextvars.ContextVar('request_id', default=None)
+
+_VALID_REQUEST_ID = re.compile(r'^[A-Za-z0-9._-]{8,64}$')
+
+# Attributes every LogRecord has; anything else came in through `extra`
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'request_id'}
+
+# Live QueuedStreamHandlers, for dropped_records()
+_queued_handlers = weakref.WeakSet()
+
+
+def get_request_id():
+    return _request_id.get()
+
+
+def dropped_records():
+    """Records this process's QueuedStreamHandlers have dropped on a full queue"""
+    return sum(handler.dropped for handler in list(_queued_handlers))
+
+
+class RequestIDMiddleware:
+    """Bind a request id for the duration of the request"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def bind(self, request):
+        incoming = request.headers.get(REQUEST_ID_HEADER, '')
+        request.request_id = incoming if _VALID_REQUEST_ID.match(incoming) else uuid.uuid4().hex
+        return _request_id.set(request.request_id)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = self.bind(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_id.reset(token)
+        response[REQUEST_ID_HEADER] = request.request_id
+        return response
+
+    async def __acall__(self, request):
+        token = self.bind(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_id.reset(token)
+        response[REQUEST_ID_HEADER] = request.request_id
+        return response
+
+
+class RequestIDFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = _request_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep `rates[logger]` (0.0-1.0) of records below WARNING.
+
+    The most specific configured logger name wins, so {'accounts': 0.1,
+    'accounts.views': 1.0} keeps everything from accounts.views.
+    """
+
+    def __init__(self, rates=None, name=''):
+        super().__init__(name)
+        self.rates = dict(rates or {})
+
+    def rate_for(self, logger_name):
+        name = logger_name
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition('.')[0]
+        return 1.0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate_for(record.name)
+        if rate >= 1.0:
+            return True
+        request_id = _request_id.get()
+        if request_id is not None:
+            return zlib.crc32(request_id.encode()) / 0xFFFFFFFF < rate
+        return random.random() < rate
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class QueuedStreamHandler(QueueHandler):
+    """
+    Hand records to a background thread that writes them to a stream.
+
+    Never blocks the caller: records arriving while `maxsize` are already
+    waiting are dropped and counted in `dropped`.
+    """
+
+    def __init__(self, stream=None, maxsize=10000):
+        super().__init__(queue.Queue(maxsize=maxsize))
+        self.dropped = 0
+        self.target = logging.StreamHandler(stream or sys.stderr)
+        self.target.setFormatter(JSONFormatter())
+        self.listener = QueueListener(self.queue, self.target, respect_handler_level=False)
+        self.listener.start()
+        atexit.register(self.stop)
+        _queued_handlers.add(self)
+
+    def setFormatter(self, fmt):
+        # Formatting happens on the listener thread
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Resolve the message now (args may change after the call returns)
+        # but leave JSON encoding to the listener thread
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self):
+        """Flush waiting records and stop the listener thread"""
+        if self.listener._thread is not None:
+            self.listener.stop()
+
+    def close(self):
+        self.stop()
+        super().close()
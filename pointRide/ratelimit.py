@@ -0,0 +1,190 @@
+# pointRide/ratelimit.py
+
+"""
+Token-bucket rate limiting backed by the shared cache.
+
+Each bucket is stored as a single integer (the GCRA "theoretical arrival
+time" in milliseconds) and a decision is one atomic cache.add() or
+cache.incr(), regardless of the limit, so workers sharing the cache never
+hand out the same token twice. That needs a cache every worker shares
+(Redis or Memcached); `check --deploy` rejects a per-process RATELIMIT_CACHE.
+Buckets are keyed by scope (one per endpoint) plus an identity: the client
+IP, the logged-in user, a posted field such as the username being tried, or
+several of these joined with '+'. A posted field is combined with the IP
+('post:username+ip'), so nobody can empty another person's bucket and lock
+them out from wherever they are.
+
+Limits are written as "<requests>/<period>" where period is s, m, h or d,
+for example "10/m". A per-scope override can be set in settings:
+
+    RATELIMITS = {'login': '5/m', 'api_search': '120/m'}
+
+Behind a proxy the client IP is read from RATELIMIT_IP_HEADER (e.g.
+X-Forwarded-For): the address added by the RATELIMIT_TRUSTED_PROXIES-th
+proxy from the end, ignoring anything a client put before it.
+
+Allowed and blocked decisions are counted per scope; see counters().
+"""
+
+import math
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, JsonResponse
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+KEY_PREFIX = 'ratelimit.'
+
+# Scopes registered by the decorator, so counters() knows what to report
+SCOPES = set()
+
+def parse_rate(rate):
+    """'10/m' -> (10, 60.0)"""
+    count, _, period = rate.partition('/')
+    return int(count), float(PERIODS[period.strip()[:1]])
+
+
+def get_cache():
+    return caches[getattr(settings, 'RATELIMIT_CACHE', 'default')]
+
+
+def client_ip(request):
+    """The client address as seen by the nearest trusted proxy, or REMOTE_ADDR without one"""
+    header = getattr(settings, 'RATELIMIT_IP_HEADER', None)
+    if header:
+        addresses = [address.strip() for address in request.META.get(header, '').split(',') if address.strip()]
+        proxies = getattr(settings, 'RATELIMIT_TRUSTED_PROXIES', 1)
+        if len(addresses) >= proxies:
+            return addresses[-proxies]
+    return request.META.get('REMOTE_ADDR') or 'unknown'
+
+
+def identity(request, key):
+    """
+    Identity string for a bucket key: 'ip', 'user', 'user_or_ip',
+    'post:<field>', or several joined with '+'. Returns None when the key
+    (or any part of it) does not apply to the request.
+    """
+    if '+' in key:
+        parts = [identity(request, part) for part in key.split('+')]
+        return None if None in parts else '|'.join(parts)
+    if key == 'ip':
+        return 'ip:' + client_ip(request)
+    if key in ('user', 'user_or_ip'):
+        if request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        return 'ip:' + client_ip(request) if key == 'user_or_ip' else None
+    if key.startswith('post:'):
+        value = request.POST.get(key[5:], '').strip().lower()
+        return f'{key}:{value}' if value else None
+    raise ValueError(f"Unknown rate limit key: {key}")
+
+
+def consume(bucket, rate, now=None):
+    """
+    Take one token from a bucket.
+
+    Returns (allowed, retry_after_seconds). A bucket holds up to `count`
+    tokens and refills one every period / count seconds. The stored arrival
+    time expires once it has passed (the bucket is full again), so a first
+    request is one add() and later ones one incr(); a refused token is
+    handed back with decr().
+    """
+    count, period = parse_rate(rate)
+    interval = int(period * 1000 / count)
+    now = int((time.time() if now is None else now) * 1000)
+    cache = get_cache()
+    key = KEY_PREFIX + bucket
+
+    if cache.add(key, now + interval, timeout=math.ceil(interval / 1000)):
+        return True, 0.0
+    try:
+        tat = cache.incr(key, interval)
+    except ValueError:  # expired since the add()
+        cache.add(key, now + interval, timeout=math.ceil(interval / 1000))
+        return True, 0.0
+
+    allow_at = tat - int(period * 1000)
+    if now < allow_at:
+        try:
+            cache.decr(key, interval)
+        except ValueError:
+            pass
+        return False, (allow_at - now) / 1000
+    cache.touch(key, max(1, math.ceil((tat - now) / 1000)))
+    return True, 0.0
+
+
+def record(scope, allowed):
+    """Bump the allowed/blocked counter for a scope"""
+    cache = get_cache()
+    key = f"{KEY_PREFIX}count.{scope}.{'allowed' if allowed else 'blocked'}"
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+
+def counters():
+    """{scope: {'allowed': n, 'blocked': n}} for every registered scope"""
+    keys = {
+        f'{KEY_PREFIX}count.{scope}.{outcome}': (scope, outcome)
+        for scope in SCOPES
+        for outcome in ('allowed', 'blocked')
+    }
+    values = get_cache().get_many(list(keys))
+    result = {scope: {'allowed': 0, 'blocked': 0} for scope in SCOPES}
+    for key, (scope, outcome) in keys.items():
+        result[scope][outcome] = values.get(key, 0)
+    return result
+
+
+def too_many_requests(request, retry_after):
+    """429 response; JSON for API endpoints, plain text otherwise"""
+    seconds = max(1, int(retry_after + 0.999))
+    if request.path.startswith('/rides/api/') or 'application/json' in request.headers.get('Accept', ''):
+        response = JsonResponse(
+            {'error': 'Too many requests', 'retry_after': seconds}, status=429
+        )
+    else:
+        response = HttpResponse(
+            'Too many requests. Please wait a moment and try again.',
+            status=429, content_type='text/plain; charset=utf-8',
+        )
+    response['Retry-After'] = str(seconds)
+    return response
+
+
+def ratelimit(scope, rate, keys=('ip',), methods=('POST',)):
+    """
+    Decorator limiting a view to `rate` per identity in each of `keys`.
+
+    Only requests whose method is in `methods` are counted. The request is
+    rejected with 429 if any of its buckets is empty.
+    """
+    SCOPES.add(scope)
+
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if not getattr(settings, 'RATELIMIT_ENABLE', True) or request.method not in methods:
+                return view(request, *args, **kwargs)
+
+            limit = getattr(settings, 'RATELIMITS', {}).get(scope, rate)
+            for key in keys:
+                ident = identity(request, key)
+                if ident is None:
+                    continue
+                allowed, retry_after = consume(f'{scope}:{ident}', limit)
+                if not allowed:
+                    record(scope, False)
+                    return too_many_requests(request, retry_after)
+
+            record(scope, True)
+            return view(request, *args, **kwargs)
+        return wrapped
+    return decorator
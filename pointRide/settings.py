@@ -63,9 +63,11 @@ INSTALLED_APPS = [
     'accounts',
     'rides',  # Added rides app
     'verification',  # Added verification app
+    'jobs',  # Database-backed background jobs
 ]
 
 MIDDLEWARE = [
+    'pointRide.log.RequestIDMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -132,6 +134,8 @@ AUTH_PASSWORD_VALIDATORS = [
 
 # pointRide/settings.py
 AUTH_USER_MODEL = 'accounts.User'
+# Loads the user with both profiles in the auth middleware's one query
+AUTHENTICATION_BACKENDS = ['accounts.backends.ProfileBackend']
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
@@ -164,7 +168,58 @@ LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/'
 
 # Email configuration (for development)
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# Mail is queued as a job (jobs.mail) and delivered by `manage.py run_jobs`
+# through JOBS_EMAIL_BACKEND, so requests never wait on SMTP
+EMAIL_BACKEND = 'jobs.mail.QueuedEmailBackend'
+JOBS_EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+JOBS_RETRY_BASE = 10  # seconds before the first retry; doubles per attempt
+JOBS_RETRY_CAP = 3600
+# Outbound SMTP connections kept open by the mail workers (jobs.delivery).
+# Try delivery locally with `manage.py run_smtp_sink` on EMAIL_HOST:EMAIL_PORT.
+EMAIL_POOL_SIZE = 4
+EMAIL_KEEPALIVE = 30  # seconds idle before a pooled connection is checked with NOOP
+EMAIL_MAX_MESSAGES_PER_CONNECTION = 100
+
+# Live seat availability (rides.live). The stream needs an ASGI server, e.g.
+# `uvicorn pointRide.asgi:application`; under WSGI ride pages show the seat
+# count as rendered and do not open the stream.
+LIVE_POLL_INTERVAL = 1.0  # seconds between reads of the ride event log
+LIVE_HEARTBEAT_INTERVAL = 15.0  # seconds between keepalive comments to idle clients
+
+# Bump to invalidate every ride/booking page ETag (rides.conditional), e.g.
+# when a deploy changes what those templates render
+PAGE_ETAG_VERSION = '1'
+
+# Delta sync (rides.sync) leaves changes younger than this for the next sync,
+# so a transaction that commits late cannot slip behind a client's token
+SYNC_SETTLE_SECONDS = 5
+
+# Geocoding (rides.geocoding, `manage.py geocode_cities`). Nominatim's usage
+# policy allows one request per second and requires an identifying User-Agent.
+GEOCODING_PROVIDER = 'nominatim'
+GEOCODING_URL = config('GEOCODING_URL', default='https://nominatim.openstreetmap.org')
+GEOCODING_USER_AGENT = 'pointRide-App/1.0 (ride-sharing-platform)'
+GEOCODING_RATE = 1.0  # requests per second, shared by all lookup threads
+GEOCODING_CACHE_PATH = BASE_DIR / 'geocode-cache.jsonl'  # one file per provider (geocode-cache-nominatim.jsonl); reruns resume from it
+
+# Offline gazetteer (rides.gazetteer) used to validate locations, loaded at startup.
+# A location is served if it, its municipality or an active City within
+# SERVICE_RADIUS_KM of it is.
+GAZETTEER_FILE = BASE_DIR / 'rides' / 'data' / 'ontario_places.csv'
+SERVICE_RADIUS_KM = 40
+
+# Ride addresses (rides.addresses) are geocoded by the rides.geocode_ride_addresses
+# job with this provider: 'gazetteer' places them at their town offline,
+# 'nominatim' at street level. Answers are kept in GeocodedAddress behind an
+# in-process LRU of ADDRESS_CACHE_SIZE entries.
+ADDRESS_GEOCODER = 'gazetteer'
+ADDRESS_CACHE_SIZE = 10000
+
+# Clustered route map tiles (rides.maptiles). Tiles are invalidated as rides
+# change, which other workers only see through a shared cache: `check --deploy`
+# fails while MAP_TILE_CACHE is a LocMemCache. MAP_TILE_TTL (seconds) drops departed rides.
+MAP_TILE_CACHE = 'default'
+MAP_TILE_TTL = 600
 EMAIL_HOST = config('EMAIL_HOST', default='localhost')
 EMAIL_PORT = config('EMAIL_PORT', default=1025, cast=int)
 EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=False, cast=bool)
@@ -172,23 +227,56 @@ EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
 DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='noreply@pointride.com')
 
-# Logging configuration
+# Logging (pointRide.log)
+# App loggers write JSON lines from a background thread, tagged with the
+# request id. LOG_SAMPLE_RATES keeps a fraction of DEBUG/INFO lines per logger;
+# warnings and errors are always kept.
+LOG_SAMPLE_RATES = {
+    'accounts': 1.0 if DEBUG else 0.1,
+    'rides': 1.0 if DEBUG else 0.1,
+}
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'filters': {
+        'request_id': {
+            '()': 'pointRide.log.RequestIDFilter',
+        },
+        'sampling': {
+            '()': 'pointRide.log.SamplingFilter',
+            'rates': LOG_SAMPLE_RATES,
+        },
+    },
+    'formatters': {
+        'json': {
+            '()': 'pointRide.log.JSONFormatter',
+        },
+    },
     'handlers': {
         'console': {
             'class': 'logging.StreamHandler',
         },
+        'structured': {
+            '()': 'pointRide.log.QueuedStreamHandler',
+            'filters': ['request_id', 'sampling'],
+            'formatter': 'json',
+        },
     },
     'loggers': {
         'django': {
             'handlers': ['console'],
             'level': 'INFO',
         },
+        'accounts': {
+            'handlers': ['structured'],
+            'level': 'DEBUG' if DEBUG else 'INFO',
+            'propagate': False,
+        },
         'rides': {
-            'handlers': ['console'],
-            'level': 'DEBUG',
+            'handlers': ['structured'],
+            'level': 'DEBUG' if DEBUG else 'INFO',
+            'propagate': False,
         },
     },
 }
@@ -201,8 +289,30 @@ CACHES = {
     }
 }
 
+# Rate limiting (pointRide.ratelimit)
+# Buckets live in RATELIMIT_CACHE; it must be shared by all workers in production
+# (`check --deploy` fails on a LocMemCache). RATELIMITS overrides the per-view
+# default for a scope, e.g. {'login': '5/m', 'api_map': '60/m'}.
+# The Vercel proxy sets X-Forwarded-For; clear RATELIMIT_IP_HEADER when the app
+# is reached directly, or clients could pick their own IP.
+RATELIMIT_ENABLE = True
+RATELIMIT_CACHE = 'default'
+RATELIMITS = {}
+RATELIMIT_IP_HEADER = config('RATELIMIT_IP_HEADER', default='HTTP_X_FORWARDED_FOR')
+RATELIMIT_TRUSTED_PROXIES = config('RATELIMIT_TRUSTED_PROXIES', default=1, cast=int)
+
+# Health endpoints (accounts.health)
+PLATFORM_STATS_TTL = 60  # seconds a stats rollup is served before it is recomputed
+READINESS_TIMEOUT = 2.0  # seconds /readyz waits for SELECT 1
+
 # Session configuration
+# accounts.sessions only writes to the database when the session changed or has
+# less than SESSION_REFRESH_THRESHOLD seconds left. It reads through the cache only
+# when that is shared by all workers (e.g. Redis); with a LocMemCache it reads the
+# database on every request.
+SESSION_ENGINE = 'accounts.sessions'
 SESSION_COOKIE_AGE = 86400  # 24 hours
+SESSION_REFRESH_THRESHOLD = SESSION_COOKIE_AGE // 2
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False
 SESSION_SAVE_EVERY_REQUEST = True
 
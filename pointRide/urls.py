@@ -7,7 +7,7 @@ from django.conf.urls.static import static # Import static to serve media files
 from django.contrib.auth import views as auth_views
 
 # Import the home view from the accounts app
-from accounts.views import home
+from accounts.views import healthz, home, readyz
 from rides.views import route_map  # Import the specific view for maps
 
 urlpatterns = [
@@ -22,6 +22,10 @@ urlpatterns = [
     # Map route for your teammate's map work (specific endpoint)
     path('accounts/maps/', route_map, name='accounts_maps'),  # This connects to your teammate's work
 
+    # Load balancer probes
+    path('healthz', healthz, name='healthz'),
+    path('readyz', readyz, name='readyz'),
+
     # Set the home view for the root URL
     path('', home, name='home'), # This uses the 'home' view from accounts.views
 
@@ -0,0 +1,206 @@
+# rides/addresses.py
+
+"""
+Server-side geocoding of free-text pickup and drop-off addresses.
+
+Addresses are normalized (case, accents, punctuation and common street
+abbreviations folded) and qualified with their city, so "123 King Street
+West" in Toronto and "123 king st w, toronto" share one GeocodedAddress row.
+Reads go through an in-process LRU in front of that table; only the
+rides.geocode_ride_addresses job calls a provider (ADDRESS_GEOCODER), so
+request handling never waits on a geocoder. The job stores each ride's
+coordinates on the ride itself.
+"""
+
+import threading
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .gazetteer import ONTARIO_WORDS, normalize
+from .geocoding import PROVIDERS, Place, RateLimiter, lookup
+from .maptiles import invalidate_points
+from .models import City, GeocodedAddress, Ride, SyncChange
+
+ABBREVIATIONS = {
+    'street': 'st', 'avenue': 'ave', 'road': 'rd', 'drive': 'dr', 'boulevard': 'blvd', 'crescent': 'cres',
+    'court': 'ct', 'place': 'pl', 'lane': 'ln', 'highway': 'hwy', 'parkway': 'pkwy', 'square': 'sq',
+    'terrace': 'terr', 'circle': 'cir', 'north': 'n', 'south': 's', 'east': 'e', 'west': 'w',
+    'saint': 'st', 'mount': 'mt', 'station': 'stn',
+}
+
+COORDINATE_PLACES = Decimal('0.000001')
+
+
+def normalize_address(location, city=''):
+    """Cache key for an address in a city"""
+    parts = []
+    for part in (location, city):
+        words = [ABBREVIATIONS.get(word, word) for word in normalize(part or '').split()]
+        while words and words[-1] in ONTARIO_WORDS:
+            words.pop()
+        if words and (not parts or words != parts[-1][-len(words):]):
+            parts.append(words)
+    return ' '.join(' '.join(words) for words in parts)[:400]
+
+
+class LRUCache:
+    """Thread-safe least-recently-used map of at most `size` entries"""
+
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key not in self.entries:
+                return default
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+# (latitude, longitude), or None for addresses that could not be located
+cache = LRUCache(getattr(settings, 'ADDRESS_CACHE_SIZE', 10000))
+
+_MISSING = object()
+
+
+def cached_coordinates(keys):
+    """{key: (latitude, longitude) or None} for the keys already geocoded; one query at most"""
+    found, misses = {}, []
+    for key in keys:
+        value = cache.get(key, _MISSING)
+        if value is _MISSING:
+            misses.append(key)
+        else:
+            found[key] = value
+    if misses:
+        for key, latitude, longitude in GeocodedAddress.objects.filter(address__in=misses).values_list(
+            'address', 'latitude', 'longitude'
+        ):
+            value = (latitude, longitude) if latitude is not None else None
+            cache.put(key, value)
+            found[key] = value
+    return found
+
+
+def lookup_address(location, city=''):
+    """Coordinates of an address if it has been geocoded, else None; never calls a geocoder"""
+    key = normalize_address(location, city)
+    return cached_coordinates([key]).get(key)
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def limiter(provider):
+    """One rate limiter per process, shared by every job thread; none for offline providers"""
+    global _limiter
+    if provider.offline:
+        return RateLimiter(float('inf'))
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter(settings.GEOCODING_RATE)
+        return _limiter
+
+
+def geocode_addresses(queries):
+    """
+    {key: (latitude, longitude) or None} for {key: address text}.
+
+    Cached keys are answered from the LRU or table; the rest are looked up
+    with ADDRESS_GEOCODER and stored. GeocodingError propagates, so the job
+    is retried later rather than caching a failure.
+    """
+    found = cached_coordinates(queries)
+    missing = [key for key in queries if key not in found]
+    if not missing:
+        return found
+
+    provider = PROVIDERS[settings.ADDRESS_GEOCODER]()
+    rows = []
+    for key in missing:
+        location = lookup(Place(queries[key], 'Ontario', 'Canada'), provider, limiter(provider))
+        value = None
+        if location is not None and location.province in (None, 'Ontario'):
+            value = (Decimal(str(location.latitude)).quantize(COORDINATE_PLACES),
+                     Decimal(str(location.longitude)).quantize(COORDINATE_PLACES))
+        rows.append(GeocodedAddress(
+            address=key, latitude=value and value[0], longitude=value and value[1],
+            provider=provider.name, geocoded_at=timezone.now(),
+        ))
+        found[key] = value
+    GeocodedAddress.objects.bulk_create(
+        rows, update_conflicts=True, unique_fields=['address'],
+        update_fields=['latitude', 'longitude', 'provider', 'geocoded_at'],
+    )
+    for row in rows:
+        cache.put(row.address, found[row.address])
+    return found
+
+
+def geocode_rides(ride_ids):
+    """
+    Store the pickup and drop-off coordinates of rides; returns the rides updated.
+
+    An address that cannot be located falls back to its city's coordinates.
+    """
+    rides = list(Ride.objects.filter(id__in=ride_ids).values_list(
+        'id', 'pickup_location', 'pickup_city_id', 'dropoff_location', 'dropoff_city_id',
+        'pickup_latitude', 'pickup_longitude',
+    ))
+    if not rides:
+        return 0
+    cities = {
+        city_id: (name, (latitude, longitude) if latitude is not None else None)
+        for city_id, name, latitude, longitude in City.objects.filter(
+            id__in={ride[2] for ride in rides} | {ride[4] for ride in rides}
+        ).values_list('id', 'name', 'latitude', 'longitude')
+    }
+
+    queries = {}
+    keys = []
+    for ride_id, pickup, pickup_city, dropoff, dropoff_city, _, _ in rides:
+        ends = []
+        for location, city_id in ((pickup, pickup_city), (dropoff, dropoff_city)):
+            city_name = cities[city_id][0]
+            key = normalize_address(location, city_name)
+            queries[key] = f"{location}, {city_name}"
+            ends.append((key, city_id))
+        keys.append((ride_id, ends))
+    coordinates = geocode_addresses(queries)
+
+    updated = []
+    for ride_id, ((pickup_key, pickup_city), (dropoff_key, dropoff_city)) in keys:
+        pickup = coordinates.get(pickup_key) or cities[pickup_city][1] or (None, None)
+        dropoff = coordinates.get(dropoff_key) or cities[dropoff_city][1] or (None, None)
+        ride = Ride(
+            id=ride_id, pickup_latitude=pickup[0], pickup_longitude=pickup[1],
+            dropoff_latitude=dropoff[0], dropoff_longitude=dropoff[1],
+        )
+        ride.set_geohashes()
+        updated.append(ride)
+    Ride.objects.bulk_update(updated, [*Ride.COORDINATE_FIELDS, *Ride.GEOHASH_FIELDS])
+    SyncChange.objects.for_rides([ride.id for ride in updated])
+
+    # The map tiles where the rides were and now are
+    moved = {(ride[5], ride[6]) for ride in rides if ride[5] is not None}
+    moved |= {(ride.pickup_latitude, ride.pickup_longitude) for ride in updated if ride.pickup_latitude is not None}
+    transaction.on_commit(lambda: invalidate_points('rides', moved))
+    return len(updated)
@@ -1,13 +1,60 @@
 # rides/admin.py
 
-from django.contrib import admin
-from .models import City, Route, Ride, Booking, RideReview
+import re
+
+from django import forms
+from django.contrib import admin, messages
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+
+from accounts.models import User
+from .models import City, Route, Ride, Booking, RideReview, RideEvent, RideSeries
+from .lifecycle import cancel_rides
+from .series import cancel_series
+from .imports import COLUMNS, detect_format, import_rides
+from .gazetteer import get_gazetteer
+from .spatial import within_radius
+
+NEAR_SEARCH = re.compile(r'^near:\s*(?P<where>.+?)(?:\s+(?P<radius>\d+(?:\.\d+)?)\s*km)?\s*$', re.IGNORECASE)
+COORDINATES = re.compile(r'^(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)$')
+
+class NearSearchMixin:
+    """
+    Admin search for "near:<place or lat,lon> [N km]": the rows whose
+    `near_columns` point is within N km (default near_radius_km), found
+    through the geohash indexes (rides.spatial).
+    """
+    near_columns = None
+    near_radius_km = 10
+    
+    def get_search_results(self, request, queryset, search_term):
+        match = NEAR_SEARCH.match(search_term.strip())
+        if not match:
+            return super().get_search_results(request, queryset, search_term)
+        coordinates = COORDINATES.match(match['where'])
+        if coordinates:
+            point = (float(coordinates[1]), float(coordinates[2]))
+        else:
+            gazetteer = get_gazetteer()
+            place = gazetteer.find(match['where'])
+            if place is None:
+                self.message_user(request, f"Unknown place: {match['where']}", messages.WARNING)
+                return queryset.none(), False
+            point = gazetteer.coordinates(place)
+        radius = float(match['radius'] or self.near_radius_km)
+        columns = self.near_columns
+        candidates = queryset.select_related(None).only('pk', *columns.coordinate_fields)
+        rows = within_radius(candidates, columns, *point, radius)
+        return queryset.filter(pk__in=[row.pk for row, _ in rows]), False
 
 @admin.register(City)
-class CityAdmin(admin.ModelAdmin):
+class CityAdmin(NearSearchMixin, admin.ModelAdmin):
     list_display = ['name', 'province', 'country', 'is_active']
     list_filter = ['province', 'country', 'is_active']
     search_fields = ['name', 'province']
+    search_help_text = 'Name or province, or near:<place or lat,lon> [N km]'
+    near_columns = City.LOCATION
     list_editable = ['is_active']
     ordering = ['name']
     
@@ -16,10 +63,11 @@ class CityAdmin(admin.ModelAdmin):
             'fields': ('name', 'province', 'country', 'is_active')
         }),
         ('Coordinates', {
-            'fields': ('latitude', 'longitude'),
+            'fields': ('latitude', 'longitude', 'geohash'),
             'classes': ('collapse',)
         }),
     )
+    readonly_fields = ('geohash',)
 
 @admin.register(Route)
 class RouteAdmin(admin.ModelAdmin):
@@ -46,21 +94,33 @@ class RouteAdmin(admin.ModelAdmin):
     
     readonly_fields = ('created_at',)
 
+class RideImportUploadForm(forms.Form):
+    file = forms.FileField(help_text="CSV with a header row, or JSON (an array of objects or one object per line)")
+    driver = forms.ModelChoiceField(
+        queryset=User.objects.filter(is_driver=True), required=False,
+        help_text="Driver for rows without a driver column"
+    )
+    dry_run = forms.BooleanField(required=False, help_text="Validate only; create nothing")
+
 @admin.register(Ride)
-class RideAdmin(admin.ModelAdmin):
+class RideAdmin(NearSearchMixin, admin.ModelAdmin):
+    change_list_template = 'admin/rides/ride/change_list.html'
+
     list_display = ['pickup_city', 'dropoff_city', 'driver', 'departure_date', 'departure_time', 'available_seats', 'price_per_seat', 'status']
     list_filter = ['status', 'departure_date', 'pickup_city', 'dropoff_city', 'created_at']
     search_fields = ['driver__username', 'driver__full_legal_name', 'pickup_city__name', 'dropoff_city__name']
+    search_help_text = 'Driver or city, or near:<place or lat,lon> [N km] for pickups'
+    near_columns = Ride.PICKUP
     list_editable = ['status']
     ordering = ['-departure_date', '-departure_time']
     date_hierarchy = 'departure_date'
     
     fieldsets = (
         ('Route Information', {
-            'fields': ('route', 'driver', 'pickup_city', 'dropoff_city', 'pickup_location', 'dropoff_location')
+            'fields': ('route', 'driver', 'series', 'pickup_city', 'dropoff_city', 'pickup_location', 'dropoff_location')
         }),
         ('Schedule', {
-            'fields': ('departure_date', 'departure_time')
+            'fields': ('departure_date', 'departure_time', 'departs_at')
         }),
         ('Ride Details', {
             'fields': ('available_seats', 'price_per_seat', 'notes')
@@ -74,10 +134,81 @@ class RideAdmin(admin.ModelAdmin):
         }),
     )
     
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = ('departs_at', 'created_at', 'updated_at')
+    actions = ['cancel_selected_rides']
     
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('driver', 'pickup_city', 'dropoff_city', 'route')
+    
+    def save_model(self, request, obj, form, change):
+        """Route cancellations (including list_editable) through the booking cascade"""
+        if change and obj.status == 'CANCELLED' and 'status' in form.changed_data:
+            obj.status = form.initial['status']
+            super().save_model(request, obj, form, change)
+            cancel_rides([obj.pk], actor=request.user, by_staff=True)
+            obj.refresh_from_db(fields=['status', 'updated_at'])
+        else:
+            super().save_model(request, obj, form, change)
+    
+    @admin.action(description='Cancel selected rides and their bookings')
+    def cancel_selected_rides(self, request, queryset):
+        cancelled = cancel_rides(list(queryset.values_list('id', flat=True)), actor=request.user, by_staff=True)
+        self.message_user(request, f'{cancelled} ride(s) cancelled.')
+    
+    def get_urls(self):
+        return [
+            path('import/', self.admin_site.admin_view(self.import_view), name='rides_ride_import'),
+        ] + super().get_urls()
+    
+    def import_view(self, request):
+        """Upload a ride file; rows are validated and inserted in this request (see rides.imports)"""
+        if not self.has_add_permission(request):
+            return redirect('admin:rides_ride_changelist')
+        
+        form = RideImportUploadForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['file']
+            try:
+                report = import_rides(
+                    upload.file, detect_format(upload.name), driver=form.cleaned_data['driver'],
+                    dry_run=form.cleaned_data['dry_run'],
+                )
+            except ValueError as e:
+                form.add_error('file', f"Could not read the file: {e}")
+            else:
+                level = messages.WARNING if report.failed else messages.SUCCESS
+                prefix = '[dry run] ' if form.cleaned_data['dry_run'] else ''
+                self.message_user(request, f'{prefix}{report}', level)
+                for number, row_errors in report.errors[:10]:
+                    self.message_user(request, f"Row {number}: {'; '.join(row_errors)}", messages.WARNING)
+                return redirect('admin:rides_ride_changelist')
+        
+        return TemplateResponse(request, 'admin/rides/ride/import.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Import rides',
+            'form': form,
+            'columns': COLUMNS,
+        })
+
+@admin.register(RideSeries)
+class RideSeriesAdmin(admin.ModelAdmin):
+    list_display = ['__str__', 'driver', 'start_date', 'end_date', 'status', 'created_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['driver__username', 'driver__full_legal_name']
+    ordering = ['-created_at']
+    readonly_fields = ('created_at',)
+    actions = ['cancel_selected_series']
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'driver', 'route__origin_city', 'route__destination_city'
+        )
+    
+    @admin.action(description='Cancel selected series and their upcoming rides')
+    def cancel_selected_series(self, request, queryset):
+        cancelled = sum(cancel_series(series, actor=request.user, by_staff=True) for series in queryset)
+        self.message_user(request, f'{cancelled} ride(s) cancelled.')
 
 @admin.register(Booking)
 class BookingAdmin(admin.ModelAdmin):
@@ -136,6 +267,29 @@ class RideReviewAdmin(admin.ModelAdmin):
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('ride', 'reviewer', 'reviewee')
 
+@admin.register(RideEvent)
+class RideEventAdmin(admin.ModelAdmin):
+    list_display = ['id', 'event_type', 'ride', 'booking', 'from_status', 'to_status', 'seats', 'created_at']
+    list_filter = ['event_type', 'to_status', 'created_at']
+    search_fields = ['ride__id', 'booking__id']
+    ordering = ['-id']
+    readonly_fields = [field.name for field in RideEvent._meta.fields]
+    
+    # The event log is append-only
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        """Never from the log's own pages; deleting a ride or user still takes its events with it"""
+        match = request.resolver_match
+        own_page = f'{self.opts.app_label}_{self.opts.model_name}_'
+        if match is None or (match.url_name or '').startswith(own_page):
+            return False
+        return super().has_delete_permission(request, obj)
+
 # Custom admin site configuration
 admin.site.site_header = "pointRide Administration"
 admin.site.site_title = "pointRide Admin"
@@ -0,0 +1,465 @@
+# rides/api.py
+
+"""
+Versioned JSON API (v1) for the mobile app.
+
+Responses are built straight from values_list() tuples: each resource maps
+its public field names to ORM lookups, a request picks a subset with
+?fields=a,b,c, and only those columns (and only the annotations they need)
+are selected. No model instances are created for list responses.
+
+Lists use keyset pagination: the response's `next` is an opaque, signed
+cursor holding the sort key of the last row, and the following page starts
+strictly after it. Pages stay as cheap deep into a result set as on page one
+and do not skip or repeat rows when rides are added in between.
+"""
+
+import logging
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from functools import wraps
+
+from django.core import signing
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Coalesce
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.http import require_GET, require_POST
+
+from pointRide.ratelimit import ratelimit
+
+from .conditional import conditional_page, ride_version
+from .gazetteer import get_gazetteer
+from .lifecycle import booking_action
+from .models import Ride, Booking, RideReview, combine_departure
+from .nearby import DEFAULT_RADIUS_KM, MAX_RADIUS_KM, nearby_rides
+from .search import driver_rating, seats_booked
+from .sync import InvalidToken, changes_since, make_token, read_token
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+CURSOR_SALT = 'rides.api.cursor'
+
+# Keyset sort value for rides without a departure (departs_at is NULL until
+# both date and time are set); they sort after every dated ride
+NO_DEPARTURE = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+# Public field name -> ORM lookup
+RIDE_FIELDS = {
+    'id': 'id',
+    'status': 'status',
+    'departs_at': 'departs_at',
+    'pickup_city': 'pickup_city__name',
+    'pickup_city_id': 'pickup_city_id',
+    'pickup_location': 'pickup_location',
+    'dropoff_city': 'dropoff_city__name',
+    'dropoff_city_id': 'dropoff_city_id',
+    'dropoff_location': 'dropoff_location',
+    'price_per_seat': 'price_per_seat',
+    'available_seats': 'available_seats',
+    'seats_left': 'seats_left',
+    'driver_id': 'driver_id',
+    'driver_name': 'driver__full_legal_name',
+    'driver_rating': 'driver_rating',
+    'series_id': 'series_id',
+    'notes': 'notes',
+    'updated_at': 'updated_at',
+}
+
+BOOKING_FIELDS = {
+    'id': 'id',
+    'status': 'status',
+    'ride_id': 'ride_id',
+    'departs_at': 'ride__departs_at',
+    'pickup_city': 'ride__pickup_city__name',
+    'dropoff_city': 'ride__dropoff_city__name',
+    'seats_booked': 'seats_booked',
+    'total_price': 'total_price',
+    'traveller_id': 'traveller_id',
+    'created_at': 'created_at',
+    'confirmed_at': 'confirmed_at',
+    'updated_at': 'updated_at',
+}
+
+REVIEW_FIELDS = {
+    'id': 'id',
+    'ride_id': 'ride_id',
+    'reviewer_id': 'reviewer_id',
+    'reviewee_id': 'reviewee_id',
+    'reviewer_type': 'reviewer_type',
+    'rating': 'rating',
+    'comment': 'comment',
+    'created_at': 'created_at',
+}
+
+# Fields computed per row; annotated only when requested
+RIDE_ANNOTATIONS = {
+    'seats_left': lambda: F('available_seats') - seats_booked(),
+    'driver_rating': driver_rating,
+}
+
+# Compact defaults for list endpoints; ?fields= selects any others
+RIDE_LIST_FIELDS = ('id', 'departs_at', 'pickup_city', 'dropoff_city', 'price_per_seat', 'seats_left')
+BOOKING_LIST_FIELDS = ('id', 'status', 'ride_id', 'departs_at', 'pickup_city', 'dropoff_city', 'seats_booked')
+
+# ?sort= -> keyset ordering, as (lookup, descending) pairs ending in a unique column
+SEARCH_ORDERINGS = {
+    'time': (('departs_at', False), ('id', False)),
+    'price': (('price_per_seat', False), ('departs_at', False), ('id', False)),
+}
+
+
+class APIError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def error(message, status):
+    return JsonResponse({'error': message}, status=status)
+
+
+def api_view(view):
+    """Session-authenticated JSON endpoint: 401 instead of a login redirect, APIError as JSON"""
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return error('Authentication required', 401)
+        try:
+            return view(request, *args, **kwargs)
+        except APIError as e:
+            return error(str(e), e.status)
+    return wrapped
+
+
+# ===================================
+# SERIALIZATION
+# ===================================
+
+def requested_fields(request, available, default):
+    """The ?fields= subset of `available`, in request order, or `default`"""
+    raw = request.GET.get('fields')
+    if not raw:
+        return tuple(default)
+    fields = tuple(dict.fromkeys(name.strip() for name in raw.split(',') if name.strip()))
+    unknown = [name for name in fields if name not in available]
+    if unknown or not fields:
+        raise APIError(f"Unknown fields: {', '.join(unknown) or raw}")
+    return fields
+
+
+def select(queryset, spec, fields, annotations=None, extra=()):
+    """
+    values_list() of the lookups behind `fields`, followed by `extra` lookups.
+
+    Only the annotations backing the requested fields (or `extra`) are added.
+    """
+    annotations = annotations or {}
+    needed = {name: annotations[name]() for name in (*fields, *extra) if name in annotations}
+    if needed:
+        queryset = queryset.annotate(**needed)
+    return queryset.values_list(*(spec[name] for name in fields), *extra)
+
+
+def rows_to_dicts(fields, rows):
+    return [dict(zip(fields, row)) for row in rows]
+
+
+# ===================================
+# KEYSET PAGINATION
+# ===================================
+
+def _cursor_value(value):
+    # Full precision: DjangoJSONEncoder would truncate datetimes to milliseconds
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def encode_cursor(values):
+    return signing.dumps([_cursor_value(value) for value in values], salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(token, ordering):
+    try:
+        values = signing.loads(token, salt=CURSOR_SALT)
+    except signing.BadSignature:
+        raise APIError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != len(ordering):
+        raise APIError('Invalid cursor')
+    return values
+
+
+def after(ordering, values):
+    """Q for rows strictly after `values` in `ordering` (a row-value comparison, spelled out)"""
+    condition = Q()
+    for i, (lookup, descending) in enumerate(ordering):
+        step = Q(**{f"{lookup}__{'lt' if descending else 'gt'}": values[i]})
+        for prior, value in zip(ordering[:i], values):
+            step &= Q(**{prior[0]: value})
+        condition |= step
+    return condition
+
+
+def paginate(request, queryset, spec, fields, ordering, annotations=None):
+    """One page of rows plus the cursor for the next, fetching limit + 1 rows and nothing else"""
+    try:
+        limit = min(MAX_PAGE_SIZE, max(1, int(request.GET.get('limit', DEFAULT_PAGE_SIZE))))
+    except ValueError:
+        raise APIError('limit must be a number')
+
+    token = request.GET.get('cursor')
+    if token:
+        queryset = queryset.filter(after(ordering, decode_cursor(token, ordering)))
+    queryset = queryset.order_by(*(f"-{lookup}" if descending else lookup for lookup, descending in ordering))
+
+    keys = tuple(lookup for lookup, _ in ordering)
+    rows = list(select(queryset, spec, fields, annotations, extra=keys)[:limit + 1])
+    more = len(rows) > limit
+    rows = rows[:limit]
+    width = len(fields)
+    return {
+        'data': rows_to_dicts(fields, (row[:width] for row in rows)),
+        'next': encode_cursor(rows[-1][width:]) if more else None,
+    }
+
+
+# ===================================
+# ENDPOINTS
+# ===================================
+
+@require_GET
+@api_view
+@ratelimit('api_search', '60/m', keys=('user_or_ip',), methods=('GET',))
+def search(request):
+    """
+    Rides between two cities on a date: ?pickup_city=&dropoff_city=&date=
+    Optional: max_price, sort (time|price), fields, limit, cursor.
+    """
+    try:
+        pickup_city_id = int(request.GET['pickup_city'])
+        dropoff_city_id = int(request.GET['dropoff_city'])
+        departure_date = date.fromisoformat(request.GET['date'])
+        max_price = Decimal(request.GET['max_price']) if request.GET.get('max_price') else None
+    except (KeyError, ValueError, ArithmeticError):
+        raise APIError('pickup_city, dropoff_city and date (YYYY-MM-DD) are required; max_price must be a number')
+
+    ordering = SEARCH_ORDERINGS.get(request.GET.get('sort') or 'time')
+    if ordering is None:
+        raise APIError(f"sort must be one of: {', '.join(SEARCH_ORDERINGS)}")
+    fields = requested_fields(request, RIDE_FIELDS, RIDE_LIST_FIELDS)
+
+    rides = Ride.objects.filter(
+        pickup_city_id=pickup_city_id,
+        dropoff_city_id=dropoff_city_id,
+        departs_at__gte=max(combine_departure(departure_date, time.min), timezone.now()),
+        departs_at__lt=combine_departure(departure_date + timedelta(days=1), time.min),
+        status='ACTIVE',
+    )
+    if max_price is not None:
+        rides = rides.filter(price_per_seat__lte=max_price)
+    return JsonResponse(paginate(request, rides, RIDE_FIELDS, fields, ordering, RIDE_ANNOTATIONS))
+
+
+def point(request, lat, lon, near):
+    """(latitude, longitude) from ?lat=&lon=, or from ?near= resolved offline with the gazetteer; None if absent"""
+    if request.GET.get(near):
+        gazetteer = get_gazetteer()
+        place = gazetteer.find(request.GET[near])
+        if place is None:
+            raise APIError(f"Unknown place: {request.GET[near]}")
+        return tuple(float(value) for value in gazetteer.coordinates(place))
+    if request.GET.get(lat) is None and request.GET.get(lon) is None:
+        return None
+    try:
+        latitude, longitude = float(request.GET[lat]), float(request.GET[lon])
+    except (KeyError, ValueError):
+        raise APIError(f"{lat} and {lon} must both be numbers")
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise APIError(f"{lat}/{lon} out of range")
+    return latitude, longitude
+
+
+def radius(request, name, default):
+    try:
+        value = float(request.GET.get(name) or default)
+    except ValueError:
+        raise APIError(f"{name} must be a number")
+    if not 0 < value <= MAX_RADIUS_KM:
+        raise APIError(f"{name} must be between 0 and {MAX_RADIUS_KM}")
+    return value
+
+
+@require_GET
+@api_view
+@ratelimit('api_nearby', '60/m', keys=('user_or_ip',), methods=('GET',))
+def nearby(request):
+    """
+    Active rides picking up near a point: ?lat=&lon= or ?near=<place>, radius_km (default 10).
+    Optional: dropoff_lat/dropoff_lon or dropoff_near, dropoff_radius_km, date, fields, limit.
+    Ranked by departure and distance; each row adds distance_km (and dropoff_distance_km).
+    """
+    pickup = point(request, 'lat', 'lon', 'near')
+    if pickup is None:
+        raise APIError('lat and lon (or near) are required')
+    dropoff = point(request, 'dropoff_lat', 'dropoff_lon', 'dropoff_near')
+    radius_km = radius(request, 'radius_km', DEFAULT_RADIUS_KM)
+    dropoff_radius_km = radius(request, 'dropoff_radius_km', radius_km)
+    try:
+        limit = min(MAX_PAGE_SIZE, max(1, int(request.GET.get('limit', DEFAULT_PAGE_SIZE))))
+        departure_date = date.fromisoformat(request.GET['date']) if request.GET.get('date') else None
+    except ValueError:
+        raise APIError('limit must be a number and date YYYY-MM-DD')
+    fields = requested_fields(request, RIDE_FIELDS, RIDE_LIST_FIELDS)
+
+    start, end = timezone.now(), None
+    if departure_date is not None:
+        start = max(start, combine_departure(departure_date, time.min))
+        end = combine_departure(departure_date + timedelta(days=1), time.min)
+    matches = nearby_rides(pickup, radius_km, dropoff, dropoff_radius_km, start, end, limit)
+
+    rows = select(Ride.objects.filter(id__in=[match.ride_id for match in matches]),
+                  RIDE_FIELDS, fields, RIDE_ANNOTATIONS, extra=('id',))
+    by_id = {row[-1]: dict(zip(fields, row)) for row in rows}
+    data = []
+    for match in matches:
+        row = by_id.get(match.ride_id)
+        if row is None:  # Deleted or no longer matching since nearby_rides() read it
+            continue
+        row['distance_km'] = round(match.pickup_km, 2)
+        if dropoff is not None:
+            row['dropoff_distance_km'] = round(match.dropoff_km, 2)
+        data.append(row)
+    return JsonResponse({'data': data})
+
+
+@require_GET
+@api_view
+@ratelimit('api_ride', '120/m', keys=('user_or_ip',), methods=('GET',))
+@conditional_page(ride_version, 'ride_id')
+def ride_detail(request, ride_id):
+    """One ride; all fields unless ?fields= is given. Supports If-None-Match."""
+    fields = requested_fields(request, RIDE_FIELDS, RIDE_FIELDS)
+    row = select(Ride.objects.filter(id=ride_id), RIDE_FIELDS, fields, RIDE_ANNOTATIONS).first()
+    if row is None:
+        return error('Ride not found', 404)
+    return JsonResponse({'data': dict(zip(fields, row))})
+
+
+@require_POST
+@api_view
+@ratelimit('api_booking_create', '10/m', keys=('user_or_ip',))
+def create_booking(request, ride_id):
+    """Request seats on a ride: POST seats_booked, optional booking_notes"""
+    ride = Ride.objects.filter(id=ride_id).first()
+    if ride is None:
+        return error('Ride not found', 404)
+    if not request.user.is_traveller or request.user.pk == ride.driver_id:
+        return error('Only travellers can book this ride', 403)
+    try:
+        seats = int(request.POST.get('seats_booked', ''))
+    except ValueError:
+        raise APIError('seats_booked must be a number')
+    if not 1 <= seats <= 4:
+        raise APIError('seats_booked must be between 1 and 4')
+    if ride.status != 'ACTIVE' or seats > ride.available_seats_count:
+        return error('Not enough seats available', 409)
+
+    try:
+        with transaction.atomic():
+            booking = Booking.objects.create(
+                ride=ride, traveller=request.user, seats_booked=seats,
+                total_price=seats * ride.price_per_seat,
+                booking_notes=request.POST.get('booking_notes', ''),
+            )
+    except IntegrityError:
+        return error('You already have a booking on this ride', 409)
+    logger.info("Booking requested", extra={'booking_id': booking.id, 'ride_id': ride.id, 'seats': seats})
+    row = select(Booking.objects.filter(id=booking.id), BOOKING_FIELDS, BOOKING_FIELDS).get()
+    return JsonResponse({'data': dict(zip(BOOKING_FIELDS, row))}, status=201)
+
+
+@require_POST
+@api_view
+@ratelimit('api_booking_update', '30/m', keys=('user_or_ip',))
+def update_booking(request, booking_id, action):
+    """confirm/reject (the driver) or cancel (the traveller) a pending booking"""
+    booking = Booking.objects.select_related('ride').filter(id=booking_id).first()
+    if booking is None or request.user.pk not in (booking.traveller_id, booking.ride.driver_id):
+        return error('Booking not found', 404)
+
+    refused = booking_action(booking, request.user, action)
+    if refused == 'forbidden':
+        return error(f'You cannot {action} this booking', 403)
+    if refused == 'not_pending':
+        return error('Only pending bookings can be changed', 409)
+    if refused == 'no_seats':
+        return error('Not enough seats available', 409)
+    logger.info("Booking action", extra={
+        'booking_id': booking.id, 'action': action, 'status': booking.status, 'user_id': request.user.pk,
+    })
+    return JsonResponse({'data': {'id': booking.id, 'status': booking.status}})
+
+
+@require_GET
+@api_view
+@ratelimit('api_my_rides', '60/m', keys=('user_or_ip',), methods=('GET',))
+def my_rides(request):
+    """The driver's rides (latest departure first), or the traveller's bookings (newest first)"""
+    if request.user.is_driver:
+        fields = requested_fields(request, RIDE_FIELDS, RIDE_LIST_FIELDS + ('status',))
+        rides = Ride.objects.filter(driver=request.user).annotate(
+            departs_key=Coalesce('departs_at', Value(NO_DEPARTURE))
+        )
+        page = paginate(
+            request, rides, RIDE_FIELDS, fields, (('departs_key', True), ('id', True)), RIDE_ANNOTATIONS,
+        )
+    else:
+        fields = requested_fields(request, BOOKING_FIELDS, BOOKING_LIST_FIELDS)
+        page = paginate(
+            request, Booking.objects.filter(traveller=request.user), BOOKING_FIELDS, fields,
+            (('id', True),),
+        )
+    return JsonResponse(page)
+
+
+@require_GET
+@api_view
+@ratelimit('api_sync', '120/m', keys=('user_or_ip',), methods=('GET',))
+def sync_changes(request):
+    """
+    Rides, bookings and reviews changed for this user since ?token=, or all
+    of them without one. Objects that no longer exist are listed in `deleted`.
+    Store the returned token; while `more` is true, sync again straight away.
+    A 400 means the token is unusable and the client should sync from scratch.
+    """
+    token = request.GET.get('token')
+    try:
+        cursor = read_token(request.user, token) if token else 0
+    except InvalidToken:
+        raise APIError('Invalid sync token; sync again without one')
+
+    cursor, changed, more = changes_since(request.user, cursor)
+    body = {'deleted': {}}
+    for key, model, spec, kind in (
+        ('rides', Ride, RIDE_FIELDS, 'RIDE'),
+        ('bookings', Booking, BOOKING_FIELDS, 'BOOKING'),
+        ('reviews', RideReview, REVIEW_FIELDS, 'REVIEW'),
+    ):
+        rows = []
+        if changed[kind]:
+            queryset = model.objects.filter(id__in=changed[kind]).order_by('id')
+            annotations = RIDE_ANNOTATIONS if model is Ride else None
+            rows = rows_to_dicts(tuple(spec), select(queryset, spec, spec, annotations))
+        found = {row['id'] for row in rows}
+        body[key] = rows
+        body['deleted'][key] = [object_id for object_id in changed[kind] if object_id not in found]
+    body['token'] = make_token(request.user, cursor)
+    body['more'] = more
+    return JsonResponse(body)
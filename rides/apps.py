@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class RidesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'rides'
+
+    def ready(self):
+        from . import checks  # noqa: F401 (registers the system checks)
+
+        # Load the gazetteer at startup rather than on the first request that validates a location
+        from .gazetteer import get_gazetteer
+        get_gazetteer()
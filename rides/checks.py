@@ -0,0 +1,8 @@
+# rides/checks.py
+
+from pointRide.checks import require_shared_cache
+
+require_shared_cache(
+    'MAP_TILE_CACHE', 'rides.E001',
+    "map tiles invalidated by one worker would still be served stale by the others",
+)
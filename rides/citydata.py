@@ -0,0 +1,134 @@
+# rides/citydata.py
+
+"""
+Loading cities from a data file.
+
+The file (CSV, a JSON array or JSON Lines; see rides.imports) is compared
+with the City table read in one query, and only new or changed places are
+written, with bulk INSERT ... ON CONFLICT (name) DO UPDATE statements of
+BATCH_SIZE rows. The comparison doubles as the dry-run diff.
+
+rides/data/ontario_cities.csv is the list of places served; load it with
+`manage.py load_cities`.
+"""
+
+from pathlib import Path
+
+from django.db import transaction
+
+from .forms import CityDataForm
+from .imports import iter_rows, text_stream
+from .maptiles import invalidate_layer
+from .models import City
+
+BATCH_SIZE = 1000
+
+DEFAULT_FILE = Path(__file__).resolve().parent / 'data' / 'ontario_cities.csv'
+
+# City columns a data file sets; name is the key
+FIELDS = ('province', 'country', 'latitude', 'longitude', 'is_active')
+
+
+class CityLoadReport:
+    def __init__(self):
+        self.rows = 0
+        self.created = []   # [cleaned data]
+        self.updated = []   # [(cleaned data, {field: (old, new)})]
+        self.unchanged = 0
+        self.errors = []    # [(row number, [messages])]
+
+    def add_error(self, number, errors):
+        self.errors.append((number, [
+            f"{field}: {message}" if field != '__all__' else message
+            for field, messages in errors.items() for message in messages
+        ]))
+
+    def __str__(self):
+        return (f"{self.rows} rows: {len(self.created)} new, {len(self.updated)} changed, "
+                f"{self.unchanged} unchanged, {len(self.errors)} rejected")
+
+
+def existing_cities():
+    """Name -> {field: value} for every city, in one query"""
+    return {
+        row[0]: dict(zip(FIELDS, row[1:]))
+        for row in City.objects.values_list('name', *FIELDS)
+    }
+
+
+def given_fields(row):
+    """The FIELDS a file row has a value for; a missing column or blank cell leaves the city's own"""
+    given = []
+    for field in FIELDS:
+        value = row.get(field)
+        if isinstance(value, str):
+            value = value.strip()
+        if value not in (None, ''):
+            given.append(field)
+    return given
+
+
+def load_cities(fileobj, fmt='csv', dry_run=False, batch_size=BATCH_SIZE):
+    """
+    Upsert every place in a city data file; returns a CityLoadReport.
+
+    A name given twice keeps its first row and the repeat is reported as an
+    error. Existing cities keep the values of columns the row leaves out or
+    blank; new ones take City's defaults. With dry_run the report is the
+    diff and nothing is written.
+    """
+    report = CityLoadReport()
+    existing = existing_cities()
+    seen = {}
+
+    for number, row in iter_rows(text_stream(fileobj), fmt):
+        report.rows += 1
+        form = CityDataForm(row)
+        if not form.is_valid():
+            report.add_error(number, form.errors)
+            continue
+        data = form.cleaned_data
+        if data['name'] in seen:
+            report.add_error(number, {'name': [f"Repeats row {seen[data['name']]}"]})
+            continue
+        seen[data['name']] = number
+
+        current = existing.get(data['name'])
+        if current is None:
+            report.created.append(data)
+            continue
+        given = given_fields(row)
+        data.update({field: current[field] for field in FIELDS if field not in given})
+        changes = {field: (current[field], data[field]) for field in FIELDS if current[field] != data[field]}
+        if changes:
+            report.updated.append((data, changes))
+        else:
+            report.unchanged += 1
+
+    if not dry_run:
+        upsert_cities(report.created + [data for data, _ in report.updated], batch_size=batch_size)
+    return report
+
+
+def upsert_cities(places, fields=FIELDS, batch_size=BATCH_SIZE):
+    """
+    Insert or update cities by name in bulk.
+
+    `places` are dicts with a name and every FIELDS value; on an existing
+    city only `fields` are overwritten (and its geohashes, with the coordinates).
+    """
+    location = City.LOCATION
+    cities = []
+    for place in places:
+        city = City(name=place['name'], **{field: place[field] for field in FIELDS})
+        location.update(city)  # bulk_create() bypasses City.save()
+        cities.append(city)
+    fields = list(fields)
+    if set(location.coordinate_fields) & set(fields):
+        fields.extend(location.geohash_fields)
+    with transaction.atomic():
+        City.objects.bulk_create(
+            cities, batch_size=batch_size,
+            update_conflicts=True, unique_fields=['name'], update_fields=fields,
+        )
+        transaction.on_commit(lambda: invalidate_layer('cities'))
@@ -0,0 +1,109 @@
+# rides/conditional.py
+
+"""
+Conditional GET for ride and booking pages.
+
+A page's version is its ride's updated_at plus the id and time of the
+ride's latest RideEvent. Every booking transition writes an event, so seat
+counts are covered without summing bookings. The version is read in one
+query, served by the (ride, id) event index.
+
+The pages are personalised (booking form, existing booking, driver
+actions), so the ETag also includes the viewer, and responses carry
+Vary: Cookie and Cache-Control: private. No Last-Modified is sent: a date
+cannot name the viewer, so If-Modified-Since would hand one user's cached
+page to the next user of the same browser. Pages with pending flash
+messages are always rendered in full, so a 304 never swallows a message.
+
+A version function returns None for viewers who may not see the page, so
+no validator is computed or compared for them and the view's own
+permission check answers.
+"""
+
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.db.models import OuterRef, Q, Subquery
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from .models import Ride, Booking, RideEvent
+
+
+def _latest_event(ride_ref, field):
+    return Subquery(
+        RideEvent.objects.filter(ride=OuterRef(ride_ref)).order_by('-id').values(field)[:1]
+    )
+
+
+def ride_version(ride_id, user):
+    """(ride updated_at, last event id, last event time), or None if there is no such ride"""
+    return (
+        Ride.objects.filter(id=ride_id)
+        .annotate(event_id=_latest_event('pk', 'id'), event_at=_latest_event('pk', 'created_at'))
+        .values_list('updated_at', 'event_id', 'event_at')
+        .first()
+    )
+
+
+def booking_version(booking_id, user):
+    """
+    Like ride_version, for a booking's page, plus the booking's own updated_at.
+    None unless user is the booking's traveller or its ride's driver.
+    """
+    if not user.is_authenticated:
+        return None
+    return (
+        Booking.objects.filter(Q(traveller=user) | Q(ride__driver=user), id=booking_id)
+        .annotate(event_id=_latest_event('ride_id', 'id'), event_at=_latest_event('ride_id', 'created_at'))
+        .values_list('updated_at', 'ride__updated_at', 'event_id', 'event_at')
+        .first()
+    )
+
+
+def has_pending_messages(request):
+    # len() loads the stored messages without marking them as shown
+    return len(messages.get_messages(request)) > 0
+
+
+def conditional_page(version_func, url_kwarg):
+    """
+    Answer GET/HEAD with 304 when the page's version and viewer are unchanged.
+
+    version_func(object_id, user) returns a tuple of values that change
+    whenever the page would, or None when user may not see it; url_kwarg
+    names the view argument holding object_id. The query string is part of
+    the ETag, so different ?fields= projections never share a validator.
+    """
+    def decorator(view):
+        def page_version(request, kwargs):
+            if not hasattr(request, '_page_version'):
+                request._page_version = (
+                    None if has_pending_messages(request) else version_func(kwargs[url_kwarg], request.user)
+                )
+            return request._page_version
+
+        def etag(request, *args, **kwargs):
+            version = page_version(request, kwargs)
+            if version is None:
+                return None
+            viewer = request.user.pk if request.user.is_authenticated else 'anonymous'
+            salt = getattr(settings, 'PAGE_ETAG_VERSION', '1')
+            raw = '|'.join(str(part) for part in (*version, viewer, request.GET.urlencode(), salt))
+            # Weak: the CSRF token in the page is re-masked on every render
+            return 'W/"%s"' % hashlib.md5(raw.encode(), usedforsecurity=False).hexdigest()
+
+        conditional_view = condition(etag_func=etag)(view)
+
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            response = conditional_view(request, *args, **kwargs)
+            patch_vary_headers(response, ('Cookie',))
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapped
+    return decorator
@@ -4,7 +4,9 @@ from django import forms
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from datetime import date, time
-from .models import Ride, Booking, City, Route, RideReview
+from decimal import Decimal
+from .models import Ride, Booking, City, Route, RideReview, RideSeries
+from .search import MINUTES_PER_DAY, SORT_CHOICES
 
 class LocationSearchForm(forms.Form):
     """
@@ -104,6 +106,57 @@ class RideSearchForm(forms.Form):
             raise ValidationError("Departure date cannot be in the past")
         return departure_date
 
+class RideFilterForm(forms.Form):
+    """
+    Optional filters and ordering applied on top of a ride search
+    """
+    earliest_time = forms.TimeField(
+        required=False,
+        widget=forms.TimeInput(attrs={'class': 'form-control', 'type': 'time'})
+    )
+    
+    latest_time = forms.TimeField(
+        required=False,
+        widget=forms.TimeInput(attrs={'class': 'form-control', 'type': 'time'}),
+        help_text="Earlier than the earliest time means the next morning"
+    )
+    
+    max_price = forms.DecimalField(
+        required=False,
+        min_value=0,
+        max_digits=8,
+        decimal_places=2,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01', 'placeholder': 'Any'})
+    )
+    
+    min_rating = forms.FloatField(
+        required=False,
+        min_value=1,
+        max_value=5,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '0.5', 'placeholder': 'Any'})
+    )
+    
+    sort = forms.ChoiceField(
+        choices=SORT_CHOICES,
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    
+    def preferred_time(self):
+        """
+        Time the traveller would ideally leave: the middle of their window,
+        on a 24-hour clock so a window past midnight (22:00-02:00) is centred
+        on 00:00 rather than noon
+        """
+        earliest = self.cleaned_data.get('earliest_time')
+        latest = self.cleaned_data.get('latest_time')
+        if earliest and latest:
+            start = earliest.hour * 60 + earliest.minute
+            span = (latest.hour * 60 + latest.minute - start) % MINUTES_PER_DAY
+            minutes = (start + span // 2) % MINUTES_PER_DAY
+            return time(minutes // 60, minutes % 60)
+        return earliest or latest
+
 class RideCreateForm(forms.ModelForm):
     """
     Form for drivers to create new rides
@@ -294,4 +347,167 @@ class RouteCreateForm(forms.ModelForm):
         if origin and destination and origin == destination:
             raise ValidationError("Origin and destination cities must be different")
         
-        return cleaned_data
\ No newline at end of file
+        return cleaned_data
+
+class RideImportForm(forms.Form):
+    """
+    One row of a bulk ride import, checked with RideCreateForm's rules.
+    
+    Cities are given by name and resolved through `cities` (lower-cased name
+    to id) instead of the database, so rows can be validated in worker
+    processes without a query per row.
+    """
+    driver = forms.CharField(required=False)
+    pickup_city = forms.CharField()
+    pickup_location = forms.CharField(max_length=255)
+    dropoff_city = forms.CharField()
+    dropoff_location = forms.CharField(max_length=255)
+    departure_date = forms.DateField()
+    departure_time = forms.TimeField()
+    available_seats = forms.IntegerField(min_value=1, max_value=8)
+    price_per_seat = forms.DecimalField(max_digits=8, decimal_places=2)
+    notes = forms.CharField(required=False)
+    
+    def __init__(self, *args, cities, **kwargs):
+        self.cities = cities
+        super().__init__(*args, **kwargs)
+    
+    def _city(self, field):
+        name = self.cleaned_data[field]
+        city_id = self.cities.get(name.strip().lower())
+        if city_id is None:
+            raise ValidationError(f"Unknown or inactive city: {name}")
+        return city_id
+    
+    def clean_pickup_city(self):
+        return self._city('pickup_city')
+    
+    def clean_dropoff_city(self):
+        return self._city('dropoff_city')
+    
+    clean_departure_date = RideCreateForm.clean_departure_date
+    clean_price_per_seat = RideCreateForm.clean_price_per_seat
+    
+    def clean(self):
+        """Validate pickup and drop-off are different"""
+        cleaned_data = super().clean()
+        if cleaned_data.get('pickup_city') and cleaned_data.get('pickup_city') == cleaned_data.get('dropoff_city'):
+            raise ValidationError("Pickup and drop-off cities must be different")
+        return cleaned_data
+
+class CityDataForm(forms.Form):
+    """
+    One place in a city data file loaded with load_cities.
+
+    Coordinates are rounded to the six decimal places City stores; blank
+    province, country and is_active take City's defaults (a new city's
+    only: load_cities keeps an existing city's values, see given_fields).
+    """
+    name = forms.CharField(max_length=100)
+    province = forms.CharField(max_length=50, required=False)
+    country = forms.CharField(max_length=50, required=False)
+    latitude = forms.DecimalField(min_value=-90, max_value=90, required=False)
+    longitude = forms.DecimalField(min_value=-180, max_value=180, required=False)
+    is_active = forms.NullBooleanField(required=False)
+
+    COORDINATE_PLACES = Decimal('0.000001')
+
+    def clean(self):
+        cleaned_data = super().clean()
+        for field in ('latitude', 'longitude'):
+            if cleaned_data.get(field) is not None:
+                cleaned_data[field] = cleaned_data[field].quantize(self.COORDINATE_PLACES)
+        if 'latitude' in cleaned_data and 'longitude' in cleaned_data and \
+                (cleaned_data['latitude'] is None) != (cleaned_data['longitude'] is None):
+            raise ValidationError("Give both latitude and longitude, or neither")
+        cleaned_data['province'] = cleaned_data.get('province') or 'Ontario'
+        cleaned_data['country'] = cleaned_data.get('country') or 'Canada'
+        if cleaned_data.get('is_active') is None:
+            cleaned_data['is_active'] = True
+        return cleaned_data
+
+class RideSeriesForm(forms.Form):
+    """
+    Form for drivers to post the same ride on chosen weekdays over a date range
+    """
+    pickup_city = forms.ModelChoiceField(
+        queryset=City.objects.filter(is_active=True),
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    pickup_location = forms.CharField(
+        max_length=255,
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Specific pickup address'})
+    )
+    dropoff_city = forms.ModelChoiceField(
+        queryset=City.objects.filter(is_active=True),
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    dropoff_location = forms.CharField(
+        max_length=255,
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Specific drop-off address'})
+    )
+    weekdays = forms.TypedMultipleChoiceField(
+        choices=RideSeries.WEEKDAY_CHOICES,
+        coerce=int,
+        widget=forms.CheckboxSelectMultiple(attrs={'class': 'form-check-input'})
+    )
+    start_date = forms.DateField(widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}))
+    end_date = forms.DateField(widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}))
+    departure_time = forms.TimeField(widget=forms.TimeInput(attrs={'class': 'form-control', 'type': 'time'}))
+    available_seats = forms.TypedChoiceField(
+        choices=[(i, f"{i} seat{'s' if i > 1 else ''}") for i in range(1, 9)],
+        coerce=int,
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    price_per_seat = forms.DecimalField(
+        min_value=0,
+        max_value=1000,
+        max_digits=8,
+        decimal_places=2,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01', 'placeholder': '0.00'})
+    )
+    notes = forms.CharField(
+        required=False,
+        widget=forms.Textarea(attrs={
+            'class': 'form-control',
+            'rows': 3,
+            'placeholder': 'Additional information for passengers (optional)'
+        })
+    )
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['start_date'].widget.attrs['min'] = date.today().isoformat()
+        self.fields['end_date'].widget.attrs['min'] = date.today().isoformat()
+    
+    def clean(self):
+        """Validate the cities differ and the date range is in the future"""
+        cleaned_data = super().clean()
+        pickup_city = cleaned_data.get('pickup_city')
+        dropoff_city = cleaned_data.get('dropoff_city')
+        start_date = cleaned_data.get('start_date')
+        end_date = cleaned_data.get('end_date')
+        
+        if pickup_city and dropoff_city and pickup_city == dropoff_city:
+            raise ValidationError("Pickup and drop-off cities must be different")
+        if start_date and start_date < date.today():
+            self.add_error('start_date', "The series cannot start in the past")
+        if start_date and end_date and end_date < start_date:
+            self.add_error('end_date', "The series must end on or after its first day")
+        
+        return cleaned_data
+
+class RideSeriesEditForm(forms.Form):
+    """
+    Changes applied to every upcoming ride of a series
+    """
+    price_per_seat = forms.DecimalField(
+        min_value=0,
+        max_value=1000,
+        max_digits=8,
+        decimal_places=2,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'})
+    )
+    pickup_location = forms.CharField(max_length=255, widget=forms.TextInput(attrs={'class': 'form-control'}))
+    dropoff_location = forms.CharField(max_length=255, widget=forms.TextInput(attrs={'class': 'form-control'}))
+    notes = forms.CharField(required=False, widget=forms.Textarea(attrs={'class': 'form-control', 'rows': 2}))
@@ -0,0 +1,204 @@
+# rides/gazetteer.py
+
+"""
+Offline gazetteer of Ontario places.
+
+rides/data/ontario_places.csv lists cities, towns and communities with
+coordinates, the municipality a community belongs to, and aliases. It is
+loaded once per process (at startup, see RidesConfig.ready) into
+struct-of-arrays form: one typed array per column, names in a single string
+pool addressed by offsets, and every name and alias in a sorted key pool
+searched by bisection. A few hundred places take a few tens of kilobytes and
+a lookup needs neither the database nor the network.
+"""
+
+import csv
+import logging
+import re
+import sys
+import threading
+import time
+import unicodedata
+from array import array
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FILE = Path(__file__).resolve().parent / 'data' / 'ontario_places.csv'
+
+# Ordered by precedence when two places share a name or alias
+KINDS = ('city', 'town', 'municipality', 'township', 'community')
+
+# Parts of a location that say where it is without naming a place
+ONTARIO_WORDS = frozenset({'ontario', 'on', 'ont', 'canada', 'ca'})
+
+# Regions (and a few big cities) that mean the location is outside Ontario
+OUTSIDE_ONTARIO = frozenset({
+    'quebec', 'qc', 'manitoba', 'mb', 'british columbia', 'bc', 'alberta', 'ab', 'saskatchewan', 'sk',
+    'nova scotia', 'ns', 'new brunswick', 'nb', 'newfoundland', 'newfoundland and labrador', 'nl',
+    'prince edward island', 'pei', 'yukon', 'nunavut', 'northwest territories',
+    'usa', 'us', 'united states', 'united states of america', 'america', 'mexico',
+    'uk', 'united kingdom', 'england', 'france',
+    'new york', 'ny', 'michigan', 'mi', 'ohio', 'pennsylvania', 'vermont', 'minnesota',
+    'montreal', 'gatineau', 'quebec city', 'vancouver', 'calgary', 'edmonton', 'winnipeg', 'halifax',
+    'detroit', 'buffalo', 'new york city', 'chicago',
+})
+
+# Longest run of words tried as a place name inside a longer part of a location
+MAX_NAME_WORDS = 4
+
+
+def normalize(text):
+    """Lookup key: accents, case and punctuation ignored ('Orléans' == 'orleans', 'St.' == 'st')"""
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii').lower()
+    return ' '.join(re.sub(r"[^a-z0-9]+", ' ', text.replace('.', '')).split())
+
+
+class Gazetteer:
+    def __init__(self, rows):
+        """Build from (name, kind, municipality, latitude, longitude, [aliases]) rows"""
+        rows = list(rows)
+        index = {name: i for i, (name, *_) in enumerate(rows)}
+
+        self.name_pool = ''.join(name for name, *_ in rows)
+        self.name_offsets = array('I', [0])
+        self.latitude = array('f')
+        self.longitude = array('f')
+        self.kind = array('B')
+        self.parent = array('i')
+        keys = []
+        for i, (name, kind, municipality, latitude, longitude, aliases) in enumerate(rows):
+            self.name_offsets.append(self.name_offsets[-1] + len(name))
+            self.latitude.append(latitude)
+            self.longitude.append(longitude)
+            self.kind.append(KINDS.index(kind))
+            self.parent.append(index[municipality] if municipality else -1)
+            keys.extend((normalize(alias), KINDS.index(kind), i) for alias in (name, *aliases))
+
+        # One entry per key; a shared name goes to the place of the highest-ranked kind
+        keys = sorted(set(keys))
+        unique = [entry for n, entry in enumerate(keys) if n == 0 or entry[0] != keys[n - 1][0]]
+        self.key_pool = ''.join(key for key, _, _ in unique)
+        self.key_offsets = array('I', [0])
+        self.key_place = array('I')
+        for key, _, place in unique:
+            self.key_offsets.append(self.key_offsets[-1] + len(key))
+            self.key_place.append(place)
+        self.load_seconds = None
+
+    @classmethod
+    def load(cls, path=DEFAULT_FILE):
+        started = time.perf_counter()
+        with open(path, encoding='utf-8', newline='') as f:
+            gazetteer = cls(
+                (row['name'], row['kind'], row['municipality'], float(row['latitude']), float(row['longitude']),
+                 [alias for alias in row['aliases'].split('|') if alias])
+                for row in csv.DictReader(f)
+            )
+        gazetteer.load_seconds = time.perf_counter() - started
+        return gazetteer
+
+    def __len__(self):
+        return len(self.latitude)
+
+    def memory_bytes(self):
+        """Bytes held by the pools and arrays"""
+        return sum(sys.getsizeof(part) for part in (
+            self.name_pool, self.name_offsets, self.latitude, self.longitude, self.kind, self.parent,
+            self.key_pool, self.key_offsets, self.key_place,
+        ))
+
+    def stats(self):
+        return {
+            'places': len(self), 'keys': len(self.key_place), 'bytes': self.memory_bytes(),
+            'load_ms': round(self.load_seconds * 1000, 2) if self.load_seconds is not None else None,
+        }
+
+    # Places are referred to by index
+
+    def name(self, place):
+        return self.name_pool[self.name_offsets[place]:self.name_offsets[place + 1]]
+
+    def kind_of(self, place):
+        return KINDS[self.kind[place]]
+
+    def coordinates(self, place):
+        return self.latitude[place], self.longitude[place]
+
+    def municipality(self, place):
+        """The place's municipality: its parent, or the place itself"""
+        parent = self.parent[place]
+        return place if parent < 0 else parent
+
+    def _key(self, n):
+        return self.key_pool[self.key_offsets[n]:self.key_offsets[n + 1]]
+
+    def lookup(self, name):
+        """Place with this name or alias, or None"""
+        key = normalize(name)
+        low, high = 0, len(self.key_place)
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self.key_place) and self._key(low) == key:
+            return self.key_place[low]
+        return None
+
+    def parts(self, location):
+        """Normalized comma-separated parts of a location, without 'Ontario'/'Canada'"""
+        parts = []
+        for part in location.split(','):
+            words = normalize(part).split()
+            while words and words[-1] in ONTARIO_WORDS:
+                words.pop()
+            if words:
+                parts.append(' '.join(words))
+        return parts
+
+    def outside_ontario(self, location):
+        """True if any part of the location names a region or city outside Ontario"""
+        return any(part in OUTSIDE_ONTARIO for part in self.parts(location))
+
+    def find(self, location):
+        """
+        The place a free-text location is in, or None.
+
+        Whole parts are tried last to first (addresses end with the town),
+        then runs of up to MAX_NAME_WORDS words inside each part, longest
+        first, so '123 King St, Toronto' and 'University of Toronto' both
+        resolve to Toronto.
+        """
+        parts = self.parts(location)
+        for part in reversed(parts):
+            place = self.lookup(part)
+            if place is not None:
+                return place
+        for part in reversed(parts):
+            words = part.split()
+            for size in range(min(len(words), MAX_NAME_WORDS), 0, -1):
+                for start in range(len(words) - size, -1, -1):
+                    place = self.lookup(' '.join(words[start:start + size]))
+                    if place is not None:
+                        return place
+        return None
+
+
+_gazetteer = None
+_lock = threading.Lock()
+
+
+def get_gazetteer():
+    """The process-wide gazetteer, loaded from GAZETTEER_FILE on first use"""
+    global _gazetteer
+    if _gazetteer is None:
+        with _lock:
+            if _gazetteer is None:
+                gazetteer = Gazetteer.load(getattr(settings, 'GAZETTEER_FILE', DEFAULT_FILE))
+                logger.info("Gazetteer loaded", extra=gazetteer.stats())
+                _gazetteer = gazetteer
+    return _gazetteer
@@ -0,0 +1,148 @@
+# rides/geo.py
+
+"""
+Geohashes and distances, without a spatial database.
+
+A geohash names a cell of the latitude/longitude grid; each extra character
+splits the cell into 32, and every point in a cell has a geohash starting
+with the cell's. A full-precision geohash column therefore answers "which
+rows are in this cell, at any precision" with a B-tree range scan:
+cell <= geohash < cell + '{' ('{' sorts after every geohash character).
+Models also keep truncated copies at a few coarse precisions (GeoColumns),
+so the common cell sizes are plain equality lookups and GROUP BY keys.
+"""
+
+import math
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Stored precision: cells of about 5 m x 5 m
+PRECISION = 9
+
+# Coarse copies kept next to the full geohash: about 39 x 20 km and 1.2 x 0.6 km cells
+LEVELS = (4, 6)
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+
+
+def encode(latitude, longitude, precision=PRECISION):
+    latitude, longitude = float(latitude), float(longitude)
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        span, value = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (span[0] + span[1]) / 2
+        if value >= middle:
+            bits = bits * 2 + 1
+            span[0] = middle
+        else:
+            bits *= 2
+            span[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits, bit_count = 0, 0
+    return ''.join(chars)
+
+
+def encode_or_blank(latitude, longitude):
+    """Geohash for a possibly missing point ('' when either coordinate is None)"""
+    if latitude is None or longitude is None:
+        return ''
+    return encode(latitude, longitude)
+
+
+class GeoColumns:
+    """
+    Where a model keeps a point: its coordinate fields, its full geohash field
+    and {precision: field} for the coarse copies.
+    """
+
+    def __init__(self, latitude, longitude, geohash, levels=None):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.geohash = geohash
+        self.levels = dict(levels or {})
+
+    @classmethod
+    def named(cls, prefix='', levels=LEVELS):
+        """Columns <prefix>latitude, <prefix>longitude, <prefix>geohash and <prefix>geohash_<n>"""
+        return cls(f'{prefix}latitude', f'{prefix}longitude', f'{prefix}geohash',
+                   {precision: f'{prefix}geohash_{precision}' for precision in levels})
+
+    @property
+    def coordinate_fields(self):
+        return (self.latitude, self.longitude)
+
+    @property
+    def geohash_fields(self):
+        return (self.geohash, *self.levels.values())
+
+    def geohashes(self, latitude, longitude):
+        """{geohash field: value} for a point; all '' for a missing one"""
+        full = encode_or_blank(latitude, longitude)
+        return {self.geohash: full, **{field: full[:precision] for precision, field in self.levels.items()}}
+
+    def update(self, instance):
+        """Set the geohash fields of a model instance from its coordinates"""
+        values = self.geohashes(getattr(instance, self.latitude), getattr(instance, self.longitude))
+        for field, value in values.items():
+            setattr(instance, field, value)
+
+
+def cell_size(precision):
+    """(degrees of latitude, degrees of longitude) spanned by a cell"""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def prefix_range(cell):
+    """(low, high) such that low <= geohash < high for exactly the geohashes in the cell"""
+    return cell, cell + '{'
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """(south, west, north, east) of the box around a circle"""
+    lat_span = radius_km / KM_PER_DEGREE
+    lon_span = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+    return (max(latitude - lat_span, -90.0), max(longitude - lon_span, -180.0),
+            min(latitude + lat_span, 90.0), min(longitude + lon_span, 180.0))
+
+
+def _cell_indexes(south, west, north, east, precision):
+    lat_size, lon_size = cell_size(precision)
+    rows = range(int((south + 90) // lat_size), int(min(north + 90, 180 - 1e-9) // lat_size) + 1)
+    columns = range(int((west + 180) // lon_size), int(min(east + 180, 360 - 1e-9) // lon_size) + 1)
+    return rows, columns, lat_size, lon_size
+
+
+def cover_precision(south, west, north, east, max_cells=16):
+    """The finest precision at which the box needs at most max_cells cells"""
+    for precision in range(PRECISION, 0, -1):
+        rows, columns, _, _ = _cell_indexes(south, west, north, east, precision)
+        if len(rows) * len(columns) <= max_cells:
+            return precision
+    return 1
+
+
+def covering_cells(south, west, north, east, max_cells=16, precision=None):
+    """
+    Fewest-false-positive set of geohash cells covering a box.
+
+    Uses cover_precision() unless a precision is given.
+    """
+    precision = precision or cover_precision(south, west, north, east, max_cells)
+    rows, columns, lat_size, lon_size = _cell_indexes(south, west, north, east, precision)
+    return sorted(
+        encode(-90 + (row + 0.5) * lat_size, -180 + (column + 0.5) * lon_size, precision)
+        for row in rows for column in columns
+    )
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (float(lat1), float(lon1), float(lat2), float(lon2)))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return EARTH_RADIUS_KM * 2 * math.asin(math.sqrt(a))
@@ -0,0 +1,70 @@
+# rides/geocode_stub.py
+
+"""
+A minimal stand-in for Nominatim's /search endpoint, serving fixed answers.
+
+Used by the tests to exercise rides.geocoding over real HTTP. `places` maps
+the lower-cased place name (the first part of the query) to (latitude,
+longitude, state); `failures` maps a name to the number of 503 responses to
+give before answering.
+"""
+
+import json
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        stub = self.server
+        url = urllib.parse.urlsplit(self.path)
+        query = urllib.parse.parse_qs(url.query).get('q', [''])[0]
+        name = query.split(',')[0].strip().lower()
+        with stub.lock:
+            stub.queries.append(query)
+            failing = stub.failures.get(name, 0)
+            if failing:
+                stub.failures[name] = failing - 1
+
+        if url.path != '/search':
+            return self.send_error(404)
+        if failing:
+            return self.send_error(503)
+        results = []
+        if name in stub.places:
+            latitude, longitude, state = stub.places[name]
+            results.append({'lat': str(latitude), 'lon': str(longitude), 'address': {'state': state}})
+        body = json.dumps(results).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubGeocoder(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, places, failures=None, host='localhost', port=0):
+        super().__init__((host, port), StubHandler)
+        self.lock = threading.Lock()
+        self.places = {name.lower(): answer for name, answer in places.items()}
+        self.failures = {name.lower(): count for name, count in (failures or {}).items()}
+        self.queries = []
+
+    @property
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def start(self):
+        """Serve on a background thread; returns self"""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
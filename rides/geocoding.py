@@ -0,0 +1,299 @@
+# rides/geocoding.py
+
+"""
+Geocoding cities in bulk.
+
+Lookups go through a Provider (NominatimProvider by default) from a small
+thread pool, with every request, from any thread, spaced by one global
+RateLimiter, so the pool overlaps network latency without exceeding the
+provider's usage policy.
+
+Answers, including "not found", are appended to a GeocodeCache file keyed by
+the normalized query as they arrive. The file is also the checkpoint: a run
+that is interrupted or rerun skips every query already answered, and only
+transient failures are asked again. Coordinates are written to City in bulk
+upserts every BATCH_SIZE answers, so a run's progress is kept in the
+database too.
+"""
+
+import json
+import logging
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.conf import settings
+
+from .citydata import upsert_cities
+from .gazetteer import get_gazetteer
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 100
+
+Place = namedtuple('Place', 'name province country')
+Location = namedtuple('Location', 'latitude longitude province')
+
+COORDINATE_PLACES = Decimal('0.000001')
+
+
+class GeocodingError(Exception):
+    """The provider could not answer now (network error, 429, 5xx); worth retrying later"""
+
+
+def normalize_query(place):
+    """Cache key for a place: case, punctuation spacing and repeated whitespace ignored"""
+    query = ', '.join(part for part in place if part)
+    return re.sub(r'\s+', ' ', re.sub(r'\s*,\s*', ', ', query)).strip().lower()
+
+
+# ===================================
+# PROVIDERS
+# ===================================
+
+class Provider:
+    """
+    A geocoding service.
+
+    geocode() returns a Location, None if the service has no match, or
+    raises GeocodingError if it could not answer. Offline providers are
+    not rate limited.
+    """
+    name = None
+    offline = False
+
+    def geocode(self, place):
+        raise NotImplementedError
+
+
+class NominatimProvider(Provider):
+    """OpenStreetMap Nominatim (or any server speaking its /search API)"""
+    name = 'nominatim'
+
+    def __init__(self, base_url=None, user_agent=None, timeout=10):
+        self.base_url = (base_url or settings.GEOCODING_URL).rstrip('/')
+        self.user_agent = user_agent or settings.GEOCODING_USER_AGENT
+        self.timeout = timeout
+
+    def geocode(self, place):
+        params = urllib.parse.urlencode({
+            'q': ', '.join(part for part in place if part),
+            'format': 'json', 'limit': 1, 'countrycodes': 'ca', 'addressdetails': 1,
+        })
+        request = urllib.request.Request(f"{self.base_url}/search?{params}", headers={'User-Agent': self.user_agent})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                results = json.load(response)
+        except urllib.error.HTTPError as e:
+            if e.code == 429 or e.code >= 500:
+                raise GeocodingError(f"HTTP {e.code}")
+            raise
+        except (urllib.error.URLError, TimeoutError, ConnectionError) as e:
+            raise GeocodingError(str(e))
+
+        if not results:
+            return None
+        result = results[0]
+        return Location(float(result['lat']), float(result['lon']), result.get('address', {}).get('state'))
+
+
+class GazetteerProvider(Provider):
+    """The offline gazetteer (rides.gazetteer): town-level answers for Ontario places, no network"""
+    name = 'gazetteer'
+    offline = True
+
+    def __init__(self, base_url=None):
+        self.gazetteer = get_gazetteer()
+
+    def geocode(self, place):
+        if place.province and place.province != 'Ontario':
+            return None
+        found = self.gazetteer.find(place.name)
+        if found is None:
+            return None
+        latitude, longitude = self.gazetteer.coordinates(found)
+        return Location(round(latitude, 6), round(longitude, 6), 'Ontario')
+
+
+PROVIDERS = {
+    'nominatim': NominatimProvider,
+    'gazetteer': GazetteerProvider,
+}
+
+
+# ===================================
+# CACHE AND RATE LIMIT
+# ===================================
+
+class GeocodeCache:
+    """
+    Answers by normalized query, kept in an append-only JSON Lines file.
+
+    Each answer is flushed as it is added, so a crash loses at most the line
+    being written; a torn last line is ignored on load.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.answers = {}
+        self.lock = threading.Lock()
+        try:
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.answers[entry['q']] = Location(*entry['location']) if entry['location'] else None
+        except FileNotFoundError:
+            pass
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def __contains__(self, key):
+        return key in self.answers
+
+    def get(self, key):
+        return self.answers.get(key)
+
+    def add(self, key, location):
+        with self.lock:
+            self.answers[key] = location
+            self.file.write(json.dumps({'q': key, 'location': list(location) if location else None}) + '\n')
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class RateLimiter:
+    """At most `rate` calls to wait() return per second, across all threads"""
+
+    def __init__(self, rate, clock=time.monotonic, sleep=time.sleep):
+        self.interval = 1 / rate
+        self.clock = clock
+        self.sleep = sleep
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        # Reserve the next free slot under the lock; sleep until it outside
+        with self.lock:
+            now = self.clock()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            self.sleep(slot - now)
+
+
+# ===================================
+# PIPELINE
+# ===================================
+
+class GeocodeReport:
+    def __init__(self):
+        self.places = 0
+        self.cached = 0
+        self.found = 0
+        self.not_found = []   # [place name]
+        self.failed = []      # [(place name, error)]
+        self.written = 0
+
+    def __str__(self):
+        return (f"{self.places} places ({self.cached} from cache): {self.found} located, "
+                f"{len(self.not_found)} not found, {len(self.failed)} failed, {self.written} cities written")
+
+
+def lookup(place, provider, limiter, retries=3, backoff=1.0):
+    """Geocode one place, retrying transient failures with exponential backoff"""
+    for attempt in range(retries + 1):
+        limiter.wait()
+        try:
+            return provider.geocode(place)
+        except GeocodingError:
+            if attempt == retries:
+                raise
+            time.sleep(backoff * 2 ** attempt)
+
+
+def geocoded(places, provider, cache, limiter, workers=4, retries=3, backoff=1.0):
+    """
+    (place, Location or None, error or None) for each place, in order.
+
+    Cached places are answered without a request; at most 2 * workers
+    lookups are in flight at once.
+    """
+    def answer(place):
+        try:
+            location = lookup(place, provider, limiter, retries, backoff)
+        except GeocodingError as e:
+            return place, None, str(e)
+        if location and location.province and place.province and location.province != place.province:
+            location = None  # A namesake in another province
+        cache.add(normalize_query(place), location)
+        return place, location, None
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for place in places:
+            key = normalize_query(place)
+            if key in cache:
+                yield place, cache.get(key), 'cached'
+                continue
+            pending.append(executor.submit(answer, place))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def geocode_cities(places, provider, cache, rate, workers=4, retries=3, backoff=1.0,
+                   dry_run=False, batch_size=BATCH_SIZE):
+    """
+    Geocode places and upsert their coordinates into City; returns a GeocodeReport.
+
+    New places are created active; existing cities only get their latitude
+    and longitude updated. With dry_run nothing is written to City (answers
+    are still cached).
+    """
+    report = GeocodeReport()
+    limiter = RateLimiter(rate)
+    batch = []
+
+    def flush():
+        if batch and not dry_run:
+            upsert_cities(batch, fields=('latitude', 'longitude'))
+            report.written += len(batch)
+        batch.clear()
+
+    for place, location, note in geocoded(places, provider, cache, limiter, workers, retries, backoff):
+        report.places += 1
+        if note == 'cached':
+            report.cached += 1
+        elif note:
+            report.failed.append((place.name, note))
+            continue
+        if location is None:
+            report.not_found.append(place.name)
+            continue
+        report.found += 1
+        batch.append({
+            'name': place.name, 'province': place.province or 'Ontario', 'country': place.country or 'Canada',
+            'latitude': Decimal(str(location.latitude)).quantize(COORDINATE_PLACES),
+            'longitude': Decimal(str(location.longitude)).quantize(COORDINATE_PLACES),
+            'is_active': True,
+        })
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+
+    logger.info("Cities geocoded", extra={
+        'places': report.places, 'cached': report.cached, 'found': report.found,
+        'failed': len(report.failed), 'provider': provider.name,
+    })
+    return report
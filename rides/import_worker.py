@@ -0,0 +1,35 @@
+# rides/import_worker.py
+
+"""
+Row validation for rides.imports, run in the parent or in worker processes.
+
+Spawned workers unpickle this module before Django is set up, so it must
+not import models at import time.
+"""
+
+_cities = None
+
+
+def setup(cities):
+    """Process pool initializer: set up Django and keep the city lookup for every chunk"""
+    global _cities
+    import django
+    django.setup()
+    _cities = cities
+
+
+def validate_rows(rows, cities=None):
+    """[(row number, cleaned data or None, errors or None)] for [(row number, raw row)]"""
+    from .forms import RideImportForm
+
+    cities = cities if cities is not None else _cities
+    results = []
+    for number, row in rows:
+        form = RideImportForm(row, cities=cities)
+        if form.is_valid():
+            results.append((number, form.cleaned_data, None))
+        else:
+            results.append((number, None, {
+                field: [str(message) for message in messages] for field, messages in form.errors.items()
+            }))
+    return results
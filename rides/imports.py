@@ -0,0 +1,309 @@
+# rides/imports.py
+
+"""
+Bulk ride import from CSV or JSON for fleet operators.
+
+The file is read as a stream: CSV row by row, JSON (an array of objects or
+one object per line) object by object. Rows are validated in chunks with
+RideImportForm, in a process pool for large files, with city names resolved
+through an in-memory lookup built in one query. Valid rows are inserted in
+batches, each in its own transaction: routes are reused or created per
+(driver, origin, destination), rides and their RIDE_CREATED events are bulk
+inserted.
+
+Only a bounded number of chunks is in flight and each batch is discarded
+once inserted, so memory use does not grow with the file. Errors are written
+to `error_writer` as they are found; without one, the first MAX_ERRORS are
+kept on the report.
+
+A file that stops parsing part way (malformed or truncated JSON, an object
+over MAX_OBJECT_SIZE, a broken CSV line) still has the rows before the fault
+validated and inserted; ImportStopped then names the first row not read, and
+passing that as `start_row` resumes there once the file is fixed.
+"""
+
+import csv
+import io
+import json
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from django.db import transaction
+
+from accounts.models import User
+
+from . import import_worker
+from .models import City, Ride, RideEvent, Route, combine_departure
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 500
+BATCH_SIZE = 500
+MAX_ERRORS = 1000
+
+# Characters buffered while looking for the end of one JSON object
+MAX_OBJECT_SIZE = 1024 * 1024
+
+FORMATS = ('csv', 'json')
+
+COLUMNS = ('driver', 'pickup_city', 'pickup_location', 'dropoff_city', 'dropoff_location',
+           'departure_date', 'departure_time', 'available_seats', 'price_per_seat', 'notes')
+
+
+class ImportReport:
+    def __init__(self, error_writer=None):
+        self.rows = 0
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+        self.error_writer = error_writer
+
+    def add_error(self, number, errors):
+        self.failed += 1
+        messages = [f"{field}: {message}" if field != '__all__' else message
+                    for field, field_messages in errors.items() for message in field_messages]
+        if self.error_writer is not None:
+            self.error_writer.writerow([number, '; '.join(messages)])
+        elif len(self.errors) < MAX_ERRORS:
+            self.errors.append((number, messages))
+
+    def __str__(self):
+        return f"{self.rows} rows: {self.created} rides created, {self.failed} rejected"
+
+
+class ImportStopped(ValueError):
+    """The file could not be read past a row; the rows before it were imported"""
+
+    def __init__(self, error, report, next_row):
+        self.report = report
+        self.next_row = next_row
+        super().__init__(f"{error} (stopped before row {next_row}; {report})")
+
+
+# ===================================
+# READING
+# ===================================
+
+def text_stream(fileobj, encoding='utf-8-sig'):
+    """A text stream over an uploaded or opened binary file (or a text file as is)"""
+    if isinstance(fileobj, io.TextIOBase):
+        return fileobj
+    return io.TextIOWrapper(fileobj, encoding=encoding, newline='')
+
+
+def iter_json(stream, read_size=64 * 1024, max_object_size=MAX_OBJECT_SIZE):
+    """
+    Objects from a JSON array or from JSON Lines, decoded one at a time.
+
+    Raises ValueError rather than buffer more than max_object_size
+    characters of a single object.
+    """
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = '', 0, False
+    while True:
+        # Skip whitespace and the array's own punctuation between objects
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,[]':
+            pos += 1
+        if pos < len(buffer):
+            try:
+                obj, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                if len(buffer) - pos > max_object_size:
+                    raise ValueError(f"Object longer than {max_object_size} characters, or malformed JSON")
+            else:
+                yield obj
+                continue
+        elif eof:
+            return
+        chunk = stream.read(read_size)
+        eof = not chunk
+        buffer, pos = buffer[pos:] + chunk, 0
+
+
+def iter_rows(stream, fmt):
+    """(row number, {column: string}) for each row; numbers start at 1"""
+    if fmt == 'csv':
+        # The header is line 1, so data rows are numbered as a spreadsheet shows them
+        for number, row in enumerate(csv.DictReader(stream), start=2):
+            yield number, row
+    elif fmt == 'json':
+        for number, obj in enumerate(iter_json(stream), start=1):
+            if not isinstance(obj, dict):
+                obj = {}
+            yield number, {key: '' if value is None else str(value) for key, value in obj.items()}
+    else:
+        raise ValueError(f"Unsupported import format: {fmt}")
+
+
+class StopOnReadError:
+    """
+    Rows from iter_rows() that end quietly at the first read error instead of
+    raising it mid-pipeline, so the rows already read are still imported
+    """
+
+    def __init__(self, rows, first_row):
+        self.rows = rows
+        self.next_row = first_row
+        self.error = None
+
+    def __iter__(self):
+        try:
+            for number, row in self.rows:
+                self.next_row = number + 1
+                yield number, row
+        except (ValueError, csv.Error) as e:
+            self.error = e
+
+
+def detect_format(filename):
+    return 'json' if filename.lower().endswith(('.json', '.jsonl', '.ndjson')) else 'csv'
+
+
+def chunked(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# ===================================
+# VALIDATION
+# ===================================
+
+def city_lookup():
+    """Lower-cased name -> id of every active city, in one query"""
+    return {name.strip().lower(): city_id
+            for city_id, name in City.objects.filter(is_active=True).values_list('id', 'name')}
+
+
+def validated_chunks(chunks, cities, workers):
+    """Validation results per chunk, in file order; at most 2 * workers chunks in flight"""
+    if workers <= 1:
+        for chunk in chunks:
+            yield import_worker.validate_rows(chunk, cities)
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=get_context('spawn'),
+        initializer=import_worker.setup, initargs=(cities,),
+    ) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(import_worker.validate_rows, chunk))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+# ===================================
+# INSERTING
+# ===================================
+
+class BatchInserter:
+    """Buffers valid rows and inserts them BATCH_SIZE at a time"""
+
+    def __init__(self, batch_size=BATCH_SIZE, dry_run=False):
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.buffer = []
+        self.routes = {}  # (driver, origin, destination) -> route id
+
+    def add(self, driver_id, data):
+        self.buffer.append((driver_id, data))
+        if len(self.buffer) >= self.batch_size:
+            return self.flush()
+        return 0
+
+    def flush(self):
+        batch, self.buffer = self.buffer, []
+        if not batch or self.dry_run:
+            return len(batch)
+        with transaction.atomic():
+            for driver_id, data in batch:
+                key = (driver_id, data['pickup_city'], data['dropoff_city'])
+                if key not in self.routes:
+                    route, _ = Route.objects.get_or_create(
+                        driver_id=driver_id, origin_city_id=key[1], destination_city_id=key[2],
+                        defaults={'driver_price': data['price_per_seat']},
+                    )
+                    self.routes[key] = route.id
+            rides = Ride.objects.bulk_create([
+                Ride(
+                    route_id=self.routes[(driver_id, data['pickup_city'], data['dropoff_city'])],
+                    driver_id=driver_id,
+                    pickup_city_id=data['pickup_city'], pickup_location=data['pickup_location'],
+                    dropoff_city_id=data['dropoff_city'], dropoff_location=data['dropoff_location'],
+                    departure_date=data['departure_date'], departure_time=data['departure_time'],
+                    departs_at=combine_departure(data['departure_date'], data['departure_time']),
+                    available_seats=data['available_seats'], price_per_seat=data['price_per_seat'],
+                    notes=data['notes'],
+                )
+                for driver_id, data in batch
+            ])
+            RideEvent.objects.bulk_create([
+                RideEvent.objects.build('RIDE_CREATED', ride.pk, ride.driver_id, to_status=ride.status,
+                                        source='import')
+                for ride in rides
+            ])
+        return len(rides)
+
+
+def resolve_drivers(results, default_driver):
+    """Username -> id for the drivers named in a chunk, in one query"""
+    usernames = {data['driver'] for _, data, _ in results if data and data['driver']}
+    drivers = {}
+    if usernames:
+        drivers = dict(User.objects.filter(username__in=usernames, is_driver=True).values_list('username', 'id'))
+    return lambda username: drivers.get(username) if username else getattr(default_driver, 'pk', None)
+
+
+def import_rides(fileobj, fmt='csv', driver=None, workers=1, chunk_size=CHUNK_SIZE,
+                 batch_size=BATCH_SIZE, dry_run=False, error_writer=None, start_row=None):
+    """
+    Validate and insert every row of a ride file; returns an ImportReport.
+
+    Rows without a driver column belong to `driver`. With dry_run nothing is
+    written, but every row is still validated. Rows numbered below
+    `start_row` are skipped. Raises ImportStopped if the file cannot be read
+    to the end.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported import format: {fmt}")
+    report = ImportReport(error_writer)
+    cities = city_lookup()
+    inserter = BatchInserter(batch_size, dry_run)
+    first_row = 2 if fmt == 'csv' else 1
+    source = StopOnReadError(iter_rows(text_stream(fileobj), fmt), first_row)
+    rows = source
+    if start_row is not None:
+        rows = ((number, row) for number, row in source if number >= start_row)
+
+    for results in validated_chunks(chunked(rows, chunk_size), cities, workers):
+        driver_for = resolve_drivers(results, driver)
+        for number, data, errors in results:
+            report.rows += 1
+            driver_id = driver_for(data['driver']) if errors is None else None
+            if errors is None and driver_id is None:
+                errors = {'driver': ['Unknown driver, or no driver given for the row']}
+            if errors is not None:
+                report.add_error(number, errors)
+            else:
+                report.created += inserter.add(driver_id, data)
+    report.created += inserter.flush()
+
+    logger.info("Rides imported", extra={
+        'rows': report.rows, 'rides_created': report.created, 'failed': report.failed, 'dry_run': dry_run,
+        'stopped_before_row': source.next_row if source.error else None,
+    })
+    if source.error is not None:
+        raise ImportStopped(source.error, report, source.next_row)
+    return report
@@ -0,0 +1,49 @@
+# rides/jobs.py
+
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.db import transaction
+from django.template.loader import render_to_string
+
+from jobs.delivery import MAIL_JOB
+from jobs.mail import serialize
+from jobs.queue import enqueue, job
+
+from .models import Ride
+from accounts.models import User
+
+
+@job('rides.notify_ride_cancelled')
+def notify_ride_cancelled(notify, reason='', by_staff=False):
+    """
+    Email travellers whose bookings were cancelled with their ride.
+
+    `notify` maps ride id to traveller ids, as recorded by cancel_rides().
+    The body is rendered once per ride; each traveller's message is its own
+    jobs.send_email job, so a refused address is retried (and dead-lettered)
+    alone and nobody else gets a duplicate. The jobs are queued together or
+    not at all.
+    """
+    rides = Ride.objects.select_related('pickup_city', 'dropoff_city').in_bulk([int(i) for i in notify])
+    traveller_ids = {t for travellers in notify.values() for t in travellers}
+    emails = dict(User.objects.filter(id__in=traveller_ids).exclude(email='').values_list('id', 'email'))
+
+    with transaction.atomic():
+        for ride_id, travellers in notify.items():
+            ride = rides.get(int(ride_id))
+            if ride is None:
+                continue
+            body = render_to_string('rides/email/ride_cancelled.txt', {'ride': ride, 'reason': reason, 'by_staff': by_staff})
+            for traveller in travellers:
+                if traveller in emails:
+                    message = EmailMessage(
+                        'Your PointRide ride was cancelled', body, settings.DEFAULT_FROM_EMAIL, [emails[traveller]],
+                    )
+                    enqueue(MAIL_JOB, {'message': serialize(message)})
+
+
+@job('rides.geocode_ride_addresses')
+def geocode_ride_addresses(ride_ids):
+    """Store coordinates for the pickup and drop-off addresses of new or edited rides (rides.addresses)"""
+    from .addresses import geocode_rides
+    geocode_rides(ride_ids)
@@ -0,0 +1,218 @@
+# rides/lifecycle.py
+
+"""
+Ride lifecycle operations that touch many rows at once.
+
+These work on sets of rides with a fixed number of statements, instead of
+looping over bookings and calling save() on each one. Every row they change
+is also written to the RideEvent log in the same transaction.
+"""
+
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from jobs.queue import enqueue
+
+from .models import Ride, Booking, RideEvent
+
+# Rides that can still be cancelled
+OPEN_RIDE_STATUSES = ('ACTIVE', 'FULL')
+
+# Bookings that still hold (PENDING) or own (CONFIRMED) seats on a ride
+LIVE_BOOKING_STATUSES = ('PENDING', 'CONFIRMED')
+
+# Used when a ride's route has no estimated duration
+DEFAULT_RIDE_DURATION = timedelta(hours=3)
+
+
+def cancel_rides(ride_ids, actor=None, reason='', by_staff=False):
+    """
+    Cancel open rides and all their live bookings.
+
+    Runs the same statements whether a ride has one booking or hundreds:
+    lock rides, read live bookings, update bookings, update rides, insert
+    events, and queue one job that emails every affected traveller. The
+    cancellation event of each ride also lists the travellers notified.
+    `reason` is shown to travellers as given; `by_staff` words their email
+    as a cancellation by PointRide rather than by the driver.
+    Returns the number of rides cancelled.
+    """
+    now = timezone.now()
+    actor_id = actor.pk if actor else None
+
+    with transaction.atomic():
+        rides = list(
+            Ride.objects.select_for_update()
+            .filter(id__in=ride_ids, status__in=OPEN_RIDE_STATUSES)
+            .values_list('id', 'driver_id', 'status', named=True)
+        )
+        if not rides:
+            return 0
+        live_ride_ids = [ride.id for ride in rides]
+
+        bookings = list(
+            Booking.objects.filter(ride_id__in=live_ride_ids, status__in=LIVE_BOOKING_STATUSES)
+            .values_list('id', 'ride_id', 'traveller_id', 'status', 'seats_booked', named=True)
+        )
+        if bookings:
+            Booking.objects.filter(id__in=[booking.id for booking in bookings]).update(
+                status='CANCELLED', updated_at=now
+            )
+        Ride.objects.filter(id__in=live_ride_ids).update(status='CANCELLED', updated_at=now)
+
+        drivers = {ride.id: ride.driver_id for ride in rides}
+        notify = {}
+        events = []
+        for booking in bookings:
+            notify.setdefault(booking.ride_id, []).append(booking.traveller_id)
+            events.append(RideEvent.objects.build(
+                'BOOKING_STATUS', booking.ride_id, drivers[booking.ride_id],
+                booking_id=booking.id, traveller_id=booking.traveller_id,
+                from_status=booking.status, to_status='CANCELLED',
+                seats=booking.seats_booked, actor_id=actor_id, reason='ride_cancelled',
+            ))
+        for ride in rides:
+            events.append(RideEvent.objects.build(
+                'RIDE_STATUS', ride.id, ride.driver_id,
+                from_status=ride.status, to_status='CANCELLED',
+                actor_id=actor_id, reason=reason, notify=notify.get(ride.id, []),
+            ))
+        RideEvent.objects.bulk_create(events)
+        if notify:
+            enqueue('rides.notify_ride_cancelled', {'notify': notify, 'reason': reason, 'by_staff': by_staff})
+
+    return len(rides)
+
+
+def cancel_ride(ride, actor=None, reason='', by_staff=False):
+    """Cancel a single ride; returns True if it was still open"""
+    return cancel_rides([ride.pk], actor=actor, reason=reason, by_staff=by_staff) == 1
+
+
+def booking_action(booking, user, action, now=None):
+    """
+    Confirm or reject (the driver) or cancel (the traveller) a pending booking.
+
+    Confirmations lock the ride row first, so two confirmations racing for
+    the last seats cannot both succeed. The booking row is then locked and
+    reloaded, so its status is checked as committed rather than as the
+    caller last read it. Returns None when the action was applied,
+    otherwise why not: 'forbidden', 'not_pending' or 'no_seats'.
+    """
+    if action in ('confirm', 'reject'):
+        allowed = user.pk == booking.ride.driver_id
+    elif action == 'cancel':
+        allowed = user.pk == booking.traveller_id
+    else:
+        allowed = False
+    if not allowed:
+        return 'forbidden'
+
+    with transaction.atomic():
+        if action == 'confirm':
+            list(Ride.objects.select_for_update().filter(id=booking.ride_id).values_list('id'))
+        booking.refresh_from_db(from_queryset=Booking.objects.select_for_update())
+        booking._loaded_status = booking.status
+        if booking.status != 'PENDING':
+            return 'not_pending'
+        if action == 'confirm':
+            if booking.seats_booked > booking.ride.available_seats_count:
+                return 'no_seats'
+            booking.status = 'CONFIRMED'
+            booking.confirmed_at = now or timezone.now()
+        else:
+            booking.status = 'CANCELLED'
+        # Booking.save() logs the transition and marks a filled ride FULL
+        booking.save()
+    return None
+
+
+def ride_end_time(departs_at, duration_minutes):
+    """When a ride is expected to arrive, given its departure and route duration"""
+    if duration_minutes:
+        return departs_at + timedelta(minutes=duration_minutes)
+    return departs_at + DEFAULT_RIDE_DURATION
+
+
+def complete_departed_rides(now=None, chunk_size=500):
+    """
+    Move open rides whose departure plus estimated duration has passed to COMPLETED.
+
+    Departed rides are read from the (status, departs_at) index in keyset
+    chunks; each chunk is settled in its own short transaction with one UPDATE
+    per table. Confirmed bookings are completed with their ride, and pending
+    requests that were never answered are cancelled.
+    Returns the number of rides completed.
+    """
+    now = now or timezone.now()
+    completed = 0
+    cursor = None  # (departs_at, id) of the last candidate seen
+
+    while True:
+        with transaction.atomic():
+            candidates = Ride.objects.select_for_update(skip_locked=True, of=('self',)).filter(
+                status__in=OPEN_RIDE_STATUSES, departs_at__lte=now
+            )
+            if cursor:
+                candidates = candidates.filter(
+                    Q(departs_at__gt=cursor[0]) | Q(departs_at=cursor[0], id__gt=cursor[1])
+                )
+            chunk = list(
+                candidates.order_by('departs_at', 'id')
+                .values_list('id', 'driver_id', 'status', 'departs_at',
+                             'route__estimated_duration_minutes', named=True)[:chunk_size]
+            )
+            if not chunk:
+                break
+            cursor = (chunk[-1].departs_at, chunk[-1].id)
+
+            due = [
+                ride for ride in chunk
+                if ride_end_time(ride.departs_at, ride.route__estimated_duration_minutes) <= now
+            ]
+            if due:
+                _complete(due, now)
+                completed += len(due)
+
+        if len(chunk) < chunk_size:
+            break
+
+    return completed
+
+
+def _complete(rides, now):
+    """Complete a chunk of rides and settle their live bookings"""
+    ride_ids = [ride.id for ride in rides]
+    drivers = {ride.id: ride.driver_id for ride in rides}
+
+    bookings = list(
+        Booking.objects.filter(ride_id__in=ride_ids, status__in=LIVE_BOOKING_STATUSES)
+        .values_list('id', 'ride_id', 'traveller_id', 'status', 'seats_booked', named=True)
+    )
+    confirmed = [booking.id for booking in bookings if booking.status == 'CONFIRMED']
+    pending = [booking.id for booking in bookings if booking.status == 'PENDING']
+    if confirmed:
+        Booking.objects.filter(id__in=confirmed).update(status='COMPLETED', updated_at=now)
+    if pending:
+        Booking.objects.filter(id__in=pending).update(status='CANCELLED', updated_at=now)
+    Ride.objects.filter(id__in=ride_ids).update(status='COMPLETED', updated_at=now)
+
+    events = [
+        RideEvent.objects.build(
+            'BOOKING_STATUS', booking.ride_id, drivers[booking.ride_id],
+            booking_id=booking.id, traveller_id=booking.traveller_id,
+            from_status=booking.status,
+            to_status='COMPLETED' if booking.status == 'CONFIRMED' else 'CANCELLED',
+            seats=booking.seats_booked, reason='ride_completed',
+        )
+        for booking in bookings
+    ]
+    events.extend(
+        RideEvent.objects.build('RIDE_STATUS', ride.id, ride.driver_id,
+                                from_status=ride.status, to_status='COMPLETED')
+        for ride in rides
+    )
+    RideEvent.objects.bulk_create(events)
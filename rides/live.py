@@ -0,0 +1,168 @@
+# rides/live.py
+
+"""
+Live seat availability for ride pages, pushed as server-sent events.
+
+One SeatHub per ASGI process tails the RideEvent log: every LIVE_POLL_INTERVAL
+seconds (or as soon as this process commits a ride/booking change) it reads
+the new events in one query, looks up seats left and status for the watched
+rides that changed in a second query, and fans the result out to every
+connected client. A thousand people watching a ride cost those two queries,
+not a thousand page refreshes.
+
+Changes committed by other processes are picked up on the next poll.
+"""
+
+import asyncio
+import json
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import F, Max
+
+from .models import Ride, RideEvent
+from .search import seats_booked
+
+# Messages buffered per client; a slow client only ever needs the latest state
+CLIENT_BUFFER = 8
+
+
+def poll_interval():
+    return getattr(settings, 'LIVE_POLL_INTERVAL', 1.0)
+
+
+def heartbeat_interval():
+    return getattr(settings, 'LIVE_HEARTBEAT_INTERVAL', 15.0)
+
+
+def last_event_id():
+    return RideEvent.objects.aggregate(last=Max('id'))['last'] or 0
+
+
+def changed_rides(cursor, watched, limit=5000):
+    """(new cursor, ids of watched rides with events after cursor)"""
+    events = list(
+        RideEvent.objects.filter(id__gt=cursor).order_by('id').values_list('id', 'ride_id')[:limit]
+    )
+    if not events:
+        return cursor, set()
+    return events[-1][0], {ride_id for _, ride_id in events if ride_id in watched}
+
+
+def seat_snapshots(ride_ids):
+    """{ride_id: {'ride_id', 'status', 'seats_left'}} in one query"""
+    rows = (
+        Ride.objects.filter(id__in=ride_ids)
+        .annotate(seats_left=F('available_seats') - seats_booked())
+        .values('id', 'status', 'seats_left')
+    )
+    return {row['id']: {'ride_id': row['id'], 'status': row['status'], 'seats_left': row['seats_left']}
+            for row in rows}
+
+
+class SeatHub:
+    """In-process fan-out of seat snapshots to subscribed clients"""
+
+    def __init__(self):
+        self.watchers = defaultdict(set)  # ride_id -> {asyncio.Queue}
+        self.snapshots = {}
+        self.loop = None
+        self.task = None
+        self.cursor = None
+        self._wake = None
+
+    def ensure_running(self):
+        loop = asyncio.get_running_loop()
+        if self.task is None or self.task.done() or self.loop is not loop:
+            self.loop = loop
+            self._wake = asyncio.Event()
+            self.task = loop.create_task(self.run())
+
+    async def subscribe(self, ride_id):
+        """Queue of snapshots for a ride, starting with the current one"""
+        self.ensure_running()
+        queue = asyncio.Queue(maxsize=CLIENT_BUFFER)
+        self.watchers[ride_id].add(queue)
+        if self.cursor is None:
+            # Start tailing before reading the snapshot so no change falls in between
+            self.cursor = await sync_to_async(last_event_id)()
+        if ride_id not in self.snapshots:
+            self.snapshots.update(await sync_to_async(seat_snapshots)([ride_id]))
+        if ride_id in self.snapshots:
+            queue.put_nowait(self.snapshots[ride_id])
+        return queue
+
+    def unsubscribe(self, ride_id, queue):
+        watchers = self.watchers.get(ride_id)
+        if watchers is None:
+            return
+        watchers.discard(queue)
+        if not watchers:
+            del self.watchers[ride_id]
+            self.snapshots.pop(ride_id, None)
+
+    def wake(self):
+        """Poll now instead of at the next tick; safe to call from any thread"""
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._wake.set)
+
+    def publish(self, snapshot):
+        ride_id = snapshot['ride_id']
+        if self.snapshots.get(ride_id) == snapshot:
+            return
+        self.snapshots[ride_id] = snapshot
+        for queue in self.watchers.get(ride_id, ()):
+            if queue.full():
+                queue.get_nowait()  # drop the oldest; only the latest matters
+            queue.put_nowait(snapshot)
+
+    async def poll(self):
+        """One tick: read new events, refresh changed watched rides, fan out"""
+        if self.cursor is None:
+            return
+        watched = set(self.watchers)
+        self.cursor, changed = await sync_to_async(changed_rides)(self.cursor, watched)
+        if changed:
+            snapshots = await sync_to_async(seat_snapshots)(changed)
+            for snapshot in snapshots.values():
+                self.publish(snapshot)
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=poll_interval())
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if not self.watchers:
+                self.cursor = None  # nothing to catch up on when someone subscribes again
+                continue
+            try:
+                await self.poll()
+            except Exception:
+                # Keep serving; the next tick retries from the same cursor
+                await asyncio.sleep(poll_interval())
+
+
+hub = SeatHub()
+
+
+def format_event(snapshot):
+    return f"event: seats\ndata: {json.dumps(snapshot)}\n\n"
+
+
+async def seat_stream(ride_id):
+    """Server-sent event stream for one ride, with periodic heartbeats"""
+    queue = await hub.subscribe(ride_id)
+    try:
+        yield f"retry: {int(poll_interval() * 3000)}\n\n"
+        while True:
+            try:
+                snapshot = await asyncio.wait_for(queue.get(), timeout=heartbeat_interval())
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield format_event(snapshot)
+    finally:
+        hub.unsubscribe(ride_id, queue)
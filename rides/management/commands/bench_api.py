@@ -0,0 +1,109 @@
+# rides/management/commands/bench_api.py
+
+import statistics
+import time as clock
+from datetime import date, time, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounts.models import User
+from rides.models import City, Route, Ride
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compare response time, queries and bytes of each JSON API endpoint with its HTML page'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rides', type=int, default=200, help='Rides to seed on the benchmark route')
+        parser.add_argument('--repeat', type=int, default=30, help='Requests per endpoint')
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        try:
+            with transaction.atomic(), override_settings(
+                ALLOWED_HOSTS=['testserver'], RATELIMIT_ENABLE=False, DEBUG=False,
+            ):
+                self.seed(max(options['rides'], 2 * repeat))
+                self.stdout.write(f"{'endpoint':<16}{'':<6}{'median ms':>10}{'queries':>9}{'bytes':>9}")
+                for name, html, api in self.cases(repeat):
+                    for label, request in (('html', html), ('api', api)):
+                        self.report(name, label, [self.measure(request, i) for i in range(repeat)])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, count):
+        self.driver = User.objects.create_user(
+            username='api-bench-driver', password='api-bench', full_legal_name='Bench Driver', is_driver=True,
+        )
+        self.traveller = User.objects.create_user(
+            username='api-bench-traveller', password='api-bench', full_legal_name='Bench Traveller',
+            is_traveller=True,
+        )
+        self.origin = City.objects.create(name='Bench Origin')
+        self.destination = City.objects.create(name='Bench Destination')
+        route = Route.objects.create(driver=self.driver, origin_city=self.origin,
+                                     destination_city=self.destination, driver_price=Decimal('30.00'))
+        self.day = date.today() + timedelta(days=1)
+        self.rides = [
+            Ride.objects.create(
+                route=route, driver=self.driver, departure_date=self.day,
+                departure_time=time(i % 24, i % 60), available_seats=4,
+                pickup_location='Bench pickup', pickup_city=self.origin,
+                dropoff_location='Bench dropoff', dropoff_city=self.destination,
+                price_per_seat=Decimal(10 + i % 40),
+            )
+            for i in range(count)
+        ]
+
+        self.client = Client()
+        self.client.login(username='api-bench-traveller', password='api-bench')
+
+    def cases(self, repeat):
+        """(name, html request, api request); each takes the iteration number"""
+        client = self.client
+        search = {'pickup_city': self.origin.id, 'dropoff_city': self.destination.id,
+                  'departure_date': self.day.isoformat()}
+        api_search = {'pickup_city': self.origin.id, 'dropoff_city': self.destination.id,
+                      'date': self.day.isoformat(), 'limit': 20}
+        detail = [reverse('rides:ride_detail', args=[ride.id]) for ride in self.rides]
+        api_detail = [reverse('rides:api_v1_ride_detail', args=[ride.id]) for ride in self.rides]
+        html_booking, api_booking = self.rides[:repeat], self.rides[repeat:2 * repeat]
+        return [
+            ('search',
+             lambda i: client.post(reverse('rides:search_rides'), search),
+             lambda i: client.get(reverse('rides:api_v1_search'), api_search)),
+            ('ride detail',
+             lambda i: client.get(detail[i]),
+             lambda i: client.get(api_detail[i])),
+            ('create booking',
+             lambda i: client.post(reverse('rides:ride_detail', args=[html_booking[i].id]), {'seats_booked': 1}),
+             lambda i: client.post(reverse('rides:api_v1_create_booking', args=[api_booking[i].id]),
+                                   {'seats_booked': 1})),
+            ('my rides',
+             lambda i: client.get(reverse('rides:my_rides')),
+             lambda i: client.get(reverse('rides:api_v1_my_rides'))),
+        ]
+
+    def report(self, name, label, samples):
+        times = [sample[0] for sample in samples]
+        queries = max(sample[1] for sample in samples)
+        size = max(sample[2] for sample in samples)
+        self.stdout.write(f"{name:<16}{label:<6}{statistics.median(times) * 1000:>10.2f}{queries:>9}{size:>9}")
+
+    def measure(self, request, i):
+        """(seconds, queries, response bytes) of one request"""
+        with CaptureQueriesContext(connection) as queries:
+            started = clock.perf_counter()
+            response = request(i)
+            elapsed = clock.perf_counter() - started
+        return elapsed, len(queries), len(response.content)
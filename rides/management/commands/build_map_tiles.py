@@ -0,0 +1,26 @@
+# rides/management/commands/build_map_tiles.py
+
+from django.core.management.base import BaseCommand
+
+from rides import maptiles
+
+
+class Command(BaseCommand):
+    help = 'Precompute the clustered route map tiles into the tile cache (run after deploys and periodically)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--layer', action='append', choices=list(maptiles.LAYERS),
+                            help='Layer to build (repeatable; default: all)')
+        parser.add_argument('--max-zoom', type=int, default=maptiles.MAX_ZOOM,
+                            help=f'Deepest zoom level to build (default: {maptiles.MAX_ZOOM})')
+        parser.add_argument('--fresh', action='store_true',
+                            help='Start a new cache generation first, so no tile built before is served')
+
+    def handle(self, *args, **options):
+        layers = options['layer'] or list(maptiles.LAYERS)
+        if options['fresh']:
+            for layer in layers:
+                maptiles.invalidate_layer(layer)
+        zooms = range(min(options['max_zoom'], maptiles.MAX_ZOOM) + 1)
+        stored = maptiles.build_tiles(layers, zooms)
+        self.stdout.write(self.style.SUCCESS(f"Stored {stored} tiles for {', '.join(layers)} at zoom 0-{zooms[-1]}"))
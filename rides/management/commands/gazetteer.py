@@ -0,0 +1,32 @@
+# rides/management/commands/gazetteer.py
+
+from django.core.management.base import BaseCommand
+
+from rides.gazetteer import get_gazetteer
+
+
+class Command(BaseCommand):
+    help = "Show the offline gazetteer's size and load time, and resolve locations against it"
+
+    def add_arguments(self, parser):
+        parser.add_argument('locations', nargs='*', help='Free-text locations to resolve')
+
+    def handle(self, *args, **options):
+        gazetteer = get_gazetteer()
+        stats = gazetteer.stats()
+        self.stdout.write(
+            f"{stats['places']} places, {stats['keys']} names and aliases, "
+            f"{stats['bytes'] / 1024:.1f} KiB, loaded in {stats['load_ms']} ms"
+        )
+        for location in options['locations']:
+            if gazetteer.outside_ontario(location):
+                self.stdout.write(f"{location!r}: outside Ontario")
+                continue
+            place = gazetteer.find(location)
+            if place is None:
+                self.stdout.write(f"{location!r}: not found")
+                continue
+            latitude, longitude = gazetteer.coordinates(place)
+            municipality = gazetteer.name(gazetteer.municipality(place))
+            self.stdout.write(f"{location!r}: {gazetteer.name(place)} ({gazetteer.kind_of(place)}, "
+                              f"{municipality}) {latitude:.4f}, {longitude:.4f}")
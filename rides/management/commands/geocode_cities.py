@@ -0,0 +1,72 @@
+# rides/management/commands/geocode_cities.py
+
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from rides.geocoding import PROVIDERS, GeocodeCache, Place, geocode_cities
+from rides.imports import detect_format, iter_rows, text_stream
+from rides.models import City
+
+
+class Command(BaseCommand):
+    help = 'Look up city coordinates with a geocoding service and store them in City'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', help='Geocode the places named in this CSV/JSON city file '
+                                           '(name, province, country columns)')
+        parser.add_argument('--all', action='store_true',
+                            help='Geocode every active city (default: only cities without coordinates)')
+        parser.add_argument('--provider', choices=sorted(PROVIDERS), default=settings.GEOCODING_PROVIDER)
+        parser.add_argument('--url', help="Provider base URL (default: GEOCODING_URL)")
+        parser.add_argument('--rate', type=float,
+                            help='Requests per second across all workers (default: GEOCODING_RATE, '
+                                 'unlimited for offline providers)')
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--retries', type=int, default=3)
+        parser.add_argument('--cache', help='Answer cache and checkpoint file '
+                                            '(default: GEOCODING_CACHE_PATH, one file per provider)')
+        parser.add_argument('--dry-run', action='store_true', help='Look up and cache only; write nothing to City')
+
+    def handle(self, *args, **options):
+        provider_class = PROVIDERS[options['provider']]
+        provider = provider_class(base_url=options['url']) if options['url'] else provider_class()
+        rate = options['rate'] or (float('inf') if provider.offline else settings.GEOCODING_RATE)
+        default_cache = Path(settings.GEOCODING_CACHE_PATH)
+        cache = GeocodeCache(options['cache'] or default_cache.with_name(
+            f"{default_cache.stem}-{provider.name}{default_cache.suffix}"
+        ))
+        try:
+            report = geocode_cities(
+                self.places(options), provider, cache, rate=rate, workers=options['workers'],
+                retries=options['retries'], dry_run=options['dry_run'],
+            )
+        finally:
+            cache.close()
+
+        for name in report.not_found:
+            self.stdout.write(self.style.WARNING(f"Not found: {name}"))
+        for name, error in report.failed:
+            self.stdout.write(self.style.ERROR(f"Failed: {name} ({error}); rerun to retry"))
+        prefix = '[dry run] ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(f"{prefix}{report}"))
+
+    def places(self, options):
+        if options['file']:
+            try:
+                fileobj = open(options['file'], 'rb')
+            except OSError as e:
+                raise CommandError(f"Could not read {options['file']}: {e}")
+            with fileobj:
+                for _, row in iter_rows(text_stream(fileobj), detect_format(options['file'])):
+                    if row.get('name'):
+                        yield Place(row['name'].strip(), row.get('province') or 'Ontario',
+                                    row.get('country') or 'Canada')
+            return
+        cities = City.objects.filter(is_active=True)
+        if not options['all']:
+            cities = cities.filter(latitude__isnull=True)
+        # Read up front: the upserts write to City while places are consumed
+        for name, province, country in list(cities.values_list('name', 'province', 'country')):
+            yield Place(name, province, country)
@@ -0,0 +1,26 @@
+# rides/management/commands/geocode_rides.py
+
+from django.core.management.base import BaseCommand
+
+from jobs.queue import enqueue
+from rides.addresses import geocode_rides
+from rides.models import GEOCODE_JOB_SIZE, Ride
+
+
+class Command(BaseCommand):
+    help = 'Geocode the pickup and drop-off addresses of rides that have no coordinates yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--inline', action='store_true',
+                            help='Geocode in this process instead of queueing jobs for the workers')
+
+    def handle(self, *args, **options):
+        ride_ids = list(Ride.objects.filter(pickup_latitude__isnull=True).order_by('id').values_list('id', flat=True))
+        chunks = [ride_ids[start:start + GEOCODE_JOB_SIZE] for start in range(0, len(ride_ids), GEOCODE_JOB_SIZE)]
+        for chunk in chunks:
+            if options['inline']:
+                geocode_rides(chunk)
+            else:
+                enqueue('rides.geocode_ride_addresses', {'ride_ids': chunk})
+        action = 'Geocoded' if options['inline'] else f"Queued {len(chunks)} jobs for"
+        self.stdout.write(self.style.SUCCESS(f"{action} {len(ride_ids)} rides"))
@@ -0,0 +1,61 @@
+# rides/management/commands/import_rides.py
+
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from rides.imports import CHUNK_SIZE, ImportStopped, detect_format, import_rides
+
+
+class Command(BaseCommand):
+    help = 'Import rides from a CSV or JSON file (see rides/imports.py for the columns)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'json'], help='Default: from the file extension')
+        parser.add_argument('--driver', help='Username of the driver for rows without a driver column')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Validation processes (default: 1, validating in this process; '
+                                 'worth raising only for files of many thousands of rows)')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+        parser.add_argument('--start-row', type=int,
+                            help='Skip the rows before this one, e.g. to resume an import that stopped')
+        parser.add_argument('--errors', help='Write every rejected row to this CSV file')
+        parser.add_argument('--dry-run', action='store_true', help='Validate only; create nothing')
+
+    def handle(self, *args, **options):
+        driver = None
+        if options['driver']:
+            driver = User.objects.filter(username=options['driver'], is_driver=True).first()
+            if driver is None:
+                raise CommandError(f"No driver with username {options['driver']!r}")
+
+        error_file = open(options['errors'], 'w', newline='') if options['errors'] else None
+        try:
+            error_writer = None
+            if error_file:
+                error_writer = csv.writer(error_file)
+                error_writer.writerow(['row', 'errors'])
+            with open(options['path'], 'rb') as fileobj:
+                report = import_rides(
+                    fileobj, options['format'] or detect_format(options['path']), driver=driver,
+                    workers=options['workers'], chunk_size=options['chunk_size'],
+                    dry_run=options['dry_run'], error_writer=error_writer, start_row=options['start_row'],
+                )
+        except ImportStopped as e:
+            raise CommandError(
+                f"Could not read {options['path']} to the end: {e}. Fix it and rerun with --start-row {e.next_row}"
+            )
+        except ValueError as e:
+            raise CommandError(f"Could not read {options['path']}: {e}")
+        finally:
+            if error_file:
+                error_file.close()
+
+        for number, messages in report.errors[:20]:
+            self.stdout.write(self.style.WARNING(f"Row {number}: {'; '.join(messages)}"))
+        if len(report.errors) > 20:
+            self.stdout.write(f"... and {report.failed - 20} more rejected rows")
+        prefix = '[dry run] ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(f"{prefix}{report}"))
@@ -0,0 +1,40 @@
+# rides/management/commands/load_cities.py
+
+from django.core.management.base import BaseCommand, CommandError
+
+from rides.citydata import BATCH_SIZE, DEFAULT_FILE, load_cities
+from rides.imports import detect_format
+
+
+class Command(BaseCommand):
+    help = 'Create or update cities from a CSV or JSON data file in bulk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default=str(DEFAULT_FILE),
+                            help='Columns: name, province, country, latitude, longitude, is_active '
+                                 '(default: the bundled Ontario list)')
+        parser.add_argument('--format', choices=['csv', 'json'], help='Default: from the file extension')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help='Show what would change; write nothing')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], 'rb') as fileobj:
+                report = load_cities(
+                    fileobj, options['format'] or detect_format(options['path']),
+                    dry_run=options['dry_run'], batch_size=options['batch_size'],
+                )
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Could not read {options['path']}: {e}")
+
+        # The full diff on a dry run (or with -v 2); otherwise just the totals
+        if options['dry_run'] or options['verbosity'] > 1:
+            for data in report.created:
+                self.stdout.write(f"+ {data['name']} ({data['latitude']}, {data['longitude']})")
+            for data, changes in report.updated:
+                listed = ', '.join(f"{field} {old} -> {new}" for field, (old, new) in changes.items())
+                self.stdout.write(f"~ {data['name']}: {listed}")
+        for number, messages in report.errors:
+            self.stdout.write(self.style.WARNING(f"Row {number}: {'; '.join(messages)}"))
+        prefix = '[dry run] ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(f"{prefix}{report}"))
@@ -1,153 +0,0 @@
-# rides/management/commands/populate_google_verified_cities.py
-
-from django.core.management.base import BaseCommand
-from rides.models import City
-from decimal import Decimal
-
-class Command(BaseCommand):
-    help = 'Populate cities with GOOGLE MAPS VERIFIED coordinates'
-
-    def handle(self, *args, **options):
-        """
-        MANUALLY VERIFIED Ontario cities with GOOGLE MAPS coordinates
-        Data source: Google Maps (manually verified January 2025)
-        Each coordinate manually checked and verified
-        """
-        
-        # MANUALLY VERIFIED coordinates from Google Maps
-        google_verified_cities = [
-            # Major Cities - VERIFIED with Google Maps
-            {'name': 'Toronto', 'latitude': 43.653226, 'longitude': -79.383184},
-            {'name': 'Ottawa', 'latitude': 45.421532, 'longitude': -75.697189},
-            {'name': 'Mississauga', 'latitude': 43.589045, 'longitude': -79.644120},
-            {'name': 'Hamilton', 'latitude': 43.255203, 'longitude': -79.871139},
-            {'name': 'Brampton', 'latitude': 43.731549, 'longitude': -79.762421},
-            {'name': 'London', 'latitude': 42.984924, 'longitude': -81.245277},
-            {'name': 'Markham', 'latitude': 43.856098, 'longitude': -79.337021},
-            {'name': 'Vaughan', 'latitude': 43.837208, 'longitude': -79.508278},
-            {'name': 'Kitchener', 'latitude': 43.450862, 'longitude': -80.489137},
-            {'name': 'Windsor', 'latitude': 42.317432, 'longitude': -83.026772},
-            
-            # Medium Cities - VERIFIED with Google Maps
-            {'name': 'Richmond Hill', 'latitude': 43.883789, 'longitude': -79.437693},
-            {'name': 'Oakville', 'latitude': 43.467517, 'longitude': -79.687666},
-            {'name': 'Burlington', 'latitude': 43.325501, 'longitude': -79.799309},
-            {'name': 'Oshawa', 'latitude': 43.897545, 'longitude': -78.865479},
-            {'name': 'Barrie', 'latitude': 44.389356, 'longitude': -79.690332},
-            {'name': 'Guelph', 'latitude': 43.544805, 'longitude': -80.248167},
-            {'name': 'Cambridge', 'latitude': 43.360851, 'longitude': -80.314362},
-            {'name': 'Kingston', 'latitude': 44.231172, 'longitude': -76.485954},
-            {'name': 'Waterloo', 'latitude': 43.464258, 'longitude': -80.520410},
-            {'name': 'Sudbury', 'latitude': 46.491780, 'longitude': -80.993021},
-            
-            # Smaller Cities - VERIFIED with Google Maps
-            {'name': 'Thunder Bay', 'latitude': 48.380894, 'longitude': -89.247682},
-            {'name': 'St. Catharines', 'latitude': 43.159374, 'longitude': -79.246864},
-            {'name': 'Niagara Falls', 'latitude': 43.096218, 'longitude': -79.037739},
-            {'name': 'Peterborough', 'latitude': 44.309654, 'longitude': -78.319740},
-            {'name': 'Sarnia', 'latitude': 42.999439, 'longitude': -82.308930},
-            {'name': 'Brantford', 'latitude': 43.139412, 'longitude': -80.264434},
-            {'name': 'Sault Ste. Marie', 'latitude': 46.495311, 'longitude': -84.345618},
-            {'name': 'Welland', 'latitude': 42.991840, 'longitude': -79.264832},
-            {'name': 'North Bay', 'latitude': 46.309621, 'longitude': -79.460831},
-            {'name': 'Belleville', 'latitude': 44.162785, 'longitude': -77.383190},
-            {'name': 'Cornwall', 'latitude': 45.021067, 'longitude': -74.730507},
-            {'name': 'Chatham-Kent', 'latitude': 42.404839, 'longitude': -82.191040},
-            {'name': 'Orillia', 'latitude': 44.608429, 'longitude': -79.419692},
-            {'name': 'Stratford', 'latitude': 43.370140, 'longitude': -80.982126},
-            {'name': 'Timmins', 'latitude': 48.467857, 'longitude': -81.330414},
-            {'name': 'Owen Sound', 'latitude': 44.566746, 'longitude': -80.933300},
-            {'name': 'Collingwood', 'latitude': 44.500584, 'longitude': -80.216736},
-            {'name': 'Cobourg', 'latitude': 43.959732, 'longitude': -78.166435},
-            {'name': 'Pembroke', 'latitude': 45.826668, 'longitude': -77.108002},
-            {'name': 'Brockville', 'latitude': 44.590550, 'longitude': -75.691864},
-            
-            # Additional Regional Centers - VERIFIED with Google Maps
-            {'name': 'Ajax', 'latitude': 43.850992, 'longitude': -79.020332},
-            {'name': 'Pickering', 'latitude': 43.838280, 'longitude': -79.087097},
-            {'name': 'Whitby', 'latitude': 43.874722, 'longitude': -78.942398},
-            {'name': 'Newmarket', 'latitude': 44.059226, 'longitude': -79.461613},
-            {'name': 'Aurora', 'latitude': 44.006325, 'longitude': -79.460556},
-            {'name': 'Bradford', 'latitude': 44.116667, 'longitude': -79.566667},
-            {'name': 'Innisfil', 'latitude': 44.301389, 'longitude': -79.652778},
-            {'name': 'Simcoe', 'latitude': 42.836389, 'longitude': -80.300556},
-            {'name': 'Tillsonburg', 'latitude': 42.864722, 'longitude': -80.728611},
-            {'name': 'Woodstock', 'latitude': 43.130556, 'longitude': -80.746667},
-            {'name': 'Ingersoll', 'latitude': 43.036667, 'longitude': -80.888056},
-            {'name': 'St. Thomas', 'latitude': 42.778889, 'longitude': -81.175278},
-            {'name': 'Leamington', 'latitude': 42.053611, 'longitude': -82.599444},
-            {'name': 'Tecumseh', 'latitude': 42.333333, 'longitude': -82.900000},
-            {'name': 'LaSalle', 'latitude': 42.233333, 'longitude': -83.050000},
-            {'name': 'Amherstburg', 'latitude': 42.100000, 'longitude': -83.100000},
-        ]
-
-        created_count = 0
-        updated_count = 0
-
-        self.stdout.write(self.style.SUCCESS('🌍 Populating cities with GOOGLE MAPS VERIFIED coordinates...'))
-
-        for city_data in google_verified_cities:
-            try:
-                city, created = City.objects.get_or_create(
-                    name=city_data['name'],
-                    defaults={
-                        'province': 'Ontario',
-                        'country': 'Canada',
-                        'latitude': Decimal(str(city_data['latitude'])),
-                        'longitude': Decimal(str(city_data['longitude'])),
-                        'is_active': True
-                    }
-                )
-                
-                if created:
-                    created_count += 1
-                    self.stdout.write(f'✅ Created: {city.name} ({city_data["latitude"]:.6f}, {city_data["longitude"]:.6f})')
-                else:
-                    # Update coordinates if they're different
-                    old_lat = city.latitude
-                    old_lon = city.longitude
-                    city.latitude = Decimal(str(city_data['latitude']))
-                    city.longitude = Decimal(str(city_data['longitude']))
-                    city.save()
-                    updated_count += 1
-                    self.stdout.write(f'🔄 Updated: {city.name} ({old_lat} → {city.latitude}, {old_lon} → {city.longitude})')
-                    
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f'❌ Error with {city_data["name"]}: {str(e)}'))
-
-        self.stdout.write(
-            self.style.SUCCESS(
-                f'\n📊 GOOGLE MAPS VERIFIED COORDINATES SUMMARY:\n'
-                f'✅ Created: {created_count} cities\n'
-                f'🔄 Updated: {updated_count} cities\n'
-                f'🌍 Total: {City.objects.filter(province="Ontario").count()} cities\n'
-                f'📍 Data source: Google Maps (manually verified)\n'
-                f'📅 Verified: January 2025\n'
-                f'🎯 Accuracy: High precision coordinates'
-            )
-        )
-        
-        # Verify data integrity
-        self.stdout.write(self.style.SUCCESS('\n🔍 Verifying coordinate accuracy...'))
-        
-        # Check for reasonable coordinate ranges (Ontario bounds)
-        ontario_bounds = {
-            'min_lat': 41.0,  # Southern Ontario
-            'max_lat': 57.0,  # Northern Ontario  
-            'min_lon': -95.0, # Western Ontario
-            'max_lon': -74.0  # Eastern Ontario
-        }
-        
-        out_of_bounds = 0
-        for city in City.objects.filter(province='Ontario'):
-            if (city.latitude < ontario_bounds['min_lat'] or 
-                city.latitude > ontario_bounds['max_lat'] or
-                city.longitude < ontario_bounds['min_lon'] or 
-                city.longitude > ontario_bounds['max_lon']):
-                self.stdout.write(self.style.WARNING(f'⚠️  {city.name} coordinates may be out of Ontario bounds'))
-                out_of_bounds += 1
-        
-        if out_of_bounds == 0:
-            self.stdout.write(self.style.SUCCESS('✅ All coordinates are within Ontario bounds'))
-        else:
-            self.stdout.write(self.style.WARNING(f'⚠️  {out_of_bounds} cities have questionable coordinates'))
\ No newline at end of file
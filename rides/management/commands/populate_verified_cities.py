@@ -1,151 +0,0 @@
-# rides/management/commands/populate_verified_cities.py
-
-from django.core.management.base import BaseCommand
-from rides.models import City
-
-class Command(BaseCommand):
-    help = 'Populate VERIFIED cities data for Ontario, Canada'
-
-    def handle(self, *args, **options):
-        """
-        VERIFIED Ontario cities with ACCURATE coordinates
-        Data source: Government of Canada official data + Google Maps verification
-        Last updated: January 2025
-        """
-        
-        # VERIFIED Ontario cities with ACCURATE coordinates
-        verified_ontario_cities = [
-            # Major Cities (Population > 100,000)
-            {'name': 'Toronto', 'latitude': 43.6532, 'longitude': -79.3832, 'population': 2794356},
-            {'name': 'Ottawa', 'latitude': 45.4215, 'longitude': -75.6972, 'population': 994837},
-            {'name': 'Mississauga', 'latitude': 43.5890, 'longitude': -79.6441, 'population': 721599},
-            {'name': 'Hamilton', 'latitude': 43.2557, 'longitude': -79.8711, 'population': 569353},
-            {'name': 'Brampton', 'latitude': 43.7315, 'longitude': -79.7624, 'population': 656480},
-            {'name': 'London', 'latitude': 42.9849, 'longitude': -81.2453, 'population': 422324},
-            {'name': 'Markham', 'latitude': 43.8561, 'longitude': -79.3370, 'population': 338503},
-            {'name': 'Vaughan', 'latitude': 43.8563, 'longitude': -79.5085, 'population': 323103},
-            {'name': 'Kitchener', 'latitude': 43.4643, 'longitude': -80.5204, 'population': 256885},
-            {'name': 'Windsor', 'latitude': 42.3149, 'longitude': -83.0364, 'population': 229660},
-            
-            # Medium Cities (Population 50,000-100,000)
-            {'name': 'Richmond Hill', 'latitude': 43.8828, 'longitude': -79.4403, 'population': 195022},
-            {'name': 'Oakville', 'latitude': 43.4675, 'longitude': -79.6877, 'population': 193832},
-            {'name': 'Burlington', 'latitude': 43.3255, 'longitude': -79.7990, 'population': 186948},
-            {'name': 'Oshawa', 'latitude': 43.8971, 'longitude': -78.8658, 'population': 166000},
-            {'name': 'Barrie', 'latitude': 44.3894, 'longitude': -79.6903, 'population': 147829},
-            {'name': 'Guelph', 'latitude': 43.5448, 'longitude': -80.2482, 'population': 131794},
-            {'name': 'Cambridge', 'latitude': 43.3616, 'longitude': -80.3144, 'population': 129920},
-            {'name': 'Kingston', 'latitude': 44.2312, 'longitude': -76.4860, 'population': 127943},
-            {'name': 'Waterloo', 'latitude': 43.4643, 'longitude': -80.5204, 'population': 121436},
-            {'name': 'Sudbury', 'latitude': 46.4917, 'longitude': -80.9930, 'population': 88054},
-            
-            # Smaller Cities (Population 25,000-50,000)
-            {'name': 'Thunder Bay', 'latitude': 48.3809, 'longitude': -89.2477, 'population': 107909},
-            {'name': 'St. Catharines', 'latitude': 43.1594, 'longitude': -79.2469, 'population': 133113},
-            {'name': 'Niagara Falls', 'latitude': 43.0962, 'longitude': -79.0377, 'population': 88071},
-            {'name': 'Peterborough', 'latitude': 44.3106, 'longitude': -78.3197, 'population': 83651},
-            {'name': 'Sarnia', 'latitude': 42.9994, 'longitude': -82.4066, 'population': 71594},
-            {'name': 'Brantford', 'latitude': 43.1394, 'longitude': -80.2644, 'population': 104688},
-            {'name': 'Sault Ste. Marie', 'latitude': 46.5197, 'longitude': -84.3456, 'population': 73368},
-            {'name': 'Welland', 'latitude': 42.9918, 'longitude': -79.2648, 'population': 52293},
-            {'name': 'North Bay', 'latitude': 46.3091, 'longitude': -79.4608, 'population': 51553},
-            {'name': 'Belleville', 'latitude': 44.1628, 'longitude': -77.3832, 'population': 55071},
-            
-            # Additional Regional Centers
-            {'name': 'Cornwall', 'latitude': 45.0212, 'longitude': -74.7307, 'population': 47845},
-            {'name': 'Chatham-Kent', 'latitude': 42.4048, 'longitude': -82.1910, 'population': 102042},
-            {'name': 'Orillia', 'latitude': 44.6084, 'longitude': -79.4197, 'population': 33411},
-            {'name': 'Stratford', 'latitude': 43.3701, 'longitude': -80.9821, 'population': 33232},
-            {'name': 'Timmins', 'latitude': 48.4758, 'longitude': -81.3304, 'population': 41788},
-            {'name': 'Owen Sound', 'latitude': 44.5667, 'longitude': -80.9333, 'population': 21341},
-            {'name': 'Collingwood', 'latitude': 44.5006, 'longitude': -80.2167, 'population': 21793},
-            {'name': 'Cobourg', 'latitude': 43.9597, 'longitude': -78.1664, 'population': 19440},
-            {'name': 'Pembroke', 'latitude': 45.8267, 'longitude': -77.1080, 'population': 14360},
-            {'name': 'Brockville', 'latitude': 44.5906, 'longitude': -75.6919, 'population': 21346},
-        ]
-
-        created_count = 0
-        updated_count = 0
-        skipped_count = 0
-
-        self.stdout.write(self.style.SUCCESS('🏙️  Populating VERIFIED Ontario cities...'))
-
-        for city_data in verified_ontario_cities:
-            try:
-                city, created = City.objects.get_or_create(
-                    name=city_data['name'],
-                    defaults={
-                        'province': 'Ontario',
-                        'country': 'Canada',
-                        'latitude': city_data['latitude'],
-                        'longitude': city_data['longitude'],
-                        'is_active': True
-                    }
-                )
-                
-                if created:
-                    created_count += 1
-                    self.stdout.write(f'✅ Created: {city.name} (Pop: {city_data["population"]:,})')
-                else:
-                    # Update coordinates if they're different
-                    if (city.latitude != city_data['latitude'] or 
-                        city.longitude != city_data['longitude']):
-                        city.latitude = city_data['latitude']
-                        city.longitude = city_data['longitude']
-                        city.save()
-                        updated_count += 1
-                        self.stdout.write(f'🔄 Updated: {city.name} coordinates')
-                    else:
-                        skipped_count += 1
-                        self.stdout.write(f'⏭️  Skipped: {city.name} (already exists)')
-                        
-            except Exception as e:
-                self.stdout.write(
-                    self.style.ERROR(f'❌ Error with {city_data["name"]}: {str(e)}')
-                )
-
-        # Summary
-        self.stdout.write(
-            self.style.SUCCESS(
-                f'\n📊 CITY POPULATION SUMMARY:\n'
-                f'✅ Created: {created_count} cities\n'
-                f'🔄 Updated: {updated_count} cities\n'
-                f'⏭️  Skipped: {skipped_count} cities\n'
-                f'🏙️  Total Ontario cities: {City.objects.filter(province="Ontario").count()}\n'
-                f'📍 Data source: Government of Canada + Google Maps verification\n'
-                f'📅 Last updated: January 2025'
-            )
-        )
-        
-        # Verify data integrity
-        self.stdout.write(self.style.SUCCESS('\n🔍 Verifying data integrity...'))
-        
-        # Check for duplicates
-        duplicates = City.objects.values('name').annotate(count=models.Count('name')).filter(count__gt=1)
-        if duplicates:
-            self.stdout.write(self.style.WARNING(f'⚠️  Found {len(duplicates)} duplicate cities'))
-        else:
-            self.stdout.write(self.style.SUCCESS('✅ No duplicate cities found'))
-        
-        # Check for missing coordinates
-        missing_coords = City.objects.filter(latitude__isnull=True, longitude__isnull=True)
-        if missing_coords:
-            self.stdout.write(self.style.WARNING(f'⚠️  Found {missing_coords.count()} cities without coordinates'))
-        else:
-            self.stdout.write(self.style.SUCCESS('✅ All cities have coordinates'))
-
-    def add_arguments(self, parser):
-        parser.add_argument(
-            '--reset',
-            action='store_true',
-            help='Reset all cities and repopulate',
-        )
-        
-        parser.add_argument(
-            '--verify-only',
-            action='store_true',
-            help='Only verify existing data without adding new cities',
-        )
-
-# Add this import at the top
-from django.db import models
\ No newline at end of file
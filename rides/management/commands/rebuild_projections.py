@@ -0,0 +1,34 @@
+# rides/management/commands/rebuild_projections.py
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from rides.projections import PROJECTIONS, SETTLE_DELAY, rebuild
+
+class Command(BaseCommand):
+    help = 'Fold new ride/booking events into the seat, driver and traveller projections'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Discard projection rows and replay the whole event log')
+        parser.add_argument('--only', choices=sorted(PROJECTIONS),
+                            help='Rebuild a single projection')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--settle-seconds', type=int, default=int(SETTLE_DELAY.total_seconds()),
+                            help='Skip events younger than this (default: %(default)s)')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
+        names = [options['only']] if options['only'] else list(PROJECTIONS)
+        settle = timedelta(seconds=options['settle_seconds'])
+
+        for name in names:
+            applied = rebuild(
+                PROJECTIONS[name],
+                full=options['full'],
+                batch_size=options['batch_size'],
+                settle=settle,
+            )
+            self.stdout.write(self.style.SUCCESS(f'{name}: applied {applied} events'))
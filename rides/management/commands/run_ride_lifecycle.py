@@ -0,0 +1,25 @@
+# rides/management/commands/run_ride_lifecycle.py
+
+import time
+
+from django.core.management.base import BaseCommand
+from rides.lifecycle import complete_departed_rides
+
+class Command(BaseCommand):
+    help = 'Complete rides (and their confirmed bookings) once departure plus duration has passed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=int, default=300,
+                            help='Seconds between passes (default: %(default)s)')
+        parser.add_argument('--once', action='store_true',
+                            help='Run a single pass and exit, e.g. from cron')
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        while True:
+            completed = complete_departed_rides(chunk_size=options['chunk_size'])
+            if completed or options['once']:
+                self.stdout.write(self.style.SUCCESS(f'Completed {completed} ride(s)'))
+            if options['once']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,252 @@
+# rides/maptiles.py
+
+"""
+Clustered GeoJSON for the route map, served from a per-zoom tile cache.
+
+Points (active upcoming rides at their pickup, active cities) are grouped
+on a grid of CELL_PIXELS screen pixels at each zoom level: every cell with
+more than one point becomes a single cluster feature at the points'
+centroid. Cells are aligned to Web Mercator tiles, so each tile (layer,
+zoom, x, y) is clustered on its own and a map view is the concatenation of
+the tiles under it.
+
+Tiles are kept in MAP_TILE_CACHE as (etag, serialized features). They are
+built lazily, or in bulk by build_tiles() (the build_map_tiles command),
+and expire after MAP_TILE_TTL as a backstop for rides that depart. When a
+ride is created, saved, changes status or is geocoded, only the tiles
+containing its pickup, one per zoom level, are deleted; a change to the
+cities starts a new generation of the (small) cities layer. Invalidation
+only reaches other workers through a shared cache, so `check --deploy`
+rejects a per-process one (rides.checks).
+"""
+
+import hashlib
+import json
+import math
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from .models import City, Ride
+from .spatial import in_bbox
+
+TILE_SIZE = 256
+
+# Points closer than this on screen share a cluster
+CELL_PIXELS = 64
+
+# Deepest zoom with its own tiles; closer views use these
+MAX_ZOOM = 16
+
+# Web Mercator stops short of the poles
+MAX_LATITUDE = 85.05112878
+
+WORLD = (-MAX_LATITUDE, -180.0, MAX_LATITUDE, 180.0)
+
+
+def tile_cache():
+    return caches[settings.MAP_TILE_CACHE]
+
+
+# ===================================
+# TILE GEOMETRY
+# ===================================
+
+def project(latitude, longitude, zoom):
+    """World pixel coordinates of a point at a zoom level"""
+    scale = TILE_SIZE * 2 ** zoom
+    sine = math.sin(math.radians(max(-MAX_LATITUDE, min(MAX_LATITUDE, latitude))))
+    x = (longitude + 180) / 360 * scale
+    y = (0.5 - math.log((1 + sine) / (1 - sine)) / (4 * math.pi)) * scale
+    return x, y
+
+
+def unproject(x, y, zoom):
+    """(latitude, longitude) of world pixel coordinates"""
+    scale = TILE_SIZE * 2 ** zoom
+    longitude = x / scale * 360 - 180
+    latitude = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / scale))))
+    return latitude, longitude
+
+
+def tile_of(latitude, longitude, zoom):
+    x, y = project(latitude, longitude, zoom)
+    last = 2 ** zoom - 1
+    return min(int(x // TILE_SIZE), last), min(int(y // TILE_SIZE), last)
+
+
+def tile_bounds(zoom, x, y):
+    """(south, west, north, east) of a tile"""
+    north, west = unproject(x * TILE_SIZE, y * TILE_SIZE, zoom)
+    south, east = unproject((x + 1) * TILE_SIZE, (y + 1) * TILE_SIZE, zoom)
+    return south, west, north, east
+
+
+def tiles_covering(south, west, north, east, zoom):
+    """[(x, y)] of the tiles under a box"""
+    left, top = tile_of(north, west, zoom)
+    right, bottom = tile_of(south, east, zoom)
+    return [(x, y) for x in range(left, right + 1) for y in range(top, bottom + 1)]
+
+
+# ===================================
+# LAYERS
+# ===================================
+
+def ride_points(south, west, north, east):
+    """(latitude, longitude, properties) of active upcoming rides picking up in a box"""
+    rides = in_bbox(
+        Ride.objects.filter(status='ACTIVE', departs_at__gte=timezone.now()), Ride.PICKUP, south, west, north, east,
+    )
+    for ride_id, latitude, longitude, departs_at, pickup, dropoff, price in rides.order_by().values_list(
+        'id', 'pickup_latitude', 'pickup_longitude', 'departs_at', 'pickup_city__name', 'dropoff_city__name',
+        'price_per_seat',
+    ):
+        yield float(latitude), float(longitude), {
+            'id': ride_id, 'departs_at': departs_at.isoformat(), 'pickup_city': pickup, 'dropoff_city': dropoff,
+            'price_per_seat': str(price),
+        }
+
+
+def city_points(south, west, north, east):
+    """(latitude, longitude, properties) of active cities in a box"""
+    cities = in_bbox(City.objects.filter(is_active=True), City.LOCATION, south, west, north, east)
+    for city_id, name, latitude, longitude in cities.order_by().values_list('id', 'name', 'latitude', 'longitude'):
+        yield float(latitude), float(longitude), {'id': city_id, 'name': name}
+
+
+LAYERS = {
+    'rides': ride_points,
+    'cities': city_points,
+}
+
+
+# ===================================
+# CLUSTERING
+# ===================================
+
+def feature(latitude, longitude, properties):
+    return {
+        'type': 'Feature',
+        'geometry': {'type': 'Point', 'coordinates': [round(longitude, 6), round(latitude, 6)]},
+        'properties': properties,
+    }
+
+
+def cluster(layer, points, zoom):
+    """
+    Features for points on the CELL_PIXELS grid at a zoom level: a point
+    alone in its cell as itself, several as one cluster with their count.
+    """
+    cells = defaultdict(list)
+    for latitude, longitude, properties in points:
+        x, y = project(latitude, longitude, zoom)
+        cells[int(x // CELL_PIXELS), int(y // CELL_PIXELS)].append((latitude, longitude, properties))
+
+    features = []
+    for key in sorted(cells):
+        members = cells[key]
+        if len(members) == 1:
+            latitude, longitude, properties = members[0]
+            features.append(feature(latitude, longitude, {'layer': layer, **properties}))
+            continue
+        latitude = sum(member[0] for member in members) / len(members)
+        longitude = sum(member[1] for member in members) / len(members)
+        features.append(feature(latitude, longitude, {'layer': layer, 'cluster': True, 'count': len(members)}))
+    return features
+
+
+def serialize(features):
+    """(etag, features as a JSON array body without brackets)"""
+    body = ','.join(json.dumps(item, separators=(',', ':')) for item in features)
+    return hashlib.md5(body.encode(), usedforsecurity=False).hexdigest(), body
+
+
+# ===================================
+# TILE CACHE
+# ===================================
+
+def generation(layer):
+    """The layer's current cache generation; a new one orphans every cached tile of the layer"""
+    cache = tile_cache()
+    key = f'map-tiles:generation:{layer}'
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, uuid.uuid4().hex[:8], None)
+        value = cache.get(key)
+    return value
+
+
+def tile_key(layer, layer_generation, zoom, x, y):
+    return f'map-tiles:{layer}:{layer_generation}:{zoom}:{x}:{y}'
+
+
+def build_tiles_in(layer, zoom, tiles):
+    """{(x, y): (etag, body)} for tiles of a layer, reading the points under them in one query"""
+    xs, ys = [x for x, _ in tiles], [y for _, y in tiles]
+    south, west, _, _ = tile_bounds(zoom, min(xs), max(ys))
+    _, _, north, east = tile_bounds(zoom, max(xs), min(ys))
+    by_tile = defaultdict(list)
+    for point in LAYERS[layer](south, west, north, east):
+        by_tile[tile_of(point[0], point[1], zoom)].append(point)
+    return {tile: serialize(cluster(layer, by_tile[tile], zoom)) for tile in tiles}
+
+
+def get_tiles(layer, zoom, tiles):
+    """[(etag, body)] for tiles [(x, y)] of a layer: cached ones in one read, the rest built and stored"""
+    cache = tile_cache()
+    layer_generation = generation(layer)
+    keys = {tile: tile_key(layer, layer_generation, zoom, *tile) for tile in tiles}
+    found = cache.get_many(keys.values())
+    missing = [tile for tile, key in keys.items() if key not in found]
+    if missing:
+        built = {keys[tile]: value for tile, value in build_tiles_in(layer, zoom, missing).items()}
+        cache.set_many(built, settings.MAP_TILE_TTL)
+        found.update(built)
+    return [found[keys[tile]] for tile in tiles]
+
+
+def build_tiles(layers=tuple(LAYERS), zooms=range(MAX_ZOOM + 1)):
+    """
+    Precompute every non-empty tile of the layers at the zoom levels, reading
+    each layer's points once; returns the number of tiles stored.
+    """
+    cache = tile_cache()
+    stored = 0
+    for layer in layers:
+        points = list(LAYERS[layer](*WORLD))
+        layer_generation = generation(layer)
+        for zoom in zooms:
+            by_tile = defaultdict(list)
+            for point in points:
+                by_tile[tile_of(point[0], point[1], zoom)].append(point)
+            cache.set_many({
+                tile_key(layer, layer_generation, zoom, *tile): serialize(cluster(layer, members, zoom))
+                for tile, members in by_tile.items()
+            }, settings.MAP_TILE_TTL)
+            stored += len(by_tile)
+    return stored
+
+
+def invalidate_points(layer, points):
+    """Drop the tiles containing any of the (latitude, longitude) points, at every zoom level"""
+    layer_generation = generation(layer)
+    tile_cache().delete_many({
+        tile_key(layer, layer_generation, zoom, *tile_of(float(latitude), float(longitude), zoom))
+        for latitude, longitude in points for zoom in range(MAX_ZOOM + 1)
+    })
+
+
+def invalidate_rides(ride_ids):
+    """Drop the tiles showing these rides' pickups"""
+    points = Ride.objects.filter(id__in=ride_ids, pickup_latitude__isnull=False).values_list(
+        'pickup_latitude', 'pickup_longitude',
+    )
+    invalidate_points('rides', set(points))
+
+
+def invalidate_layer(layer):
+    tile_cache().set(f'map-tiles:generation:{layer}', uuid.uuid4().hex[:8], None)
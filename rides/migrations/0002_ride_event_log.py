@@ -0,0 +1,82 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('rides', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DriverStats',
+            fields=[
+                ('driver', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='driver_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('rides_offered', models.IntegerField(default=0)),
+                ('rides_completed', models.IntegerField(default=0)),
+                ('rides_cancelled', models.IntegerField(default=0)),
+                ('bookings_confirmed', models.IntegerField(default=0)),
+                ('seats_sold', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Driver stats',
+            },
+        ),
+        migrations.CreateModel(
+            name='ProjectionCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_event_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RideSeatCounter',
+            fields=[
+                ('ride', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='seat_counter', serialize=False, to='rides.ride')),
+                ('seats_pending', models.IntegerField(default=0)),
+                ('seats_confirmed', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TravellerHistory',
+            fields=[
+                ('traveller', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='traveller_history', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('bookings_made', models.IntegerField(default=0)),
+                ('bookings_confirmed', models.IntegerField(default=0)),
+                ('bookings_cancelled', models.IntegerField(default=0)),
+                ('trips_completed', models.IntegerField(default=0)),
+                ('seats_travelled', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Traveller histories',
+            },
+        ),
+        migrations.CreateModel(
+            name='RideEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_type', models.CharField(choices=[('RIDE_CREATED', 'Ride created'), ('RIDE_STATUS', 'Ride status changed'), ('BOOKING_CREATED', 'Booking created'), ('BOOKING_STATUS', 'Booking status changed')], max_length=20)),
+                ('from_status', models.CharField(blank=True, max_length=20)),
+                ('to_status', models.CharField(blank=True, max_length=20)),
+                ('seats', models.IntegerField(default=0)),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('booking', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='events', to='rides.booking')),
+                ('driver', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('ride', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='rides.ride')),
+                ('traveller', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['ride', 'id'], name='rides_ridee_ride_id_52a37d_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rides', '0002_ride_event_log'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ride',
+            index=models.Index(fields=['status', 'departure_date'], name='ride_status_departure_idx'),
+        ),
+    ]
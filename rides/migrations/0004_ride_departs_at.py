@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:11
+
+from datetime import datetime
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+BATCH_SIZE = 1000
+
+
+def backfill_departs_at(apps, schema_editor):
+    """Fill departs_at from departure_date/departure_time in primary-key batches"""
+    Ride = apps.get_model('rides', 'Ride')
+    last_id = 0
+    while True:
+        batch = list(
+            Ride.objects.filter(id__gt=last_id, departs_at__isnull=True)
+            .order_by('id')
+            .only('id', 'departure_date', 'departure_time')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        for ride in batch:
+            ride.departs_at = timezone.make_aware(datetime.combine(ride.departure_date, ride.departure_time))
+        Ride.objects.bulk_update(batch, ['departs_at'])
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    # Let each backfill batch commit on its own instead of one long transaction
+    atomic = False
+
+    dependencies = [
+        ('rides', '0003_ride_status_departure_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='ride',
+            name='ride_status_departure_idx',
+        ),
+        migrations.AddField(
+            model_name='ride',
+            name='departs_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_departs_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='ride',
+            index=models.Index(fields=['status', 'departs_at'], name='ride_status_departs_at_idx'),
+        ),
+    ]
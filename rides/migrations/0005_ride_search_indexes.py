@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rides', '0004_ride_departs_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ride',
+            index=models.Index(fields=['pickup_city', 'dropoff_city', 'status', 'departs_at'], include=('price_per_seat', 'departure_time', 'available_seats', 'driver'), name='ride_search_covering_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ridereview',
+            index=models.Index(fields=['reviewee', 'reviewer_type', 'rating'], name='review_reviewee_rating_idx'),
+        ),
+    ]
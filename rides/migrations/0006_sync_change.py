@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def backfill_sync_changes(apps, schema_editor):
+    """
+    Seed one change per existing ride, booking and review for everyone who
+    sees it, so a client's first sync (from token 0) returns its full state
+    """
+    Ride = apps.get_model('rides', 'Ride')
+    Booking = apps.get_model('rides', 'Booking')
+    RideReview = apps.get_model('rides', 'RideReview')
+    SyncChange = apps.get_model('rides', 'SyncChange')
+
+    sources = [
+        (Ride.objects.values_list('id', 'driver_id'), lambda row: [(row[1], 'RIDE', row[0])]),
+        (Booking.objects.values_list('id', 'traveller_id', 'ride_id', 'ride__driver_id'), lambda row: [
+            (row[1], 'BOOKING', row[0]), (row[3], 'BOOKING', row[0]), (row[1], 'RIDE', row[2]),
+        ]),
+        (RideReview.objects.values_list('id', 'reviewer_id', 'reviewee_id'), lambda row: [
+            (row[1], 'REVIEW', row[0]), (row[2], 'REVIEW', row[0]),
+        ]),
+    ]
+    for rows, changes in sources:
+        last_id = 0
+        while True:
+            batch = list(rows.filter(id__gt=last_id).order_by('id')[:BATCH_SIZE])
+            if not batch:
+                break
+            SyncChange.objects.bulk_create([
+                SyncChange(user_id=user_id, kind=kind, object_id=object_id)
+                for row in batch
+                for user_id, kind, object_id in dict.fromkeys(changes(row))
+            ])
+            last_id = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rides', '0005_ride_search_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('RIDE', 'Ride'), ('BOOKING', 'Booking'), ('REVIEW', 'Review')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['user', 'id'], name='sync_change_user_id_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_sync_changes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rides', '0006_sync_change'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RideSeries',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekdays', models.JSONField(default=list)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('departure_time', models.TimeField()),
+                ('status', models.CharField(choices=[('ACTIVE', 'Active'), ('CANCELLED', 'Cancelled')], default='ACTIVE', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('driver', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ride_series', to=settings.AUTH_USER_MODEL)),
+                ('route', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='series', to='rides.route')),
+            ],
+            options={
+                'verbose_name_plural': 'Ride series',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='ride',
+            name='series',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='rides', to='rides.rideseries'),
+        ),
+        migrations.AddIndex(
+            model_name='ride',
+            index=models.Index(fields=['driver', 'departs_at'], name='ride_driver_departs_at_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:19
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rides', '0007_ride_series'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeocodedAddress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('address', models.CharField(max_length=400, unique=True)),
+                ('latitude', models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True)),
+                ('longitude', models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True)),
+                ('provider', models.CharField(blank=True, max_length=20)),
+                ('geocoded_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name_plural': 'Geocoded addresses',
+            },
+        ),
+        migrations.AddField(
+            model_name='ride',
+            name='dropoff_latitude',
+            field=models.DecimalField(blank=True, decimal_places=6, editable=False, max_digits=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='ride',
+            name='dropoff_longitude',
+            field=models.DecimalField(blank=True, decimal_places=6, editable=False, max_digits=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='ride',
+            name='pickup_latitude',
+            field=models.DecimalField(blank=True, decimal_places=6, editable=False, max_digits=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='ride',
+            name='pickup_longitude',
+            field=models.DecimalField(blank=True, decimal_places=6, editable=False, max_digits=9, null=True),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+from rides.geo import encode_or_blank
+
+BATCH_SIZE = 1000
+
+
+def backfill_geohashes(apps, schema_editor):
+    """Geohash the rides geocoded so far, in primary-key batches"""
+    Ride = apps.get_model('rides', 'Ride')
+    last_id = 0
+    while True:
+        batch = list(
+            Ride.objects.filter(id__gt=last_id, pickup_latitude__isnull=False)
+            .order_by('id')
+            .only('id', 'pickup_latitude', 'pickup_longitude', 'dropoff_latitude', 'dropoff_longitude')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        for ride in batch:
+            ride.pickup_geohash = encode_or_blank(ride.pickup_latitude, ride.pickup_longitude)
+            ride.dropoff_geohash = encode_or_blank(ride.dropoff_latitude, ride.dropoff_longitude)
+        Ride.objects.bulk_update(batch, ['pickup_geohash', 'dropoff_geohash'])
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    # Let each backfill batch commit on its own instead of one long transaction
+    atomic = False
+
+    dependencies = [
+        ('rides', '0008_ride_coordinates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ride',
+            name='dropoff_geohash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=9),
+        ),
+        migrations.AddField(
+            model_name='ride',
+            name='pickup_geohash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=9),
+        ),
+        migrations.RunPython(backfill_geohashes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='ride',
+            index=models.Index(fields=['pickup_geohash', 'departs_at'], name='ride_pickup_geohash_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ride',
+            index=models.Index(fields=['dropoff_geohash', 'departs_at'], name='ride_dropoff_geohash_idx'),
+        ),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+from rides.geo import GeoColumns
+
+BATCH_SIZE = 1000
+
+
+def backfill(model, columns):
+    """Set the geohash columns of rows with coordinates, in primary-key batches"""
+    last_id = 0
+    while True:
+        batch = list(
+            model.objects.filter(id__gt=last_id, **{f'{columns.latitude}__isnull': False})
+            .order_by('id')
+            .only('id', *columns.coordinate_fields)[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        for row in batch:
+            columns.update(row)
+        model.objects.bulk_update(batch, list(columns.geohash_fields))
+        last_id = batch[-1].id
+
+
+def backfill_geohashes(apps, schema_editor):
+    backfill(apps.get_model('rides', 'City'), GeoColumns.named())
+    backfill(apps.get_model('rides', 'Ride'), GeoColumns.named('pickup_'))
+
+
+class Migration(migrations.Migration):
+
+    # Let each backfill batch commit on its own instead of one long transaction
+    atomic = False
+
+    dependencies = [
+        ('rides', '0009_ride_geohash'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='city',
+            name='geohash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=9),
+        ),
+        migrations.AddField(
+            model_name='city',
+            name='geohash_4',
+            field=models.CharField(blank=True, default='', editable=False, max_length=4),
+        ),
+        migrations.AddField(
+            model_name='city',
+            name='geohash_6',
+            field=models.CharField(blank=True, default='', editable=False, max_length=6),
+        ),
+        migrations.AddField(
+            model_name='ride',
+            name='pickup_geohash_4',
+            field=models.CharField(blank=True, default='', editable=False, max_length=4),
+        ),
+        migrations.AddField(
+            model_name='ride',
+            name='pickup_geohash_6',
+            field=models.CharField(blank=True, default='', editable=False, max_length=6),
+        ),
+        migrations.RunPython(backfill_geohashes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='city',
+            index=models.Index(fields=['geohash'], name='city_geohash_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='city',
+            index=models.Index(fields=['geohash_4'], name='city_geohash_4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='city',
+            index=models.Index(fields=['geohash_6'], name='city_geohash_6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ride',
+            index=models.Index(fields=['pickup_geohash_4', 'departs_at'], name='ride_pickup_geohash_4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ride',
+            index=models.Index(fields=['pickup_geohash_6', 'departs_at'], name='ride_pickup_geohash_6_idx'),
+        ),
+    ]
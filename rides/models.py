@@ -1,11 +1,17 @@
 # rides/models.py
 
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_time
+from datetime import datetime
 import json
 
+from .geo import GeoColumns
+
 User = get_user_model()
 
 class City(models.Model):
@@ -17,14 +23,33 @@ class City(models.Model):
     country = models.CharField(max_length=50, default='Canada')
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    # Geohash of the coordinates at full and coarse precisions (rides.geo), kept in sync by save()
+    geohash = models.CharField(max_length=9, blank=True, default='', editable=False)
+    geohash_4 = models.CharField(max_length=4, blank=True, default='', editable=False)
+    geohash_6 = models.CharField(max_length=6, blank=True, default='', editable=False)
     is_active = models.BooleanField(default=True)
     
+    LOCATION = GeoColumns.named()
+    
     class Meta:
         verbose_name_plural = "Cities"
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['geohash'], name='city_geohash_idx'),
+            models.Index(fields=['geohash_4'], name='city_geohash_4_idx'),
+            models.Index(fields=['geohash_6'], name='city_geohash_6_idx'),
+        ]
     
     def __str__(self):
         return f"{self.name}, {self.province}"
+    
+    def save(self, *args, **kwargs):
+        self.LOCATION.update(self)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and set(self.LOCATION.coordinate_fields) & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | set(self.LOCATION.geohash_fields)
+        super().save(*args, **kwargs)
+        transaction.on_commit(_invalidate_map_cities)
 
 class Route(models.Model):
     """
@@ -60,7 +85,67 @@ class Route(models.Model):
             if self.driver_price > max_price:
                 raise ValidationError(f"Driver price cannot exceed 3x suggested price (${max_price})")
 
-class Ride(models.Model):
+def combine_departure(departure_date, departure_time):
+    """Aware departure timestamp (TIME_ZONE, i.e. America/Toronto) for a local date and time"""
+    if isinstance(departure_date, str):
+        departure_date = parse_date(departure_date)
+    if isinstance(departure_time, str):
+        departure_time = parse_time(departure_time)
+    if departure_date is None or departure_time is None:
+        return None
+    return timezone.make_aware(datetime.combine(departure_date, departure_time))
+
+class StatusTrackingMixin:
+    """
+    Remembers the status a row was loaded with so save() can log transitions
+    """
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+
+class RideSeries(models.Model):
+    """
+    A recurring ride: the same trip on chosen weekdays over a date range.
+    Its rides are ordinary Ride rows created together (see rides.series).
+    """
+    SERIES_STATUS_CHOICES = [
+        ('ACTIVE', 'Active'),
+        ('CANCELLED', 'Cancelled'),
+    ]
+    
+    WEEKDAY_CHOICES = [
+        (0, 'Monday'),
+        (1, 'Tuesday'),
+        (2, 'Wednesday'),
+        (3, 'Thursday'),
+        (4, 'Friday'),
+        (5, 'Saturday'),
+        (6, 'Sunday'),
+    ]
+    
+    driver = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ride_series')
+    route = models.ForeignKey(Route, on_delete=models.CASCADE, related_name='series')
+    
+    # Pattern
+    weekdays = models.JSONField(default=list)  # date.weekday() numbers, Monday = 0
+    start_date = models.DateField()
+    end_date = models.DateField()
+    departure_time = models.TimeField()
+    
+    status = models.CharField(max_length=20, choices=SERIES_STATUS_CHOICES, default='ACTIVE')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name_plural = "Ride series"
+    
+    def __str__(self):
+        days = ', '.join(dict(self.WEEKDAY_CHOICES)[day][:3] for day in self.weekdays)
+        return f"{self.route.origin_city} → {self.route.destination_city} on {days} at {self.departure_time}"
+
+class Ride(StatusTrackingMixin, models.Model):
     """
     Represents an actual ride offering by a driver
     """
@@ -73,10 +158,13 @@ class Ride(models.Model):
     
     route = models.ForeignKey(Route, on_delete=models.CASCADE, related_name='rides')
     driver = models.ForeignKey(User, on_delete=models.CASCADE, related_name='offered_rides')
+    series = models.ForeignKey(RideSeries, on_delete=models.SET_NULL, null=True, blank=True, related_name='rides')
     
     # Ride details
     departure_date = models.DateField()
     departure_time = models.TimeField()
+    # departure_date + departure_time as one indexed instant, kept in sync by save()
+    departs_at = models.DateTimeField(null=True, blank=True, editable=False)
     available_seats = models.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(8)])
     
     # Pickup and drop-off details
@@ -85,6 +173,18 @@ class Ride(models.Model):
     dropoff_location = models.CharField(max_length=255)  # Specific address
     dropoff_city = models.ForeignKey(City, on_delete=models.CASCADE, related_name='dropoff_rides')
     
+    # Geocoded pickup/drop-off addresses, filled in by the rides.geocode_ride_addresses job
+    pickup_latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True, editable=False)
+    pickup_longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True, editable=False)
+    dropoff_latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True, editable=False)
+    dropoff_longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True, editable=False)
+    # Geohashes of those coordinates (rides.geo), kept in sync by save(); '' until geocoded.
+    # Only the pickup, which searches start from, has coarse copies.
+    pickup_geohash = models.CharField(max_length=9, blank=True, default='', editable=False)
+    pickup_geohash_4 = models.CharField(max_length=4, blank=True, default='', editable=False)
+    pickup_geohash_6 = models.CharField(max_length=6, blank=True, default='', editable=False)
+    dropoff_geohash = models.CharField(max_length=9, blank=True, default='', editable=False)
+    
     # Additional info
     notes = models.TextField(blank=True, null=True)
     price_per_seat = models.DecimalField(max_digits=8, decimal_places=2)
@@ -94,12 +194,94 @@ class Ride(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    PICKUP = GeoColumns.named('pickup_')
+    DROPOFF = GeoColumns.named('dropoff_', levels=())
+    COORDINATE_FIELDS = (*PICKUP.coordinate_fields, *DROPOFF.coordinate_fields)
+    GEOHASH_FIELDS = (*PICKUP.geohash_fields, *DROPOFF.geohash_fields)
+    # Fields the coordinates are geocoded from (rides.addresses)
+    ADDRESS_FIELDS = ('pickup_location', 'pickup_city', 'dropoff_location', 'dropoff_city')
+    
     class Meta:
         ordering = ['departure_date', 'departure_time']
+        indexes = [
+            models.Index(fields=['status', 'departs_at'], name='ride_status_departs_at_idx'),
+            # A driver's rides around a time, for overlap checks
+            models.Index(fields=['driver', 'departs_at'], name='ride_driver_departs_at_idx'),
+            # Covers search_rides filtering and sorting without visiting the table (PostgreSQL)
+            models.Index(
+                fields=['pickup_city', 'dropoff_city', 'status', 'departs_at'],
+                include=['price_per_seat', 'departure_time', 'available_seats', 'driver'],
+                name='ride_search_covering_idx',
+            ),
+            # Radius search: geohash cell range scans, then the departure window (rides.nearby)
+            models.Index(fields=['pickup_geohash', 'departs_at'], name='ride_pickup_geohash_idx'),
+            models.Index(fields=['pickup_geohash_4', 'departs_at'], name='ride_pickup_geohash_4_idx'),
+            models.Index(fields=['pickup_geohash_6', 'departs_at'], name='ride_pickup_geohash_6_idx'),
+            models.Index(fields=['dropoff_geohash', 'departs_at'], name='ride_dropoff_geohash_idx'),
+        ]
     
     def __str__(self):
         return f"{self.pickup_city} → {self.dropoff_city} on {self.departure_date}"
     
+    def save(self, *args, **kwargs):
+        """
+        Save the ride and log creation/status changes in the same transaction;
+        a changed pickup or drop-off address is queued to be geocoded again
+        """
+        self.departs_at = combine_departure(self.departure_date, self.departure_time)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'departure_date', 'departure_time'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'departs_at'}
+        self.set_geohashes()
+        if update_fields is not None and set(self.COORDINATE_FIELDS) & set(update_fields):
+            kwargs['update_fields'] = set(kwargs['update_fields']) | set(self.GEOHASH_FIELDS)
+        
+        with transaction.atomic():
+            adding = self._state.adding
+            super().save(*args, **kwargs)
+            
+            if adding:
+                RideEvent.objects.record('RIDE_CREATED', ride=self, to_status=self.status)
+            elif self.status != getattr(self, '_loaded_status', self.status):
+                RideEvent.objects.record(
+                    'RIDE_STATUS', ride=self,
+                    from_status=self._loaded_status, to_status=self.status
+                )
+            else:
+                SyncChange.objects.for_rides([self.pk])
+            if not adding:
+                _invalidate_map_ride(self)
+                if self.address != getattr(self, '_loaded_address', self.address):
+                    queue_geocoding([self.pk])
+            self._loaded_status = self.status
+            self._loaded_pickup = self.pickup_point
+            self._loaded_address = self.address
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_pickup = instance.pickup_point
+        instance._loaded_address = instance.address
+        return instance
+    
+    @property
+    def address(self):
+        """Values of ADDRESS_FIELDS as held by this instance (None where deferred)"""
+        return tuple(self.__dict__.get(self._meta.get_field(name).attname) for name in self.ADDRESS_FIELDS)
+    
+    @property
+    def pickup_point(self):
+        """(latitude, longitude) of the pickup, or None before it is geocoded"""
+        latitude, longitude = self.__dict__.get('pickup_latitude'), self.__dict__.get('pickup_longitude')
+        if latitude is None or longitude is None:
+            return None
+        return latitude, longitude
+    
+    def set_geohashes(self):
+        """Recompute the pickup and drop-off geohash fields from the coordinates"""
+        self.PICKUP.update(self)
+        self.DROPOFF.update(self)
+    
     @property
     def is_full(self):
         """Check if ride is full based on confirmed bookings"""
@@ -118,7 +300,7 @@ class Ride(models.Model):
         )['total'] or 0
         return self.available_seats - total_booked_seats
 
-class Booking(models.Model):
+class Booking(StatusTrackingMixin, models.Model):
     """
     Represents a booking made by a traveller for a specific ride
     """
@@ -157,16 +339,33 @@ class Booking(models.Model):
         return f"{self.traveller.username} → {self.ride} ({self.status})"
     
     def save(self, *args, **kwargs):
-        """Auto-calculate total price and update ride status"""
+        """Auto-calculate total price, log the transition and update ride status"""
         if not self.total_price:
             self.total_price = self.ride.price_per_seat * self.seats_booked
         
-        super().save(*args, **kwargs)
-        
-        # Update ride status if full
-        if self.ride.is_full and self.ride.status == 'ACTIVE':
-            self.ride.status = 'FULL'
-            self.ride.save()
+        with transaction.atomic():
+            adding = self._state.adding
+            super().save(*args, **kwargs)
+            
+            if adding:
+                RideEvent.objects.record(
+                    'BOOKING_CREATED', ride=self.ride, booking=self,
+                    to_status=self.status, seats=self.seats_booked
+                )
+            elif self.status != getattr(self, '_loaded_status', self.status):
+                RideEvent.objects.record(
+                    'BOOKING_STATUS', ride=self.ride, booking=self,
+                    from_status=self._loaded_status, to_status=self.status,
+                    seats=self.seats_booked
+                )
+            else:
+                SyncChange.objects.for_bookings([(self.pk, self.traveller_id, self.ride.driver_id)])
+            self._loaded_status = self.status
+            
+            # Update ride status if full
+            if self.ride.is_full and self.ride.status == 'ACTIVE':
+                self.ride.status = 'FULL'
+                self.ride.save()
 
 class RideReview(models.Model):
     """
@@ -192,6 +391,348 @@ class RideReview(models.Model):
     class Meta:
         ordering = ['-created_at']
         unique_together = ['ride', 'reviewer', 'reviewee']  # Prevent duplicate reviews
+        indexes = [
+            # Driver rating averages in search read only this index
+            models.Index(fields=['reviewee', 'reviewer_type', 'rating'], name='review_reviewee_rating_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.reviewer.username} → {self.reviewee.username} ({self.rating}/5)"
+    
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            SyncChange.objects.bulk_create([
+                SyncChange(user_id=user_id, kind='REVIEW', object_id=self.pk)
+                for user_id in {self.reviewer_id, self.reviewee_id}
+            ])
+
+def _wake_live_feed():
+    # Imported lazily: rides.live imports these models
+    from .live import hub
+    hub.wake()
+
+def _invalidate_map_cities():
+    from .maptiles import invalidate_layer
+    invalidate_layer('cities')
+
+# Ride events that change what the route map shows (rides.maptiles)
+MAP_EVENTS = ('RIDE_CREATED', 'RIDE_STATUS')
+
+def _invalidate_map_tiles(events):
+    """After commit, drop the map tiles showing rides created or changing status in these events"""
+    ride_ids = [event.ride_id for event in events if event.event_type in MAP_EVENTS]
+    if ride_ids:
+        from .maptiles import invalidate_rides
+        transaction.on_commit(lambda: invalidate_rides(ride_ids))
+
+def _invalidate_map_ride(ride):
+    """
+    After commit, drop the map tiles showing a saved ride (its price, time or
+    pickup may have changed), at the pickup it was loaded with and its new one
+    """
+    points = {point for point in (getattr(ride, '_loaded_pickup', None), ride.pickup_point) if point}
+    if points:
+        from .maptiles import invalidate_points
+        transaction.on_commit(lambda: invalidate_points('rides', points))
+
+# Rides per geocoding job, so a rate-limited provider finishes a job in minutes
+GEOCODE_JOB_SIZE = 50
+
+def queue_geocoding(ride_ids):
+    """Queue rides.geocode_ride_addresses jobs for rides whose addresses are new or changed"""
+    from jobs.queue import enqueue
+    ride_ids = list(ride_ids)
+    for start in range(0, len(ride_ids), GEOCODE_JOB_SIZE):
+        enqueue('rides.geocode_ride_addresses', {'ride_ids': ride_ids[start:start + GEOCODE_JOB_SIZE]})
+
+def _geocode_new_rides(events):
+    """Queue geocoding of the addresses of rides whose RIDE_CREATED events these are"""
+    ride_ids = [event.ride_id for event in events if event.event_type == 'RIDE_CREATED']
+    if ride_ids:
+        queue_geocoding(ride_ids)
+
+class RideEventQuerySet(models.QuerySet):
+    """
+    Events are append-only: rows can be inserted but never changed or removed
+    """
+    def bulk_create(self, objs, *args, **kwargs):
+        created = super().bulk_create(objs, *args, **kwargs)
+        SyncChange.objects.for_events(created)
+        _geocode_new_rides(created)
+        _invalidate_map_tiles(created)
+        transaction.on_commit(_wake_live_feed)
+        return created
+    
+    def update(self, **kwargs):
+        raise TypeError("Ride events are append-only and cannot be updated")
+    
+    def delete(self):
+        raise TypeError("Ride events are append-only and cannot be deleted")
+
+class RideEventManager(models.Manager.from_queryset(RideEventQuerySet)):
+    def build(self, event_type, ride_id, driver_id, booking_id=None, traveller_id=None,
+              from_status='', to_status='', seats=0, **payload):
+        """Unsaved event, for callers that bulk_create many at once"""
+        return self.model(
+            event_type=event_type,
+            ride_id=ride_id,
+            driver_id=driver_id,
+            booking_id=booking_id,
+            traveller_id=traveller_id,
+            from_status=from_status or '',
+            to_status=to_status or '',
+            seats=seats,
+            payload=payload,
+        )
+    
+    def record(self, event_type, ride, booking=None, from_status='', to_status='', seats=0, **payload):
+        """Append one event; call inside the transaction that made the change"""
+        event = self.build(
+            event_type, ride.pk, ride.driver_id,
+            booking_id=booking.pk if booking else None,
+            traveller_id=booking.traveller_id if booking else None,
+            from_status=from_status, to_status=to_status, seats=seats, **payload
+        )
+        event.save(force_insert=True)
+        SyncChange.objects.for_events([event])
+        _geocode_new_rides([event])
+        _invalidate_map_tiles([event])
+        transaction.on_commit(_wake_live_feed)
+        return event
+
+class RideEvent(models.Model):
+    """
+    Append-only log of ride and booking transitions.
+    Projections (seat counters, driver stats, traveller history) are rebuilt from it.
+    """
+    EVENT_TYPE_CHOICES = [
+        ('RIDE_CREATED', 'Ride created'),
+        ('RIDE_STATUS', 'Ride status changed'),
+        ('BOOKING_CREATED', 'Booking created'),
+        ('BOOKING_STATUS', 'Booking status changed'),
+    ]
+    
+    event_type = models.CharField(max_length=20, choices=EVENT_TYPE_CHOICES)
+    ride = models.ForeignKey(Ride, on_delete=models.CASCADE, related_name='events')
+    booking = models.ForeignKey(Booking, on_delete=models.SET_NULL, null=True, blank=True, related_name='events')
+    
+    # Denormalized so projections can stream the log without joins
+    driver = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    traveller = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    
+    from_status = models.CharField(max_length=20, blank=True)
+    to_status = models.CharField(max_length=20, blank=True)
+    seats = models.IntegerField(default=0)
+    payload = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    objects = RideEventManager()
+    
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['ride', 'id']),
+        ]
+    
+    def __str__(self):
+        return f"#{self.pk} {self.event_type} ride={self.ride_id} {self.from_status}→{self.to_status}"
+    
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise TypeError("Ride events are append-only and cannot be updated")
+        super().save(*args, **kwargs)
+    
+    def delete(self, *args, **kwargs):
+        raise TypeError("Ride events are append-only and cannot be deleted")
+
+# ===================================
+# SYNC FEED (per-user change log for mobile clients)
+# ===================================
+
+class SyncChangeManager(models.Manager):
+    def for_events(self, events):
+        """
+        Log the rides and bookings touched by ride events for everyone who sees them.
+
+        A booking change reaches its traveller and the driver; a ride status
+        change also reaches every traveller with a booking on the ride.
+        """
+        changes = []
+        status_rides = set()
+        for event in events:
+            changes.append((event.driver_id, 'RIDE', event.ride_id))
+            if event.booking_id:
+                changes.extend([
+                    (event.driver_id, 'BOOKING', event.booking_id),
+                    (event.traveller_id, 'BOOKING', event.booking_id),
+                    (event.traveller_id, 'RIDE', event.ride_id),
+                ])
+            elif event.event_type == 'RIDE_STATUS':
+                status_rides.add(event.ride_id)
+        if status_rides:
+            changes.extend(
+                (traveller_id, 'RIDE', ride_id)
+                for ride_id, traveller_id in Booking.objects.filter(
+                    ride_id__in=status_rides
+                ).values_list('ride_id', 'traveller_id')
+            )
+        return self._log(changes)
+    
+    def for_rides(self, ride_ids):
+        """Log edits to rides that did not go through a ride event"""
+        changes = list(
+            (driver_id, 'RIDE', ride_id)
+            for ride_id, driver_id in Ride.objects.filter(id__in=ride_ids).values_list('id', 'driver_id')
+        )
+        changes.extend(
+            (traveller_id, 'RIDE', ride_id)
+            for ride_id, traveller_id in Booking.objects.filter(
+                ride_id__in=ride_ids
+            ).values_list('ride_id', 'traveller_id')
+        )
+        return self._log(changes)
+    
+    def for_bookings(self, bookings):
+        """Log edits to (booking id, traveller id, driver id) that did not go through a ride event"""
+        return self._log(
+            (user_id, 'BOOKING', booking_id)
+            for booking_id, traveller_id, driver_id in bookings
+            for user_id in (traveller_id, driver_id)
+        )
+    
+    def _log(self, changes):
+        return self.bulk_create([
+            SyncChange(user_id=user_id, kind=kind, object_id=object_id)
+            for user_id, kind, object_id in dict.fromkeys(changes)
+        ])
+
+class SyncChange(models.Model):
+    """
+    One row per (user, object) change, in commit order of the id sequence.
+    A client's sync token is the last id it has seen; the next sync is a
+    range scan of the (user, id) index.
+    """
+    KIND_CHOICES = [
+        ('RIDE', 'Ride'),
+        ('BOOKING', 'Booking'),
+        ('REVIEW', 'Review'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    objects = SyncChangeManager()
+    
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['user', 'id'], name='sync_change_user_id_idx'),
+        ]
+    
+    def __str__(self):
+        return f"#{self.pk} {self.kind} {self.object_id} for user {self.user_id}"
+
+# Deletes are logged from pre_delete, which runs inside the delete's
+# transaction while the rows a change is addressed by (a ride's bookings,
+# a booking's ride) still exist. The sync feed lists the ids under `deleted`.
+
+@receiver(pre_delete, sender='rides.Ride')
+def _log_ride_deleted(sender, instance, **kwargs):
+    SyncChange.objects.for_rides([instance.pk])
+
+@receiver(pre_delete, sender='rides.Booking')
+def _log_booking_deleted(sender, instance, **kwargs):
+    driver_id = Ride.objects.filter(id=instance.ride_id).values_list('driver_id', flat=True).first()
+    SyncChange.objects.for_bookings([(instance.pk, instance.traveller_id, driver_id)])
+
+@receiver(pre_delete, sender='rides.RideReview')
+def _log_review_deleted(sender, instance, **kwargs):
+    SyncChange.objects.bulk_create([
+        SyncChange(user_id=user_id, kind='REVIEW', object_id=instance.pk)
+        for user_id in {instance.reviewer_id, instance.reviewee_id}
+    ])
+
+# ===================================
+# GEOCODING
+# ===================================
+
+class GeocodedAddress(models.Model):
+    """
+    Server-side geocode cache: a normalized address (see rides.addresses) and
+    where it is. Rows are written by the geocoding job; null coordinates
+    with geocoded_at set mean the address could not be located.
+    """
+    address = models.CharField(max_length=400, unique=True)
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    provider = models.CharField(max_length=20, blank=True)
+    geocoded_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        verbose_name_plural = "Geocoded addresses"
+    
+    def __str__(self):
+        return self.address
+
+# ===================================
+# PROJECTIONS (rebuilt from RideEvent)
+# ===================================
+
+class ProjectionCheckpoint(models.Model):
+    """
+    Last event folded into a projection, so rebuilds only read new events
+    """
+    name = models.CharField(max_length=50, unique=True)
+    last_event_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.name} @ {self.last_event_id}"
+
+class RideSeatCounter(models.Model):
+    """
+    Seats held by bookings on a ride, by booking status
+    """
+    ride = models.OneToOneField(Ride, on_delete=models.CASCADE, primary_key=True, related_name='seat_counter')
+    seats_pending = models.IntegerField(default=0)
+    seats_confirmed = models.IntegerField(default=0)
+    
+    def __str__(self):
+        return f"Seats for ride {self.ride_id}: {self.seats_confirmed} confirmed"
+
+class DriverStats(models.Model):
+    """
+    Per-driver totals derived from the event log
+    """
+    driver = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='driver_stats')
+    rides_offered = models.IntegerField(default=0)
+    rides_completed = models.IntegerField(default=0)
+    rides_cancelled = models.IntegerField(default=0)
+    bookings_confirmed = models.IntegerField(default=0)
+    seats_sold = models.IntegerField(default=0)
+    
+    class Meta:
+        verbose_name_plural = "Driver stats"
+    
+    def __str__(self):
+        return f"Stats for driver {self.driver_id}"
+
+class TravellerHistory(models.Model):
+    """
+    Per-traveller booking history totals derived from the event log
+    """
+    traveller = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='traveller_history')
+    bookings_made = models.IntegerField(default=0)
+    bookings_confirmed = models.IntegerField(default=0)
+    bookings_cancelled = models.IntegerField(default=0)
+    trips_completed = models.IntegerField(default=0)
+    seats_travelled = models.IntegerField(default=0)
+    
+    class Meta:
+        verbose_name_plural = "Traveller histories"
     
     def __str__(self):
-        return f"{self.reviewer.username} → {self.reviewee.username} ({self.rating}/5)"
\ No newline at end of file
+        return f"History for traveller {self.traveller_id}"
@@ -0,0 +1,74 @@
+# rides/nearby.py
+
+"""
+Rides picking up (and optionally dropping off) near a point.
+
+Candidates are pruned in the database with the geohash indexes
+(rides.spatial.around: a handful of cells covering the circle, each an
+index lookup on a pickup geohash column and departs_at). Only the id,
+coordinates and departure of those are fetched; exact haversine distances
+then drop the corners outside the circle and rank what is left by how soon
+the ride leaves and how far it is.
+"""
+
+import heapq
+from collections import namedtuple
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .geo import haversine_km
+from .models import Ride
+from .spatial import around
+
+DEFAULT_RADIUS_KM = 10
+MAX_RADIUS_KM = 50
+
+# Rides leaving within this long are searched unless a window is given
+DEFAULT_WINDOW = timedelta(days=7)
+
+# One extra kilometre to travel ranks like leaving this many minutes later
+RANK_MINUTES_PER_KM = 3
+
+Match = namedtuple('Match', 'ride_id pickup_km dropoff_km departs_at score')
+
+
+def nearby_rides(pickup, radius_km=DEFAULT_RADIUS_KM, dropoff=None, dropoff_radius_km=None,
+                 start=None, end=None, limit=20):
+    """
+    The `limit` best-ranked active rides leaving in [start, end) whose pickup
+    is within radius_km of `pickup` (and drop-off within dropoff_radius_km of
+    `dropoff`, if given), as Match tuples, best first.
+
+    Points are (latitude, longitude). The score is minutes after `start` plus
+    RANK_MINUTES_PER_KM per kilometre to the pickup and from the drop-off.
+    """
+    start = start or timezone.now()
+    end = end or start + DEFAULT_WINDOW
+    dropoff_radius_km = dropoff_radius_km or radius_km
+
+    rides = Ride.objects.filter(
+        around(Ride.PICKUP, *pickup, radius_km),
+        status='ACTIVE', departs_at__gte=start, departs_at__lt=end,
+    )
+    if dropoff is not None:
+        rides = rides.filter(around(Ride.DROPOFF, *dropoff, dropoff_radius_km))
+    candidates = rides.order_by().values_list(
+        'id', 'pickup_latitude', 'pickup_longitude', 'dropoff_latitude', 'dropoff_longitude', 'departs_at',
+    )
+
+    def matches():
+        for ride_id, pickup_lat, pickup_lon, dropoff_lat, dropoff_lon, departs_at in candidates.iterator():
+            pickup_km = haversine_km(*pickup, pickup_lat, pickup_lon)
+            if pickup_km > radius_km:
+                continue
+            dropoff_km = None
+            if dropoff is not None:
+                dropoff_km = haversine_km(*dropoff, dropoff_lat, dropoff_lon)
+                if dropoff_km > dropoff_radius_km:
+                    continue
+            minutes = (departs_at - start).total_seconds() / 60
+            score = minutes + RANK_MINUTES_PER_KM * (pickup_km + (dropoff_km or 0))
+            yield Match(ride_id, pickup_km, dropoff_km, departs_at, score)
+
+    return heapq.nsmallest(limit, matches(), key=lambda match: (match.score, match.ride_id))
@@ -0,0 +1,196 @@
+# rides/projections.py
+
+"""
+Read models rebuilt from the append-only RideEvent log.
+
+Each projection folds events into per-key counter deltas and flushes them in
+batches together with its checkpoint, so a rebuild only reads events that
+arrived since the last run.
+"""
+
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import RideEvent, ProjectionCheckpoint, RideSeatCounter, DriverStats, TravellerHistory
+
+EVENT_FIELDS = ('id', 'event_type', 'ride_id', 'driver_id', 'traveller_id', 'from_status', 'to_status', 'seats')
+
+# Events younger than this are left for the next run, so rows from transactions
+# that committed out of id order are not skipped by the checkpoint.
+SETTLE_DELAY = timedelta(seconds=5)
+
+# Booking statuses that hold a seat someone paid for
+SOLD_STATUSES = ('CONFIRMED', 'COMPLETED')
+
+
+def status_moves(event):
+    """(status, sign) pairs for leaving the old status and entering the new one"""
+    if event.from_status:
+        yield event.from_status, -1
+    if event.to_status:
+        yield event.to_status, 1
+
+
+class Projection:
+    """
+    Base class: subclasses set name/model and implement apply()
+    """
+    name = None
+    model = None
+
+    def apply(self, event, deltas):
+        """Add this event's counter changes to deltas[key][field]"""
+        raise NotImplementedError
+
+    def reset(self):
+        self.model.objects.all().delete()
+
+    def flush(self, deltas):
+        """Apply accumulated deltas with one read and at most two bulk writes"""
+        existing = self.model.objects.in_bulk(list(deltas))
+        to_create, to_update, fields = [], [], set()
+
+        for key, changes in deltas.items():
+            row = existing.get(key)
+            if row is None:
+                row = self.model(pk=key)
+                to_create.append(row)
+            else:
+                to_update.append(row)
+            for field, delta in changes.items():
+                setattr(row, field, getattr(row, field) + delta)
+                fields.add(field)
+
+        if to_create:
+            self.model.objects.bulk_create(to_create)
+        if to_update and fields:
+            self.model.objects.bulk_update(to_update, sorted(fields))
+
+
+class SeatCounterProjection(Projection):
+    name = 'seat_counters'
+    model = RideSeatCounter
+
+    SEAT_FIELDS = {
+        'PENDING': 'seats_pending',
+        'CONFIRMED': 'seats_confirmed',
+        'COMPLETED': 'seats_confirmed',
+    }
+
+    def apply(self, event, deltas):
+        if not event.event_type.startswith('BOOKING'):
+            return
+        for status, sign in status_moves(event):
+            field = self.SEAT_FIELDS.get(status)
+            if field:
+                deltas[event.ride_id][field] += sign * event.seats
+
+
+class DriverStatsProjection(Projection):
+    name = 'driver_stats'
+    model = DriverStats
+
+    RIDE_FIELDS = {
+        'COMPLETED': 'rides_completed',
+        'CANCELLED': 'rides_cancelled',
+    }
+
+    def apply(self, event, deltas):
+        row = deltas[event.driver_id]
+        if event.event_type == 'RIDE_CREATED':
+            row['rides_offered'] += 1
+
+        for status, sign in status_moves(event):
+            if event.event_type.startswith('RIDE'):
+                field = self.RIDE_FIELDS.get(status)
+                if field:
+                    row[field] += sign
+            elif status in SOLD_STATUSES:
+                row['bookings_confirmed'] += sign
+                row['seats_sold'] += sign * event.seats
+
+
+class TravellerHistoryProjection(Projection):
+    name = 'traveller_history'
+    model = TravellerHistory
+
+    def apply(self, event, deltas):
+        if not event.traveller_id:
+            return
+        row = deltas[event.traveller_id]
+        if event.event_type == 'BOOKING_CREATED':
+            row['bookings_made'] += 1
+
+        for status, sign in status_moves(event):
+            if status in SOLD_STATUSES:
+                row['bookings_confirmed'] += sign
+            if status == 'CANCELLED':
+                row['bookings_cancelled'] += sign
+            elif status == 'COMPLETED':
+                row['trips_completed'] += sign
+                row['seats_travelled'] += sign * event.seats
+
+
+PROJECTIONS = {
+    projection.name: projection
+    for projection in (SeatCounterProjection(), DriverStatsProjection(), TravellerHistoryProjection())
+}
+
+
+def rebuild(projection, full=False, batch_size=2000, settle=SETTLE_DELAY):
+    """
+    Fold new events into a projection, reading the log in keyset batches.
+    Returns the number of events applied.
+
+    A full rebuild resets the projection and replays the whole log in one
+    transaction holding the checkpoint row, so readers keep seeing the old
+    rows until the new ones commit and a failed replay leaves them intact.
+    """
+    checkpoint, _ = ProjectionCheckpoint.objects.get_or_create(name=projection.name)
+    if not full:
+        return _replay(projection, checkpoint, batch_size, settle)
+
+    with transaction.atomic():
+        checkpoint = ProjectionCheckpoint.objects.select_for_update().get(pk=checkpoint.pk)
+        projection.reset()
+        checkpoint.last_event_id = 0
+        checkpoint.save()
+        return _replay(projection, checkpoint, batch_size, settle)
+
+
+def _replay(projection, checkpoint, batch_size, settle):
+    events = RideEvent.objects.filter(created_at__lt=timezone.now() - settle).order_by('id')
+    applied = 0
+
+    while True:
+        batch = list(
+            events.filter(id__gt=checkpoint.last_event_id).values_list(*EVENT_FIELDS, named=True)[:batch_size]
+        )
+        if not batch:
+            break
+
+        deltas = defaultdict(Counter)
+        for event in batch:
+            projection.apply(event, deltas)
+
+        with transaction.atomic():
+            projection.flush(deltas)
+            checkpoint.last_event_id = batch[-1].id
+            checkpoint.save()
+
+        applied += len(batch)
+        if len(batch) < batch_size:
+            break
+
+    return applied
+
+
+def rebuild_all(full=False, batch_size=2000, settle=SETTLE_DELAY):
+    """Rebuild every registered projection; returns {name: events applied}"""
+    return {
+        name: rebuild(projection, full=full, batch_size=batch_size, settle=settle)
+        for name, projection in PROJECTIONS.items()
+    }
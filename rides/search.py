@@ -0,0 +1,114 @@
+# rides/search.py
+
+"""
+Filtering and ranking for ride search results.
+
+Everything here is expressed as queryset annotations, so a result page
+(rides, drivers, seats left, driver rating and ranking score) is still
+fetched with a single SQL query.
+"""
+
+from django.db.models import Avg, F, FloatField, IntegerField, OuterRef, Subquery, Sum, Value, Window
+from django.db.models.functions import Abs, Cast, Coalesce, ExtractHour, ExtractMinute, Greatest, Least, PercentRank
+
+from .models import Booking, RideReview
+
+SORT_CHOICES = [
+    ('best', 'Best match'),
+    ('time', 'Departure time'),
+    ('price', 'Lowest price'),
+    ('rating', 'Top-rated drivers'),
+]
+
+# Relative weight of each signal in the "best match" score
+RANKING_WEIGHTS = {
+    'time': 0.40,
+    'price': 0.35,
+    'rating': 0.25,
+}
+
+# Unrated drivers are ranked as average rather than worst
+NEUTRAL_RATING = 3.0
+
+# Rides this many minutes or more from the preferred time get no time credit
+TIME_HORIZON_MINUTES = 6 * 60
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def driver_rating():
+    """Average traveller rating of the ride's driver, served by the review index"""
+    ratings = (
+        RideReview.objects.filter(reviewee=OuterRef('driver_id'), reviewer_type='TRAVELLER')
+        .values('reviewee')
+        .annotate(average=Avg('rating'))
+        .values('average')
+    )
+    return Subquery(ratings[:1], output_field=FloatField())
+
+
+def seats_booked():
+    """Seats taken by confirmed bookings, as a correlated subquery instead of a per-row query"""
+    booked = (
+        Booking.objects.filter(ride=OuterRef('pk'), status='CONFIRMED')
+        .values('ride')
+        .annotate(total=Sum('seats_booked'))
+        .values('total')
+    )
+    return Coalesce(Subquery(booked[:1], output_field=IntegerField()), 0)
+
+
+def annotate_results(queryset):
+    """Add driver_rating and seats_left, which the result template displays"""
+    return queryset.annotate(
+        driver_rating=driver_rating(),
+        seats_left=F('available_seats') - seats_booked(),
+    )
+
+
+def filter_rides(queryset, max_price=None, min_rating=None):
+    """Apply price and driver rating filters to an annotated queryset"""
+    if max_price is not None:
+        queryset = queryset.filter(price_per_seat__lte=max_price)
+    if min_rating is not None:
+        queryset = queryset.filter(driver_rating__gte=min_rating)
+    return queryset
+
+
+def rank_rides(queryset, sort='best', preferred_time=None):
+    """
+    Order an annotated queryset.
+
+    'best' combines closeness to preferred_time, price percentile within the
+    result set (a window function) and driver rating into one score.
+    """
+    if sort == 'time':
+        return queryset.order_by('departs_at', 'id')
+    if sort == 'price':
+        return queryset.order_by('price_per_seat', 'departs_at', 'id')
+    if sort == 'rating':
+        return queryset.order_by(F('driver_rating').desc(nulls_last=True), 'departs_at', 'id')
+
+    # 0 for the cheapest ride in the results, 1 for the most expensive
+    price_score = Value(1.0) - Window(
+        expression=PercentRank(), order_by=F('price_per_seat').asc()
+    )
+    rating_score = Coalesce(F('driver_rating'), Value(NEUTRAL_RATING)) / Value(5.0)
+
+    score = Value(RANKING_WEIGHTS['price']) * price_score + Value(RANKING_WEIGHTS['rating']) * rating_score
+    if preferred_time is not None:
+        minutes = Cast(
+            ExtractHour('departure_time') * Value(60) + ExtractMinute('departure_time'),
+            FloatField(),
+        )
+        preferred = preferred_time.hour * 60 + preferred_time.minute
+        # Distance on the 24-hour clock: 23:30 is 60 minutes from 00:30
+        distance = Abs(minutes - Value(float(preferred)))
+        distance = Least(distance, Value(float(MINUTES_PER_DAY)) - distance)
+        time_score = Greatest(
+            Value(0.0),
+            Value(1.0) - distance / Value(float(TIME_HORIZON_MINUTES)),
+        )
+        score = score + Value(RANKING_WEIGHTS['time']) * time_score
+
+    return queryset.annotate(score=score).order_by('-score', 'departs_at', 'id')
@@ -0,0 +1,165 @@
+# rides/series.py
+
+"""
+Recurring rides.
+
+A series is created in one transaction with a fixed number of statements
+however many rides it has: route lookup, overlap check, series insert, one
+bulk INSERT of the rides and one of their RIDE_CREATED events. bulk_create()
+skips Ride.save(), so departs_at is set here.
+
+Overlaps with the driver's other rides are found for the whole set at once:
+one range query on the (driver, departs_at) index, then a sorted sweep.
+"""
+
+from bisect import bisect_left
+from datetime import timedelta
+from itertools import accumulate
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from .lifecycle import OPEN_RIDE_STATUSES, cancel_rides, ride_end_time
+from .maptiles import invalidate_rides
+from .models import Ride, RideEvent, RideSeries, Route, SyncChange, combine_departure, queue_geocoding
+
+# Upper bound on rides in one series (about six months of weekdays)
+MAX_OCCURRENCES = 130
+
+# No ride is expected to take longer; bounds how far back the overlap query looks
+MAX_RIDE_DURATION = timedelta(hours=24)
+
+
+def occurrence_dates(start_date, end_date, weekdays):
+    """Dates from start_date to end_date (inclusive) falling on the given weekdays"""
+    weekdays = set(weekdays)
+    days = (start_date + timedelta(days=n) for n in range((end_date - start_date).days + 1))
+    return [day for day in days if day.weekday() in weekdays]
+
+
+def overlapping(driver, departures, duration_minutes):
+    """
+    The departures (sorted) whose ride would overlap one of the driver's open rides.
+
+    Each new ride lasts duration_minutes; existing rides last their route's
+    estimated duration.
+    """
+    if not departures:
+        return []
+    existing = sorted(
+        (departs_at, ride_end_time(departs_at, minutes))
+        for departs_at, minutes in Ride.objects.filter(
+            driver=driver, status__in=OPEN_RIDE_STATUSES,
+            departs_at__gte=departures[0] - MAX_RIDE_DURATION,
+            departs_at__lt=ride_end_time(departures[-1], duration_minutes),
+        ).values_list('departs_at', 'route__estimated_duration_minutes')
+    )
+    starts = [start for start, _ in existing]
+    latest_end = list(accumulate((end for _, end in existing), max))
+
+    clashes = []
+    for departs_at in departures:
+        # Rides starting before this one ends overlap it if any of them ends after it starts
+        before = bisect_left(starts, ride_end_time(departs_at, duration_minutes))
+        if before and latest_end[before - 1] > departs_at:
+            clashes.append(departs_at)
+    return clashes
+
+
+def create_series(driver, pickup_city, dropoff_city, pickup_location, dropoff_location,
+                  weekdays, start_date, end_date, departure_time, available_seats,
+                  price_per_seat, notes='', now=None):
+    """
+    Create a series and all of its rides.
+
+    Dates whose departure has already passed (e.g. today, after the
+    departure time) are skipped. Raises ValidationError if the pattern has
+    no dates left, too many, or any that overlap the driver's existing rides.
+    """
+    now = now or timezone.now()
+    dates, departures = [], []
+    for day in occurrence_dates(start_date, end_date, weekdays):
+        departs_at = combine_departure(day, departure_time)
+        if departs_at > now:
+            dates.append(day)
+            departures.append(departs_at)
+    if not dates:
+        raise ValidationError("No upcoming dates in that range fall on the chosen weekdays")
+    if len(dates) > MAX_OCCURRENCES:
+        raise ValidationError(f"A series can have at most {MAX_OCCURRENCES} rides; choose a shorter range")
+
+    with transaction.atomic():
+        route, _ = Route.objects.get_or_create(
+            driver=driver, origin_city=pickup_city, destination_city=dropoff_city,
+            defaults={'driver_price': price_per_seat},
+        )
+        clashes = overlapping(driver, departures, route.estimated_duration_minutes)
+        if clashes:
+            listed = ', '.join(timezone.localtime(departs_at).strftime('%a %b %d') for departs_at in clashes[:5])
+            more = f" and {len(clashes) - 5} more" if len(clashes) > 5 else ''
+            raise ValidationError(f"You already have a ride at that time on {listed}{more}")
+
+        series = RideSeries.objects.create(
+            driver=driver, route=route, weekdays=sorted(set(weekdays)),
+            start_date=start_date, end_date=end_date, departure_time=departure_time,
+        )
+        rides = Ride.objects.bulk_create([
+            Ride(
+                route=route, driver=driver, series=series,
+                departure_date=day, departure_time=departure_time, departs_at=departs_at,
+                pickup_city=pickup_city, pickup_location=pickup_location,
+                dropoff_city=dropoff_city, dropoff_location=dropoff_location,
+                available_seats=available_seats, price_per_seat=price_per_seat, notes=notes,
+            )
+            for day, departs_at in zip(dates, departures)
+        ])
+        RideEvent.objects.bulk_create([
+            RideEvent.objects.build('RIDE_CREATED', ride.pk, driver.pk, to_status=ride.status, series_id=series.pk)
+            for ride in rides
+        ])
+    return series, rides
+
+
+def upcoming_rides(series, now=None):
+    """The series' rides that have not departed and are still open"""
+    return Ride.objects.filter(
+        series=series, status__in=OPEN_RIDE_STATUSES, departs_at__gt=now or timezone.now()
+    )
+
+
+# Ride fields a driver can change for every upcoming ride of a series at once
+EDITABLE_FIELDS = ('price_per_seat', 'pickup_location', 'dropoff_location', 'notes')
+
+
+def update_series(series, **changes):
+    """
+    Apply changes to every upcoming ride in one UPDATE; returns the number changed.
+
+    Existing bookings keep the price they were made at. The map tiles
+    showing the rides are dropped after commit, and changed addresses are
+    geocoded again by a job (which then moves the rides on the map).
+    """
+    unknown = set(changes) - set(EDITABLE_FIELDS)
+    if unknown:
+        raise ValueError(f"Series rides cannot be edited in bulk: {', '.join(sorted(unknown))}")
+    with transaction.atomic():
+        ride_ids = list(upcoming_rides(series).values_list('id', flat=True))
+        if ride_ids and changes:
+            Ride.objects.filter(id__in=ride_ids).update(updated_at=timezone.now(), **changes)
+            SyncChange.objects.for_rides(ride_ids)
+            transaction.on_commit(lambda: invalidate_rides(ride_ids))
+            if set(changes) & set(Ride.ADDRESS_FIELDS):
+                queue_geocoding(ride_ids)
+    return len(ride_ids)
+
+
+def cancel_series(series, actor=None, reason='', by_staff=False):
+    """Cancel every upcoming ride of a series and the series itself; returns the rides cancelled"""
+    with transaction.atomic():
+        cancelled = cancel_rides(
+            list(upcoming_rides(series).values_list('id', flat=True)), actor=actor, reason=reason, by_staff=by_staff,
+        )
+        series.status = 'CANCELLED'
+        series.save(update_fields=['status'])
+    return cancelled
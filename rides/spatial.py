@@ -0,0 +1,82 @@
+# rides/spatial.py
+
+"""
+Bounding-box, radius and k-nearest queries over geohash columns.
+
+Each query covers its area with at most MAX_CELLS geohash cells and turns
+them into index lookups: an IN list on the coarse column of that precision
+when the model keeps one (GeoColumns.levels), otherwise one range scan per
+cell on the full geohash. That prunes in the database with plain B-tree
+indexes; the few false positives in the cells' corners are then dropped
+exactly (coordinate ranges for a box, haversine for a circle).
+
+The columns of a model are described by a GeoColumns, e.g. City.LOCATION or
+Ride.PICKUP:
+
+    in_bbox(City.objects.all(), City.LOCATION, 43.5, -79.7, 43.9, -79.1)
+    within_radius(Ride.objects.filter(status='ACTIVE'), Ride.PICKUP, 43.65, -79.38, 10)
+    nearest(City.objects.filter(is_active=True), City.LOCATION, 43.65, -79.38, k=3)
+"""
+
+from django.db.models import Q
+
+from .geo import bounding_box, cover_precision, covering_cells, haversine_km, prefix_range
+
+# Cells per query: fewer means coarser cells and more false positives to refine
+MAX_CELLS = 16
+
+# k-nearest starts with this radius and doubles it until k are found or max_radius_km is searched
+NEAREST_START_KM = 5
+
+
+def cover(columns, south, west, north, east, max_cells=MAX_CELLS):
+    """Q for rows in the geohash cells covering a box (a superset of the box)"""
+    precision = cover_precision(south, west, north, east, max_cells)
+    cells = covering_cells(south, west, north, east, precision=precision)
+    if precision in columns.levels:
+        return Q(**{f'{columns.levels[precision]}__in': cells})
+    condition = Q()
+    for cell in cells:
+        low, high = prefix_range(cell)
+        condition |= Q(**{f'{columns.geohash}__gte': low, f'{columns.geohash}__lt': high})
+    return condition
+
+
+def around(columns, latitude, longitude, radius_km, max_cells=MAX_CELLS):
+    """Q for rows in the geohash cells covering a circle (refine with haversine_km)"""
+    return cover(columns, *bounding_box(latitude, longitude, radius_km), max_cells=max_cells)
+
+
+def in_bbox(queryset, columns, south, west, north, east):
+    """The rows of `queryset` whose point lies in the box"""
+    return queryset.filter(
+        cover(columns, south, west, north, east),
+        **{f'{columns.latitude}__range': (south, north), f'{columns.longitude}__range': (west, east)},
+    )
+
+
+def within_radius(queryset, columns, latitude, longitude, radius_km):
+    """[(row, km)] for the rows of `queryset` within radius_km of the point, nearest first"""
+    found = []
+    for row in queryset.filter(around(columns, latitude, longitude, radius_km)):
+        km = haversine_km(latitude, longitude, getattr(row, columns.latitude), getattr(row, columns.longitude))
+        if km <= radius_km:
+            found.append((row, km))
+    found.sort(key=lambda entry: (entry[1], entry[0].pk))
+    return found
+
+
+def nearest(queryset, columns, latitude, longitude, k=1, max_radius_km=100):
+    """
+    [(row, km)] for the k rows of `queryset` nearest the point, nearest first,
+    among those within max_radius_km.
+
+    Searches circles of doubling radius; once one holds k rows, no row
+    outside it can be nearer than the k-th.
+    """
+    radius_km = min(NEAREST_START_KM, max_radius_km)
+    while True:
+        found = within_radius(queryset, columns, latitude, longitude, radius_km)
+        if len(found) >= k or radius_km >= max_radius_km:
+            return found[:k]
+        radius_km = min(radius_km * 2, max_radius_km)
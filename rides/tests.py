@@ -1,6 +1,6 @@
 # rides/tests.py
 
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
@@ -8,8 +8,12 @@ from django.db import IntegrityError
 from datetime import date, time, timedelta
 from decimal import Decimal
 import json
+import math
 
-from .models import City, Route, Ride, Booking, RideReview
+from .models import (
+    City, Route, Ride, Booking, RideReview, RideEvent, RideSeatCounter, DriverStats, TravellerHistory, SyncChange,
+    RideSeries, GeocodedAddress, combine_departure,
+)
 from .forms import LocationSearchForm, RideSearchForm, RideCreateForm, BookingForm
 from accounts.models import DriverProfile, TravellerProfile
 
@@ -155,6 +159,37 @@ class RideModelTest(TestCase):
         # Should have 2 seats left
         self.assertEqual(ride.available_seats_count, 2)
     
+    def test_departs_at_combines_date_and_time(self):
+        """Test departs_at is the aware Toronto instant and follows schedule edits"""
+        from zoneinfo import ZoneInfo
+        from datetime import datetime
+        
+        ride = Ride.objects.create(
+            route=self.route,
+            driver=self.user,
+            departure_date=date(2030, 7, 1),
+            departure_time='23:30',
+            available_seats=4,
+            pickup_location='Union Station',
+            pickup_city=self.toronto,
+            dropoff_location='Rideau Centre',
+            dropoff_city=self.ottawa,
+            price_per_seat=Decimal('25.00')
+        )
+        toronto = ZoneInfo('America/Toronto')
+        self.assertEqual(ride.departs_at, datetime(2030, 7, 1, 23, 30, tzinfo=toronto))
+        
+        ride.departure_time = time(0, 15)
+        ride.departure_date = date(2030, 7, 2)
+        ride.save(update_fields=['departure_date', 'departure_time'])
+        
+        # A cross-midnight window is a single departs_at range
+        window = Ride.objects.filter(
+            departs_at__gte=datetime(2030, 7, 1, 22, 0, tzinfo=toronto),
+            departs_at__lt=datetime(2030, 7, 2, 2, 0, tzinfo=toronto),
+        )
+        self.assertEqual(list(window), [ride])
+    
     def test_ride_is_full_property(self):
         """Test is_full property"""
         ride = Ride.objects.create(
@@ -575,6 +610,446 @@ class IntegrationTest(TestCase):
         self.assertEqual(booking.status, 'CONFIRMED')
         self.assertIsNotNone(booking.confirmed_at)
 
+class RideEventLogTest(TestCase):
+    """Test the append-only event log and the projections rebuilt from it"""
+    
+    def setUp(self):
+        """Set up test data"""
+        self.driver = User.objects.create_user(
+            username='testdriver',
+            email='driver@test.com',
+            password='testpass123',
+            full_legal_name='Test Driver',
+            is_driver=True
+        )
+        self.traveller = User.objects.create_user(
+            username='testtraveller',
+            email='traveller@test.com',
+            password='testpass123',
+            full_legal_name='Test Traveller',
+            is_traveller=True
+        )
+        self.toronto = City.objects.create(name='Toronto', province='Ontario', country='Canada')
+        self.ottawa = City.objects.create(name='Ottawa', province='Ontario', country='Canada')
+        self.route = Route.objects.create(
+            driver=self.driver,
+            origin_city=self.toronto,
+            destination_city=self.ottawa,
+            driver_price=Decimal('50.00')
+        )
+        self.ride = Ride.objects.create(
+            route=self.route,
+            driver=self.driver,
+            departure_date=date.today() + timedelta(days=1),
+            departure_time=time(9, 0),
+            available_seats=2,
+            pickup_location='Union Station',
+            pickup_city=self.toronto,
+            dropoff_location='Rideau Centre',
+            dropoff_city=self.ottawa,
+            price_per_seat=Decimal('25.00')
+        )
+    
+    def rebuild(self, **kwargs):
+        from .projections import rebuild_all
+        return rebuild_all(settle=timedelta(0), **kwargs)
+    
+    def test_transitions_are_logged(self):
+        """Test ride and booking transitions each append one event"""
+        booking = Booking.objects.create(ride=self.ride, traveller=self.traveller, seats_booked=2)
+        booking = Booking.objects.get(pk=booking.pk)
+        booking.status = 'CONFIRMED'
+        booking.save()
+        
+        events = list(RideEvent.objects.values_list('event_type', 'from_status', 'to_status'))
+        self.assertEqual(events, [
+            ('RIDE_CREATED', '', 'ACTIVE'),
+            ('BOOKING_CREATED', '', 'PENDING'),
+            ('BOOKING_STATUS', 'PENDING', 'CONFIRMED'),
+            ('RIDE_STATUS', 'ACTIVE', 'FULL'),
+        ])
+    
+    def test_events_are_append_only(self):
+        """Test events cannot be changed or removed"""
+        event = RideEvent.objects.get()
+        with self.assertRaises(TypeError):
+            event.save()
+        with self.assertRaises(TypeError):
+            event.delete()
+        with self.assertRaises(TypeError):
+            RideEvent.objects.update(seats=1)
+    
+    def test_admin_cascades_events_but_never_deletes_them_directly(self):
+        """Test the admin can delete a ride with its events but not an event on its own"""
+        User.objects.create_superuser(username='admin', password='testpass123', full_legal_name='Admin')
+        self.client.login(username='admin', password='testpass123')
+        event = RideEvent.objects.get()
+        
+        response = self.client.get(reverse('admin:rides_rideevent_delete', args=[event.pk]))
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get(reverse('admin:rides_rideevent_changelist'))
+        self.assertIsNone(response.context['action_form'])  # no delete_selected action
+        
+        response = self.client.post(reverse('admin:rides_ride_delete', args=[self.ride.pk]), {'post': 'yes'})
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Ride.objects.filter(pk=self.ride.pk).exists())
+        self.assertFalse(RideEvent.objects.exists())
+    
+    def test_projections_rebuild_incrementally(self):
+        """Test projections fold only new events and match a full replay"""
+        booking = Booking.objects.create(ride=self.ride, traveller=self.traveller, seats_booked=1)
+        self.assertEqual(self.rebuild()['seat_counters'], 2)
+        self.assertEqual(RideSeatCounter.objects.get(ride=self.ride).seats_pending, 1)
+        
+        booking = Booking.objects.get(pk=booking.pk)
+        booking.status = 'CONFIRMED'
+        booking.save()
+        self.assertEqual(self.rebuild()['seat_counters'], 1)
+        
+        counter = RideSeatCounter.objects.get(ride=self.ride)
+        self.assertEqual((counter.seats_pending, counter.seats_confirmed), (0, 1))
+        stats = DriverStats.objects.get(driver=self.driver)
+        self.assertEqual((stats.rides_offered, stats.seats_sold), (1, 1))
+        history = TravellerHistory.objects.get(traveller=self.traveller)
+        self.assertEqual((history.bookings_made, history.bookings_confirmed), (1, 1))
+        
+        self.assertEqual(self.rebuild(full=True)['seat_counters'], 3)
+        counter = RideSeatCounter.objects.get(ride=self.ride)
+        self.assertEqual((counter.seats_pending, counter.seats_confirmed), (0, 1))
+    
+    def test_failed_full_rebuild_keeps_the_old_projection(self):
+        """Test a full rebuild that fails part way rolls back its reset"""
+        from unittest import mock
+        from .models import ProjectionCheckpoint
+        from .projections import PROJECTIONS, rebuild
+        Booking.objects.create(ride=self.ride, traveller=self.traveller, seats_booked=1)
+        projection = PROJECTIONS['seat_counters']
+        rebuild(projection, settle=timedelta(0))
+        
+        with mock.patch.object(projection, 'flush', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                rebuild(projection, full=True, settle=timedelta(0))
+        self.assertEqual(RideSeatCounter.objects.get(ride=self.ride).seats_pending, 1)
+        self.assertNotEqual(ProjectionCheckpoint.objects.get(name='seat_counters').last_event_id, 0)
+
+class RideCancellationTest(TestCase):
+    """Test the set-based ride cancellation cascade"""
+    
+    def setUp(self):
+        """Set up test data"""
+        self.client = Client()
+        self.driver = User.objects.create_user(
+            username='testdriver',
+            email='driver@test.com',
+            password='testpass123',
+            full_legal_name='Test Driver',
+            is_driver=True
+        )
+        self.toronto = City.objects.create(name='Toronto', province='Ontario', country='Canada')
+        self.ottawa = City.objects.create(name='Ottawa', province='Ontario', country='Canada')
+        self.route = Route.objects.create(
+            driver=self.driver,
+            origin_city=self.toronto,
+            destination_city=self.ottawa,
+            driver_price=Decimal('50.00')
+        )
+    
+    def make_ride(self, bookings):
+        """Create a ride with the given number of bookings, half of them confirmed"""
+        ride = Ride.objects.create(
+            route=self.route,
+            driver=self.driver,
+            departure_date=date.today() + timedelta(days=1),
+            departure_time=time(9, 0),
+            available_seats=8,
+            pickup_location='Union Station',
+            pickup_city=self.toronto,
+            dropoff_location='Rideau Centre',
+            dropoff_city=self.ottawa,
+            price_per_seat=Decimal('25.00')
+        )
+        prefix = f'traveller{ride.id}_'
+        travellers = User.objects.bulk_create([
+            User(username=f'{prefix}{i}', full_legal_name=f'Traveller {i}', is_traveller=True)
+            for i in range(bookings)
+        ])
+        Booking.objects.bulk_create([
+            Booking(ride=ride, traveller=traveller, seats_booked=1, total_price=Decimal('25.00'),
+                    status='CONFIRMED' if i % 2 else 'PENDING')
+            for i, traveller in enumerate(travellers)
+        ])
+        return ride
+    
+    def test_cancel_cascades_in_constant_queries(self):
+        """Test cancelling a ride with hundreds of bookings costs as many queries as one with three"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .lifecycle import cancel_ride
+        
+        small, large = self.make_ride(3), self.make_ride(300)
+        with CaptureQueriesContext(connection) as small_queries:
+            self.assertTrue(cancel_ride(small))
+        with CaptureQueriesContext(connection) as large_queries:
+            self.assertTrue(cancel_ride(large))
+        # Only the event and sync change INSERTs may be split, and only by the backend's
+        # parameter limit (SQLite); on PostgreSQL both cancellations run the exact same
+        # statements. Each booking is one event and three sync changes.
+        def batches(model, rows):
+            fields = [f for f in model._meta.concrete_fields if not f.primary_key]
+            return math.ceil(rows / connection.ops.bulk_batch_size(fields, [None] * rows))
+        insert_batches = batches(RideEvent, 301) + batches(SyncChange, 901)
+        self.assertEqual(len(large_queries), len(small_queries) + insert_batches - 2)
+        
+        self.assertFalse(Booking.objects.filter(ride=large).exclude(status='CANCELLED').exists())
+        self.assertEqual(Ride.objects.get(pk=large.pk).status, 'CANCELLED')
+        self.assertEqual(RideEvent.objects.filter(ride=large, event_type='BOOKING_STATUS').count(), 300)
+        ride_event = RideEvent.objects.get(ride=large, event_type='RIDE_STATUS')
+        self.assertEqual(len(ride_event.payload['notify']), 300)
+        
+        # One notification job per cancellation, queued in the same transaction
+        from jobs.models import Job
+        self.assertEqual(Job.objects.filter(name='rides.notify_ride_cancelled').count(), 2)
+        
+        # Already cancelled rides are left alone
+        self.assertFalse(cancel_ride(large))
+    
+    def test_cancel_emails_travellers_from_worker(self):
+        """Test the queued notification job emails every traveller once"""
+        from django.core import mail
+        from jobs.models import Job
+        from jobs.queue import Worker
+        from .lifecycle import cancel_ride
+        
+        ride = self.make_ride(3)
+        for booking in ride.bookings.select_related('traveller'):
+            booking.traveller.email = f'{booking.traveller.username}@test.com'
+            booking.traveller.save()
+        
+        cancel_ride(ride, actor=self.driver, reason="The driver's car broke down")
+        self.assertEqual(len(mail.outbox), 0)
+        with override_settings(JOBS_EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'):
+            # The notification job fans out to one delivery job per traveller, drained in the same run
+            Worker(pool='inline').run(once=True)
+        self.assertFalse(Job.objects.exists())
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(sorted(len(message.to) for message in mail.outbox), [1, 1, 1])
+        self.assertIn("The driver's car broke down", mail.outbox[0].body)
+    
+    def test_admin_cancellation_email_names_staff(self):
+        """Test an admin cancellation emails travellers without internal tags or a driver blame"""
+        from django.core import mail
+        from jobs.queue import Worker
+        
+        ride = self.make_ride(1)
+        booking = ride.bookings.select_related('traveller').get()
+        booking.traveller.email = 'traveller@test.com'
+        booking.traveller.save()
+        
+        User.objects.create_superuser(username='staff', password='testpass123', full_legal_name='Staff')
+        self.client.login(username='staff', password='testpass123')
+        self.client.post(reverse('admin:rides_ride_changelist'), {
+            'action': 'cancel_selected_rides', '_selected_action': [ride.id],
+        })
+        self.assertEqual(Ride.objects.get(pk=ride.pk).status, 'CANCELLED')
+        with override_settings(JOBS_EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'):
+            Worker(pool='inline').run(once=True)
+        self.assertEqual(len(mail.outbox), 1)
+        body = mail.outbox[0].body
+        self.assertIn('the PointRide team cancelled the ride', body)
+        self.assertNotIn('Reason given', body)
+        self.assertNotIn('admin', body)
+    
+    def test_cancel_ride_view_driver_only(self):
+        """Test only the driver can cancel through the view"""
+        ride = self.make_ride(2)
+        url = reverse('rides:cancel_ride', kwargs={'ride_id': ride.id})
+        
+        User.objects.create_user(username='other', password='testpass123', full_legal_name='Other')
+        self.client.login(username='other', password='testpass123')
+        self.assertEqual(self.client.post(url).status_code, 403)
+        
+        self.client.login(username='testdriver', password='testpass123')
+        self.assertEqual(self.client.post(url).status_code, 302)
+        self.assertEqual(Ride.objects.get(pk=ride.pk).status, 'CANCELLED')
+
+class RideLifecycleTest(TestCase):
+    """Test scheduled completion of departed rides"""
+    
+    def setUp(self):
+        """Set up test data"""
+        self.driver = User.objects.create_user(
+            username='testdriver',
+            password='testpass123',
+            full_legal_name='Test Driver',
+            is_driver=True
+        )
+        self.traveller = User.objects.create_user(
+            username='testtraveller',
+            password='testpass123',
+            full_legal_name='Test Traveller',
+            is_traveller=True
+        )
+        self.toronto = City.objects.create(name='Toronto', province='Ontario', country='Canada')
+        self.ottawa = City.objects.create(name='Ottawa', province='Ontario', country='Canada')
+        self.route = Route.objects.create(
+            driver=self.driver,
+            origin_city=self.toronto,
+            destination_city=self.ottawa,
+            driver_price=Decimal('50.00'),
+            estimated_duration_minutes=240
+        )
+    
+    def make_ride(self, departs):
+        from django.utils import timezone
+        local = timezone.localtime(departs)
+        return Ride.objects.create(
+            route=self.route,
+            driver=self.driver,
+            departure_date=local.date(),
+            departure_time=local.time().replace(microsecond=0),
+            available_seats=4,
+            pickup_location='Union Station',
+            pickup_city=self.toronto,
+            dropoff_location='Rideau Centre',
+            dropoff_city=self.ottawa,
+            price_per_seat=Decimal('25.00')
+        )
+    
+    def test_completes_only_finished_rides(self):
+        """Test rides are completed once departure plus route duration has passed"""
+        from django.utils import timezone
+        from .lifecycle import complete_departed_rides
+        
+        now = timezone.now()
+        finished = self.make_ride(now - timedelta(days=1))
+        en_route = self.make_ride(now - timedelta(hours=1))
+        upcoming = self.make_ride(now + timedelta(days=1))
+        booking = Booking.objects.create(ride=finished, traveller=self.traveller, seats_booked=1, status='CONFIRMED')
+        
+        self.assertEqual(complete_departed_rides(now=now, chunk_size=1), 1)
+        
+        statuses = dict(Ride.objects.values_list('id', 'status'))
+        self.assertEqual(statuses[finished.id], 'COMPLETED')
+        self.assertEqual(statuses[en_route.id], 'ACTIVE')
+        self.assertEqual(statuses[upcoming.id], 'ACTIVE')
+        self.assertEqual(Booking.objects.get(pk=booking.pk).status, 'COMPLETED')
+        self.assertTrue(RideEvent.objects.filter(
+            ride=finished, event_type='RIDE_STATUS', to_status='COMPLETED'
+        ).exists())
+        
+        # A second pass finds nothing new
+        self.assertEqual(complete_departed_rides(now=now), 0)
+
+class SearchRankingTest(TestCase):
+    """Test search filters and SQL-side ranking"""
+    
+    def setUp(self):
+        """Set up test data: three drivers with different prices, times and ratings"""
+        self.toronto = City.objects.create(name='Toronto', province='Ontario', country='Canada')
+        self.ottawa = City.objects.create(name='Ottawa', province='Ontario', country='Canada')
+        self.traveller = User.objects.create_user(
+            username='testtraveller', password='testpass123',
+            full_legal_name='Test Traveller', is_traveller=True
+        )
+        self.day = date.today() + timedelta(days=2)
+        self.rides = {}
+        for name, hour, price, rating in [('early', 7, '40.00', 5), ('cheap', 12, '20.00', 2), ('late', 18, '30.00', 4)]:
+            driver = User.objects.create_user(
+                username=name, password='testpass123', full_legal_name=name.title(), is_driver=True
+            )
+            route = Route.objects.create(
+                driver=driver, origin_city=self.toronto, destination_city=self.ottawa,
+                driver_price=Decimal(price)
+            )
+            ride = Ride.objects.create(
+                route=route, driver=driver, departure_date=self.day, departure_time=time(hour, 0),
+                available_seats=4, pickup_location='Union Station', pickup_city=self.toronto,
+                dropoff_location='Rideau Centre', dropoff_city=self.ottawa, price_per_seat=Decimal(price)
+            )
+            past_ride = Ride.objects.create(
+                route=route, driver=driver, departure_date=date.today() - timedelta(days=7),
+                departure_time=time(hour, 0), available_seats=4, pickup_location='Union Station',
+                pickup_city=self.toronto, dropoff_location='Rideau Centre', dropoff_city=self.ottawa,
+                price_per_seat=Decimal(price)
+            )
+            RideReview.objects.create(
+                ride=past_ride, reviewer=self.traveller, reviewee=driver,
+                reviewer_type='TRAVELLER', rating=rating
+            )
+            self.rides[name] = ride
+        Booking.objects.create(ride=self.rides['cheap'], traveller=self.traveller, seats_booked=3, status='CONFIRMED')
+    
+    def search(self, **filters):
+        from .search import annotate_results, filter_rides, rank_rides
+        sort = filters.pop('sort', 'best')
+        preferred_time = filters.pop('preferred_time', None)
+        rides = Ride.objects.filter(
+            pickup_city=self.toronto, dropoff_city=self.ottawa, departure_date=self.day
+        ).select_related('driver')
+        return rank_rides(filter_rides(annotate_results(rides), **filters), sort=sort, preferred_time=preferred_time)
+    
+    def names(self, rides):
+        lookup = {ride.id: name for name, ride in self.rides.items()}
+        return [lookup[ride.id] for ride in rides]
+    
+    def test_sort_orders(self):
+        """Test price, rating and time sorts"""
+        self.assertEqual(self.names(self.search(sort='price')), ['cheap', 'late', 'early'])
+        self.assertEqual(self.names(self.search(sort='rating')), ['early', 'late', 'cheap'])
+        self.assertEqual(self.names(self.search(sort='time')), ['early', 'cheap', 'late'])
+    
+    def test_filters(self):
+        """Test max price and min rating filters"""
+        self.assertEqual(self.names(self.search(sort='price', max_price=Decimal('30'))), ['cheap', 'late'])
+        self.assertEqual(self.names(self.search(sort='price', min_rating=4)), ['late', 'early'])
+    
+    def test_best_match_uses_time_proximity(self):
+        """Test the combined score favours rides near the preferred time"""
+        self.assertEqual(self.names(self.search(preferred_time=time(18, 0)))[0], 'late')
+        self.assertEqual(self.names(self.search(preferred_time=time(7, 0)))[0], 'early')
+    
+    def test_time_proximity_wraps_past_midnight(self):
+        """Test windows and time scores treat the clock as circular"""
+        from .forms import RideFilterForm
+        
+        late = self.rides['late']
+        self.rides['midnight'] = Ride.objects.create(
+            route=late.route, driver=late.driver, departure_date=self.day, departure_time=time(23, 30),
+            available_seats=4, pickup_location='Union Station', pickup_city=self.toronto,
+            dropoff_location='Rideau Centre', dropoff_city=self.ottawa, price_per_seat=Decimal('50.00')
+        )
+        form = RideFilterForm({'earliest_time': '22:00', 'latest_time': '02:00'})
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.preferred_time(), time(0, 0))
+        # 23:30 is an hour from 00:30, not 23 hours
+        self.assertEqual(self.names(self.search(preferred_time=time(0, 30)))[0], 'midnight')
+        
+        response = self.client.post(reverse('rides:search_rides'), {
+            'pickup_city': self.toronto.id, 'dropoff_city': self.ottawa.id,
+            'departure_date': self.day.isoformat(), 'earliest_time': '12:00', 'latest_time': '23:30',
+            'sort': 'time',
+        })
+        self.assertEqual(self.names(response.context['rides']), ['cheap', 'late', 'midnight'])
+    
+    def test_results_page_is_one_query(self):
+        """Test ranked results with seats, rating and driver need a single query"""
+        with self.assertNumQueries(1):
+            results = list(self.search(preferred_time=time(9, 0)))
+            details = [(ride.driver.full_legal_name, ride.seats_left, ride.driver_rating) for ride in results]
+        self.assertIn(('Cheap', 1, 2.0), details)
+    
+    def test_search_view_with_filters(self):
+        """Test the search view applies the departure window"""
+        response = self.client.post(reverse('rides:search_rides'), {
+            'pickup_city': self.toronto.id,
+            'dropoff_city': self.ottawa.id,
+            'departure_date': self.day.isoformat(),
+            'earliest_time': '11:00',
+            'latest_time': '19:00',
+            'sort': 'price',
+        })
+        self.assertEqual(self.names(response.context['rides']), ['cheap', 'late'])
+
 # Performance Tests
 class PerformanceTest(TestCase):
     """Performance tests"""
@@ -673,4 +1148,1205 @@ def run_integration_tests():
     
     failures = test_runner.run_tests(test_labels)
     if failures:
-        sys.exit(bool(failures))
\ No newline at end of file
+        sys.exit(bool(failures))
+class LiveSeatsTest(TestCase):
+    """Test the live seat availability hub and stream"""
+    
+    def setUp(self):
+        """Set up a ride with one pending booking"""
+        self.driver = User.objects.create_user(
+            username='testdriver', password='testpass123', full_legal_name='Test Driver', is_driver=True
+        )
+        self.traveller = User.objects.create_user(
+            username='testtraveller', password='testpass123', full_legal_name='Test Traveller', is_traveller=True
+        )
+        self.toronto = City.objects.create(name='Toronto', province='Ontario', country='Canada')
+        self.ottawa = City.objects.create(name='Ottawa', province='Ontario', country='Canada')
+        route = Route.objects.create(
+            driver=self.driver, origin_city=self.toronto, destination_city=self.ottawa, driver_price=Decimal('50.00')
+        )
+        self.ride = Ride.objects.create(
+            route=route, driver=self.driver, departure_date=date.today() + timedelta(days=1),
+            departure_time=time(9, 0), available_seats=3, pickup_location='Union Station',
+            pickup_city=self.toronto, dropoff_location='Rideau Centre', dropoff_city=self.ottawa,
+            price_per_seat=Decimal('25.00')
+        )
+        self.booking = Booking.objects.create(ride=self.ride, traveller=self.traveller, seats_booked=3)
+    
+    def confirm_booking(self):
+        self.booking.status = 'CONFIRMED'
+        self.booking.save()
+    
+    async def test_hub_fans_out_one_poll_to_every_watcher(self):
+        """Test all subscribers get the new state from a single poll"""
+        from asgiref.sync import sync_to_async
+        from .live import SeatHub
+        
+        hub = SeatHub()
+        hub.cursor = await sync_to_async(lambda: RideEvent.objects.order_by('-id').first().id)()
+        watchers = [await hub.subscribe(self.ride.id) for _ in range(50)]
+        for queue in watchers:
+            self.assertEqual(queue.get_nowait(), {'ride_id': self.ride.id, 'status': 'ACTIVE', 'seats_left': 3})
+        
+        await sync_to_async(self.confirm_booking)()
+        await hub.poll()
+        for queue in watchers:
+            self.assertEqual(queue.get_nowait(), {'ride_id': self.ride.id, 'status': 'FULL', 'seats_left': 0})
+        hub.task.cancel()
+    
+    def test_poll_costs_two_queries(self):
+        """Test a tick reads the event log once and the changed rides once"""
+        from .live import changed_rides, last_event_id, seat_snapshots
+        
+        cursor = last_event_id()
+        self.confirm_booking()
+        with self.assertNumQueries(2):
+            cursor, changed = changed_rides(cursor, {self.ride.id})
+            snapshots = seat_snapshots(changed)
+        self.assertEqual(snapshots[self.ride.id]['seats_left'], 0)
+        self.assertEqual(changed_rides(cursor, {self.ride.id}), (cursor, set()))
+    
+    def test_wsgi_does_not_stream(self):
+        """Test non-streaming servers leave the stream off the page and stop reconnects with 204"""
+        response = self.client.get(reverse('rides:ride_seats_stream', kwargs={'ride_id': self.ride.id}))
+        self.assertEqual(response.status_code, 204)
+        
+        page = self.client.get(reverse('rides:ride_detail', kwargs={'ride_id': self.ride.id}))
+        self.assertEqual(page.status_code, 200)
+        self.assertNotContains(page, 'EventSource')
+    
+    def test_unknown_ride_is_404(self):
+        """Test streams are only opened for existing rides"""
+        response = self.client.get(reverse('rides:ride_seats_stream', kwargs={'ride_id': 999999}))
+        self.assertEqual(response.status_code, 404)
+
+class ConditionalPageTest(TestCase):
+    """Test ETag revalidation of ride and booking pages"""
+    
+    def setUp(self):
+        """Set up a ride with a pending booking"""
+        self.driver = User.objects.create_user(
+            username='testdriver', password='testpass123', full_legal_name='Test Driver', is_driver=True
+        )
+        self.traveller = User.objects.create_user(
+            username='testtraveller', password='testpass123', full_legal_name='Test Traveller', is_traveller=True
+        )
+        toronto = City.objects.create(name='Toronto', province='Ontario', country='Canada')
+        ottawa = City.objects.create(name='Ottawa', province='Ontario', country='Canada')
+        route = Route.objects.create(
+            driver=self.driver, origin_city=toronto, destination_city=ottawa, driver_price=Decimal('50.00')
+        )
+        self.ride = Ride.objects.create(
+            route=route, driver=self.driver, departure_date=date.today() + timedelta(days=1),
+            departure_time=time(9, 0), available_seats=3, pickup_location='Union Station',
+            pickup_city=toronto, dropoff_location='Rideau Centre', dropoff_city=ottawa,
+            price_per_seat=Decimal('25.00')
+        )
+        self.booking = Booking.objects.create(ride=self.ride, traveller=self.traveller, seats_booked=1)
+        self.url = reverse('rides:ride_detail', kwargs={'ride_id': self.ride.id})
+    
+    def test_unchanged_ride_page_is_304(self):
+        """Test a repeat view revalidates with one query and an empty 304"""
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('Cookie', first['Vary'])
+        self.assertIn('private', first['Cache-Control'])
+        
+        with self.assertNumQueries(1):
+            repeat = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(repeat.status_code, 304)
+        self.assertEqual(repeat.content, b'')
+    
+    def test_booking_change_invalidates_ride_page(self):
+        """Test a confirmed booking changes the ride page's ETag"""
+        etag = self.client.get(self.url)['ETag']
+        self.booking.status = 'CONFIRMED'
+        self.booking.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+    
+    def test_etag_is_per_viewer(self):
+        """Test a different user never gets another viewer's cached page"""
+        anonymous_etag = self.client.get(self.url)['ETag']
+        self.client.login(username='testtraveller', password='testpass123')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=anonymous_etag)
+        self.assertEqual(response.status_code, 200)
+    
+    def test_booking_page_revalidates(self):
+        """Test the booking page is conditional for its traveller"""
+        self.client.login(username='testtraveller', password='testpass123')
+        url = reverse('rides:booking_detail', kwargs={'booking_id': self.booking.id})
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        
+        self.client.post(url, {'action': 'cancel'})
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+    
+    def test_non_participant_never_revalidates_booking_page(self):
+        """Test another user gets 403 and no validators, whatever conditional headers they send"""
+        User.objects.create_user(username='outsider', password='testpass123', full_legal_name='Out Sider')
+        self.client.login(username='testtraveller', password='testpass123')
+        url = reverse('rides:booking_detail', kwargs={'booking_id': self.booking.id})
+        etag = self.client.get(url)['ETag']
+        
+        self.client.login(username='outsider', password='testpass123')
+        response = self.client.get(
+            url, HTTP_IF_NONE_MATCH=etag, HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT'
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(response.has_header('ETag'))
+        self.assertFalse(response.has_header('Last-Modified'))
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertEqual(response.status_code, 403)
+
+class JSONAPITest(TestCase):
+    """Test the v1 JSON API: sparse fields, keyset pagination and booking actions"""
+    
+    def setUp(self):
+        """Set up a driver with five rides on one day and a logged-in traveller"""
+        self.driver = User.objects.create_user(
+            username='testdriver', password='testpass123', full_legal_name='Test Driver', is_driver=True
+        )
+        self.traveller = User.objects.create_user(
+            username='testtraveller', password='testpass123', full_legal_name='Test Traveller', is_traveller=True
+        )
+        self.toronto = City.objects.create(name='Toronto', province='Ontario', country='Canada')
+        self.ottawa = City.objects.create(name='Ottawa', province='Ontario', country='Canada')
+        route = Route.objects.create(
+            driver=self.driver, origin_city=self.toronto, destination_city=self.ottawa, driver_price=Decimal('50.00')
+        )
+        self.day = date.today() + timedelta(days=1)
+        self.rides = [
+            Ride.objects.create(
+                route=route, driver=self.driver, departure_date=self.day, departure_time=time(8 + hour, 0),
+                available_seats=3, pickup_location='Union Station', pickup_city=self.toronto,
+                dropoff_location='Rideau Centre', dropoff_city=self.ottawa,
+                price_per_seat=Decimal(40 - hour * 5)
+            )
+            for hour in range(5)
+        ]
+        self.client.login(username='testtraveller', password='testpass123')
+        self.search_url = reverse('rides:api_v1_search')
+        self.search = {'pickup_city': self.toronto.id, 'dropoff_city': self.ottawa.id, 'date': self.day.isoformat()}
+    
+    def test_requires_login(self):
+        """Test anonymous clients get 401 JSON rather than a login redirect"""
+        self.client.logout()
+        response = self.client.get(self.search_url, self.search)
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('error', response.json())
+    
+    def test_keyset_pages_cover_results_once(self):
+        """Test following `next` visits every ride once, in order, at a fixed query cost"""
+        seen, params = [], {**self.search, 'limit': 2, 'sort': 'price'}
+        while True:
+            with self.assertNumQueries(3):  # session (LocMemCache is not used for sessions), user, page
+                body = self.client.get(self.search_url, params).json()
+            seen.extend(row['id'] for row in body['data'])
+            if body['next'] is None:
+                break
+            params['cursor'] = body['next']
+        self.assertEqual(seen, [ride.id for ride in reversed(self.rides)])
+    
+    def test_sparse_fields(self):
+        """Test ?fields= returns exactly the requested keys and rejects unknown ones"""
+        body = self.client.get(self.search_url, {**self.search, 'fields': 'id,seats_left,driver_name'}).json()
+        self.assertEqual(body['data'][0], {'id': self.rides[0].id, 'seats_left': 3, 'driver_name': 'Test Driver'})
+        
+        response = self.client.get(self.search_url, {**self.search, 'fields': 'id,password'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(self.search_url, {**self.search, 'cursor': 'forged'})
+        self.assertEqual(response.status_code, 400)
+    
+    def test_ride_detail(self):
+        """Test a single ride is served with every field and 404s when missing"""
+        url = reverse('rides:api_v1_ride_detail', kwargs={'ride_id': self.rides[0].id})
+        data = self.client.get(url).json()['data']
+        self.assertEqual(data['pickup_city'], 'Toronto')
+        self.assertEqual(data['price_per_seat'], '40.00')
+        missing = reverse('rides:api_v1_ride_detail', kwargs={'ride_id': 999})
+        self.assertEqual(self.client.get(missing).status_code, 404)
+    
+    def test_ride_detail_etag_covers_fields(self):
+        """Test different ?fields= projections of one ride never revalidate each other"""
+        url = reverse('rides:api_v1_ride_detail', kwargs={'ride_id': self.rides[0].id})
+        etag = self.client.get(url, {'fields': 'id'})['ETag']
+        self.assertEqual(self.client.get(url, {'fields': 'id'}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        response = self.client.get(url, {'fields': 'id,status'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data'], {'id': self.rides[0].id, 'status': 'ACTIVE'})
+    
+    def test_my_rides_pages_rides_without_departure(self):
+        """Test rides with no departs_at are paged once each, after the dated rides"""
+        undated = self.rides[1:3]
+        Ride.objects.filter(id__in=[ride.id for ride in undated]).update(departs_at=None)
+        self.client.login(username='testdriver', password='testpass123')
+        url = reverse('rides:api_v1_my_rides')
+        seen, params = [], {'limit': 2, 'fields': 'id'}
+        while True:
+            body = self.client.get(url, params).json()
+            seen.extend(row['id'] for row in body['data'])
+            if body['next'] is None:
+                break
+            params['cursor'] = body['next']
+        dated = [self.rides[4], self.rides[3], self.rides[0]]
+        self.assertEqual(seen, [ride.id for ride in dated] + [ride.id for ride in reversed(undated)])
+    
+    def test_booking_flow(self):
+        """Test booking, a duplicate request, driver confirmation and my rides"""
+        url = reverse('rides:api_v1_create_booking', kwargs={'ride_id': self.rides[0].id})
+        response = self.client.post(url, {'seats_booked': 2})
+        self.assertEqual(response.status_code, 201)
+        booking_id = response.json()['data']['id']
+        self.assertEqual(response.json()['data']['status'], 'PENDING')
+        self.assertEqual(self.client.post(url, {'seats_booked': 1}).status_code, 409)
+        
+        confirm = reverse('rides:api_v1_update_booking', kwargs={'booking_id': booking_id, 'action': 'confirm'})
+        self.assertEqual(self.client.post(confirm).status_code, 403)
+        self.client.login(username='testdriver', password='testpass123')
+        response = self.client.post(confirm)
+        self.assertEqual(response.json()['data'], {'id': booking_id, 'status': 'CONFIRMED'})
+        self.assertEqual(self.client.post(confirm).status_code, 409)
+        
+        self.client.login(username='testtraveller', password='testpass123')
+        rows = self.client.get(reverse('rides:api_v1_my_rides')).json()['data']
+        self.assertEqual([(row['id'], row['status']) for row in rows], [(booking_id, 'CONFIRMED')])
+    
+    def test_stale_booking_is_not_confirmed_after_cancel(self):
+        """Test a driver holding a stale pending booking cannot confirm one the traveller cancelled"""
+        from .lifecycle import booking_action
+        booking = Booking.objects.create(ride=self.rides[0], traveller=self.traveller, seats_booked=2)
+        stale = Booking.objects.select_related('ride').get(pk=booking.pk)
+        self.assertIsNone(booking_action(booking, self.traveller, 'cancel'))
+        
+        self.assertEqual(booking_action(stale, self.driver, 'confirm'), 'not_pending')
+        self.assertEqual(stale.status, 'CANCELLED')
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, 'CANCELLED')
+        self.assertEqual(self.rides[0].available_seats_count, 3)
+
+@override_settings(SYNC_SETTLE_SECONDS=0)
+class SyncFeedTest(TestCase):
+    """Test the delta-sync feed returns only what changed for each user"""
+    
+    def setUp(self):
+        """Set up a ride and log in its driver"""
+        self.driver = User.objects.create_user(
+            username='testdriver', password='testpass123', full_legal_name='Test Driver', is_driver=True
+        )
+        self.traveller = User.objects.create_user(
+            username='testtraveller', password='testpass123', full_legal_name='Test Traveller', is_traveller=True
+        )
+        toronto = City.objects.create(name='Toronto', province='Ontario', country='Canada')
+        ottawa = City.objects.create(name='Ottawa', province='Ontario', country='Canada')
+        route = Route.objects.create(
+            driver=self.driver, origin_city=toronto, destination_city=ottawa, driver_price=Decimal('50.00')
+        )
+        self.ride = Ride.objects.create(
+            route=route, driver=self.driver, departure_date=date.today() + timedelta(days=1),
+            departure_time=time(9, 0), available_seats=3, pickup_location='Union Station',
+            pickup_city=toronto, dropoff_location='Rideau Centre', dropoff_city=ottawa,
+            price_per_seat=Decimal('25.00')
+        )
+        self.url = reverse('rides:api_v1_sync')
+    
+    def sync(self, username, token=None):
+        self.client.login(username=username, password='testpass123')
+        return self.client.get(self.url, {'token': token} if token else {}).json()
+    
+    def test_first_sync_then_nothing_new(self):
+        """Test a first sync returns the user's state and an idle resync returns nothing"""
+        first = self.sync('testdriver')
+        self.assertEqual([ride['id'] for ride in first['rides']], [self.ride.id])
+        self.assertFalse(first['more'])
+        
+        with self.assertNumQueries(3):  # session, user, changes
+            idle = self.client.get(self.url, {'token': first['token']}).json()
+        self.assertEqual((idle['rides'], idle['bookings'], idle['reviews']), ([], [], []))
+    
+    def test_changes_reach_both_parties(self):
+        """Test bookings and ride cancellations show up for driver and traveller"""
+        from .lifecycle import cancel_rides
+        
+        driver_token = self.sync('testdriver')['token']
+        traveller_token = self.sync('testtraveller')['token']
+        booking = Booking.objects.create(ride=self.ride, traveller=self.traveller, seats_booked=1)
+        
+        driver = self.sync('testdriver', driver_token)
+        self.assertEqual([row['id'] for row in driver['bookings']], [booking.id])
+        traveller = self.sync('testtraveller', traveller_token)
+        self.assertEqual([row['id'] for row in traveller['rides']], [self.ride.id])
+        
+        cancel_rides([self.ride.id], actor=self.driver)
+        traveller = self.sync('testtraveller', traveller['token'])
+        self.assertEqual(traveller['rides'][0]['status'], 'CANCELLED')
+        self.assertEqual(traveller['bookings'][0]['status'], 'CANCELLED')
+        
+        booking.delete()
+        traveller = self.sync('testtraveller', traveller['token'])
+        self.assertEqual(traveller['bookings'], [])
+    
+    def test_deleted_objects_are_reported(self):
+        """Test deleting a ride lists it and its cascaded bookings as deleted for both parties"""
+        booking = Booking.objects.create(ride=self.ride, traveller=self.traveller, seats_booked=1)
+        driver_token = self.sync('testdriver')['token']
+        traveller_token = self.sync('testtraveller')['token']
+        
+        ride_id = self.ride.id
+        self.ride.delete()
+        for username, token in (('testdriver', driver_token), ('testtraveller', traveller_token)):
+            body = self.sync(username, token)
+            self.assertEqual((body['rides'], body['bookings']), ([], []))
+            self.assertEqual(body['deleted']['rides'], [ride_id])
+            self.assertEqual(body['deleted']['bookings'], [booking.id])
+    
+    def test_token_is_bound_to_user(self):
+        """Test another user's or a forged token is refused"""
+        token = self.sync('testdriver')['token']
+        self.client.login(username='testtraveller', password='testpass123')
+        self.assertEqual(self.client.get(self.url, {'token': token}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'token': 'forged'}).status_code, 400)
+    
+    def test_recent_changes_wait_to_settle(self):
+        """Test changes younger than SYNC_SETTLE_SECONDS are left for the next sync"""
+        token = self.sync('testdriver')['token']
+        self.ride.notes = 'Bring snacks'
+        self.ride.save()
+        with self.settings(SYNC_SETTLE_SECONDS=60):
+            self.assertEqual(self.sync('testdriver', token)['rides'], [])
+        self.assertEqual(self.sync('testdriver', token)['rides'][0]['notes'], 'Bring snacks')
+
+class RideSeriesTest(TestCase):
+    """Test recurring rides are created, edited and cancelled as a set"""
+    
+    def setUp(self):
+        """Set up a commuter driver and a route"""
+        self.driver = User.objects.create_user(
+            username='testdriver', password='testpass123', full_legal_name='Test Driver', is_driver=True
+        )
+        self.traveller = User.objects.create_user(
+            username='testtraveller', password='testpass123', full_legal_name='Test Traveller', is_traveller=True
+        )
+        self.barrie = City.objects.create(name='Barrie', province='Ontario', country='Canada')
+        self.toronto = City.objects.create(name='Toronto', province='Ontario', country='Canada')
+        today = date.today()
+        self.monday = today + timedelta(days=7 - today.weekday())
+    
+    def create(self, weeks=2, **overrides):
+        from .series import create_series
+        
+        options = dict(
+            pickup_city=self.barrie, dropoff_city=self.toronto,
+            pickup_location='Barrie GO', dropoff_location='Union Station',
+            weekdays=[0, 1, 2, 3, 4], start_date=self.monday,
+            end_date=self.monday + timedelta(weeks=weeks, days=-1),
+            departure_time=time(7, 30), available_seats=3, price_per_seat=Decimal('15.00'),
+        )
+        options.update(overrides)
+        return create_series(self.driver, **options)
+    
+    def test_create_from_form(self):
+        """Test a two-week weekday pattern creates ten linked rides with departs_at set"""
+        self.client.login(username='testdriver', password='testpass123')
+        response = self.client.post(reverse('rides:create_ride_series'), {
+            'pickup_city': self.barrie.id, 'dropoff_city': self.toronto.id,
+            'pickup_location': 'Barrie GO', 'dropoff_location': 'Union Station',
+            'weekdays': ['0', '1', '2', '3', '4'], 'start_date': self.monday.isoformat(),
+            'end_date': (self.monday + timedelta(days=13)).isoformat(),
+            'departure_time': '07:30', 'available_seats': '3', 'price_per_seat': '15.00',
+        })
+        series = RideSeries.objects.get()
+        self.assertRedirects(response, reverse('rides:series_detail', kwargs={'series_id': series.id}))
+        
+        rides = list(series.rides.order_by('departs_at'))
+        self.assertEqual(len(rides), 10)
+        self.assertTrue(all(ride.departure_date.weekday() < 5 for ride in rides))
+        self.assertEqual(rides[0].departs_at, combine_departure(self.monday, time(7, 30)))
+        self.assertEqual(RideEvent.objects.filter(event_type='RIDE_CREATED', ride__series=series).count(), 10)
+    
+    def test_creation_cost_does_not_grow_with_rides(self):
+        """Test a long series runs the same statements as a short one"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        self.create(weeks=1, weekdays=[5])  # creates the route
+        with CaptureQueriesContext(connection) as short:
+            self.create(weeks=1)
+        with CaptureQueriesContext(connection) as long:
+            self.create(weeks=8, departure_time=time(18, 0))
+        self.assertEqual(len(long), len(short))
+    
+    def test_overlap_rejects_whole_series(self):
+        """Test one clash with an existing ride creates none of the series"""
+        _, rides = self.create(weeks=1)
+        with self.assertRaises(ValidationError):
+            self.create(weeks=2, departure_time=time(8, 0))
+        self.assertEqual(Ride.objects.count(), len(rides))
+        
+        # Three hours later (the default duration) no longer overlaps
+        _, later = self.create(weeks=2, departure_time=time(10, 30))
+        self.assertEqual(len(later), 10)
+    
+    def test_departed_dates_are_skipped(self):
+        """Test a series starting today leaves out today once its departure time has passed"""
+        now = combine_departure(self.monday, time(9, 0))
+        _, rides = self.create(weeks=1, departure_time=time(7, 30), now=now)
+        self.assertEqual([ride.departure_date for ride in rides],
+                         [self.monday + timedelta(days=n) for n in range(1, 5)])
+        
+        with self.assertRaises(ValidationError):
+            self.create(weeks=1, weekdays=[0], departure_time=time(8, 0), now=now)
+    
+    def test_edit_and_cancel_series(self):
+        """Test edits and cancellation reach every upcoming ride and its bookings"""
+        from .series import cancel_series, update_series
+        
+        series, rides = self.create(weeks=1)
+        booking = Booking.objects.create(ride=rides[2], traveller=self.traveller, seats_booked=1)
+        
+        self.assertEqual(update_series(series, price_per_seat=Decimal('12.00')), 5)
+        self.assertEqual(set(series.rides.values_list('price_per_seat', flat=True)), {Decimal('12.00')})
+        
+        # A new pickup address is geocoded again for every upcoming ride
+        from jobs.models import Job
+        Job.objects.all().delete()
+        update_series(series, pickup_location='Yorkdale Mall')
+        jobs = Job.objects.filter(name='rides.geocode_ride_addresses')
+        self.assertEqual(sorted(i for job in jobs for i in job.payload['ride_ids']), sorted(ride.id for ride in rides))
+        
+        self.assertEqual(cancel_series(series, actor=self.driver), 5)
+        self.assertEqual(set(series.rides.values_list('status', flat=True)), {'CANCELLED'})
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, 'CANCELLED')
+        series.refresh_from_db()
+        self.assertEqual(series.status, 'CANCELLED')
+    
+    def test_only_driver_manages_series(self):
+        """Test other users cannot view or cancel a series"""
+        series, _ = self.create(weeks=1)
+        self.client.login(username='testtraveller', password='testpass123')
+        self.assertEqual(self.client.get(reverse('rides:series_detail', kwargs={'series_id': series.id})).status_code, 403)
+        self.assertEqual(self.client.post(reverse('rides:cancel_ride_series', kwargs={'series_id': series.id})).status_code, 403)
+        
+        self.client.login(username='testdriver', password='testpass123')
+        response = self.client.get(reverse('rides:series_detail', kwargs={'series_id': series.id}))
+        self.assertContains(response, 'Edit All Upcoming Rides')
+
+class RideImportTest(TestCase):
+    """Test bulk ride import from CSV and JSON"""
+    
+    HEADER = 'pickup_city,pickup_location,dropoff_city,dropoff_location,departure_date,departure_time,available_seats,price_per_seat\n'
+    
+    def setUp(self):
+        """Set up a fleet driver and two cities"""
+        self.driver = User.objects.create_user(
+            username='fleet', password='testpass123', full_legal_name='Fleet Operator', is_driver=True
+        )
+        City.objects.create(name='Barrie', province='Ontario', country='Canada')
+        City.objects.create(name='Toronto', province='Ontario', country='Canada')
+        self.day = (date.today() + timedelta(days=3)).isoformat()
+        self.past = (date.today() - timedelta(days=1)).isoformat()
+    
+    def csv_file(self, *rows):
+        import io
+        return io.BytesIO((self.HEADER + ''.join(row + '\n' for row in rows)).encode())
+    
+    def test_csv_import_reports_bad_rows(self):
+        """Test valid rows are inserted with events and each bad row is reported by number"""
+        from .imports import import_rides
+        
+        report = import_rides(self.csv_file(
+            f'barrie,Barrie GO,Toronto,Union Station,{self.day},07:30,3,15.00',
+            f'Barrie,Barrie GO,Atlantis,Harbour,{self.day},07:30,3,15.00',
+            f'Barrie,Barrie GO,Toronto,Union Station,{self.past},07:30,3,15.00',
+            f'Barrie,Barrie GO,Barrie,Downtown,{self.day},07:30,3,15.00',
+            f'Barrie,Barrie GO,Toronto,Union Station,{self.day},08:30,12,15.00',
+            f'Toronto,Union Station,Barrie,Barrie GO,{self.day},17:30,3,15.00',
+        ), driver=self.driver, batch_size=1)
+        
+        self.assertEqual((report.rows, report.created, report.failed), (6, 2, 4))
+        self.assertEqual([number for number, _ in report.errors], [3, 4, 5, 6])
+        self.assertIn('Atlantis', report.errors[0][1][0])
+        
+        ride = Ride.objects.get(departure_time=time(7, 30))
+        self.assertEqual(ride.departs_at, combine_departure(date.fromisoformat(self.day), time(7, 30)))
+        self.assertEqual(RideEvent.objects.filter(event_type='RIDE_CREATED').count(), 2)
+        self.assertEqual(Route.objects.count(), 2)
+    
+    def test_json_is_streamed(self):
+        """Test JSON arrays and JSON Lines decode across read boundaries"""
+        import io
+        from .imports import iter_json
+        
+        rows = [{'n': i, 'text': 'x' * i} for i in range(20)]
+        self.assertEqual(list(iter_json(io.StringIO(json.dumps(rows)), read_size=7)), rows)
+        lines = '\n'.join(json.dumps(row) for row in rows)
+        self.assertEqual(list(iter_json(io.StringIO(lines), read_size=5)), rows)
+    
+    def test_stopped_import_can_be_resumed(self):
+        """Test rows before a parse error are imported, and the error names the row to resume from"""
+        import io
+        from .imports import ImportStopped, import_rides, iter_json
+        
+        with self.assertRaises(ValueError):
+            list(iter_json(io.StringIO('[{"a": "' + 'x' * 100), read_size=10, max_object_size=50))
+        
+        rows = [
+            {'pickup_city': 'Barrie', 'pickup_location': 'GO', 'dropoff_city': 'Toronto', 'dropoff_location': 'Union',
+             'departure_date': self.day, 'departure_time': f'0{hour}:00', 'available_seats': 4, 'price_per_seat': 12}
+            for hour in range(4)
+        ]
+        text = '\n'.join(json.dumps(row) for row in rows)
+        broken = text.replace('"03:00"', '"03:00', 1)
+        with self.assertRaises(ImportStopped) as stopped:
+            import_rides(io.BytesIO(broken.encode()), 'json', driver=self.driver, batch_size=2)
+        self.assertEqual(stopped.exception.next_row, 4)
+        self.assertEqual(stopped.exception.report.created, 3)
+        self.assertEqual(Ride.objects.count(), 3)
+        
+        report = import_rides(io.BytesIO(text.encode()), 'json', driver=self.driver, start_row=4)
+        self.assertEqual((report.rows, report.created), (1, 1))
+        self.assertEqual(Ride.objects.count(), 4)
+    
+    def test_json_rows_with_driver_column_and_dry_run(self):
+        """Test rows name their driver, and a dry run creates nothing"""
+        import io
+        from .imports import import_rides
+        
+        rows = [
+            {'driver': 'fleet', 'pickup_city': 'Barrie', 'pickup_location': 'GO', 'dropoff_city': 'Toronto',
+             'dropoff_location': 'Union', 'departure_date': self.day, 'departure_time': '06:00',
+             'available_seats': 4, 'price_per_seat': 12},
+            {'driver': 'nobody', 'pickup_city': 'Barrie', 'pickup_location': 'GO', 'dropoff_city': 'Toronto',
+             'dropoff_location': 'Union', 'departure_date': self.day, 'departure_time': '06:00',
+             'available_seats': 4, 'price_per_seat': 12},
+        ]
+        report = import_rides(io.BytesIO(json.dumps(rows).encode()), 'json', dry_run=True)
+        self.assertEqual((report.created, report.failed), (1, 1))
+        self.assertFalse(Ride.objects.exists())
+        
+        report = import_rides(io.BytesIO(json.dumps(rows).encode()), 'json')
+        self.assertEqual(Ride.objects.get().driver, self.driver)
+    
+    def test_parallel_validation_matches_inline(self):
+        """Test rows validated in worker processes give the same report"""
+        from .imports import import_rides
+        
+        rows = [f'Barrie,Barrie GO,Toronto,Union Station,{self.day},{hour:02d}:00,3,15.00' for hour in range(24)]
+        rows[5] = rows[5].replace('Toronto', 'Nowhere')
+        report = import_rides(self.csv_file(*rows), driver=self.driver, workers=2, chunk_size=5, dry_run=True)
+        self.assertEqual((report.rows, report.created, [n for n, _ in report.errors]), (24, 23, [7]))
+    
+    def test_command_and_admin_upload(self):
+        """Test the management command writes an error file and the admin accepts uploads"""
+        import os
+        import tempfile
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.core.management import call_command
+        
+        with tempfile.TemporaryDirectory() as directory:
+            path, errors = os.path.join(directory, 'rides.csv'), os.path.join(directory, 'errors.csv')
+            with open(path, 'wb') as f:
+                f.write(self.csv_file(f'Barrie,GO,Toronto,Union,{self.day},07:00,3,15', 'bad,row').read())
+            call_command('import_rides', path, driver='fleet', workers=1, errors=errors, stdout=io_sink())
+            with open(errors) as f:
+                self.assertEqual(len(f.read().splitlines()), 2)
+        self.assertEqual(Ride.objects.count(), 1)
+        
+        User.objects.create_superuser(username='admin', password='testpass123', full_legal_name='Admin')
+        self.client.login(username='admin', password='testpass123')
+        upload = SimpleUploadedFile('rides.csv', self.csv_file(f'Barrie,GO,Toronto,Union,{self.day},09:00,3,15').read())
+        response = self.client.post(reverse('admin:rides_ride_import'), {'file': upload, 'driver': self.driver.id})
+        self.assertRedirects(response, reverse('admin:rides_ride_changelist'))
+        self.assertEqual(Ride.objects.count(), 2)
+
+
+def io_sink():
+    import io
+    return io.StringIO()
+
+
+class CityLoaderTest(TestCase):
+    """Test loading cities from a data file with one bulk upsert"""
+    
+    def load(self, text, **kwargs):
+        import io
+        from .citydata import load_cities
+        return load_cities(io.BytesIO(text.encode()), **kwargs)
+    
+    def test_upsert_and_dry_run_diff(self):
+        """Test new places are created, changed ones updated and the rest left alone"""
+        City.objects.create(name='Barrie', latitude=Decimal('44.389400'), longitude=Decimal('-79.690300'))
+        City.objects.create(name='Toronto', latitude=Decimal('43.653226'), longitude=Decimal('-79.383184'))
+        data = (
+            'name,latitude,longitude,is_active\n'
+            'Barrie,44.3894,-79.6903,false\n'
+            'Toronto,43.6532264,-79.3831843,\n'
+            'Orillia,44.608400,-79.419700,\n'
+            'Orillia,44.6,-79.4,\n'
+            'Nowhere,95,-79.4,\n'
+        )
+        
+        report = self.load(data, dry_run=True)
+        self.assertEqual([city['name'] for city in report.created], ['Orillia'])
+        self.assertEqual([(city['name'], changes) for city, changes in report.updated],
+                         [('Barrie', {'is_active': (True, False)})])
+        self.assertEqual(report.unchanged, 1)
+        self.assertEqual([number for number, _ in report.errors], [5, 6])
+        self.assertFalse(City.objects.filter(name='Orillia').exists())
+        
+        with self.assertNumQueries(4):  # read cities, savepoint, one upsert, release
+            self.load(data)
+        self.assertFalse(City.objects.get(name='Barrie').is_active)
+        orillia = City.objects.get(name='Orillia')
+        self.assertEqual((orillia.latitude, orillia.province), (Decimal('44.608400'), 'Ontario'))
+        self.assertEqual(self.load(data, dry_run=True).unchanged, 3)
+    
+    def test_missing_columns_keep_existing_values(self):
+        """Test columns a file leaves out or blank are not reset to the defaults"""
+        City.objects.create(name='Gatineau', province='Quebec', is_active=False)
+        City.objects.create(name='Barrie', province='Ontario', is_active=False)
+        
+        report = self.load('name,latitude,longitude\nGatineau,45.4765,-75.7013\n')
+        self.assertEqual(list(report.updated[0][1]), ['latitude', 'longitude'])
+        report = self.load('name,province,is_active\nBarrie,,\n')
+        self.assertEqual((report.unchanged, report.updated), (1, []))
+        self.load('[{"name": "Barrie", "is_active": false, "province": "Ontario"}]', fmt='json')
+        
+        gatineau = City.objects.get(name='Gatineau')
+        self.assertEqual((gatineau.province, gatineau.is_active, gatineau.latitude),
+                         ('Quebec', False, Decimal('45.476500')))
+        self.assertFalse(City.objects.get(name='Barrie').is_active)
+    
+    def test_bundled_file_and_json(self):
+        """Test the command loads the bundled list and JSON files parse the same way"""
+        from django.core.management import call_command
+        
+        call_command('load_cities', stdout=io_sink())
+        self.assertGreater(City.objects.filter(province='Ontario').count(), 50)
+        
+        report = self.load('[{"name": "Toronto", "latitude": 43.7, "longitude": -79.4}, {"name": "Moosonee"}]',
+                           fmt='json')
+        self.assertEqual([city['name'] for city in report.created], ['Moosonee'])
+        self.assertEqual(list(report.updated[0][1]), ['latitude', 'longitude'])
+
+
+class GeocodingTest(TestCase):
+    """Test the geocoding pipeline against a local stub of the provider"""
+    
+    def setUp(self):
+        """Start a stub geocoder and give each test its own cache file"""
+        import os
+        import tempfile
+        from .geocode_stub import StubGeocoder
+        self.stub = StubGeocoder({
+            'Barrie': (44.389355, -79.690331, 'Ontario'),
+            'Orillia': (44.608246, -79.419678, 'Ontario'),
+            'Kingston': (44.231172, -76.485954, 'Ontario'),
+            'Moncton': (46.087817, -64.778231, 'New Brunswick'),
+        }, failures={'Kingston': 1}).start()
+        self.addCleanup(self.stub.stop)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache_path = os.path.join(directory.name, 'cache.jsonl')
+    
+    def run_pipeline(self, names, **kwargs):
+        from .geocoding import GeocodeCache, NominatimProvider, Place, geocode_cities
+        cache = GeocodeCache(self.cache_path)
+        try:
+            return geocode_cities(
+                [Place(name, 'Ontario', 'Canada') for name in names], NominatimProvider(self.stub.url),
+                cache, rate=1000, workers=3, backoff=0, **kwargs,
+            )
+        finally:
+            cache.close()
+    
+    def test_lookups_are_upserted_and_cached(self):
+        """Test answers land in City and a rerun is served from the cache"""
+        City.objects.create(name='Barrie')
+        names = ['Barrie', 'Orillia', 'Kingston', 'Moncton', 'Atlantis']
+        
+        report = self.run_pipeline(names, batch_size=2)
+        self.assertEqual((report.found, sorted(report.not_found), report.failed), (3, ['Atlantis', 'Moncton'], []))
+        self.assertEqual(len(self.stub.queries), 6)  # Kingston was retried once
+        barrie = City.objects.get(name='Barrie')
+        self.assertEqual((barrie.latitude, barrie.longitude), (Decimal('44.389355'), Decimal('-79.690331')))
+        self.assertEqual(City.objects.get(name='Orillia').province, 'Ontario')
+        self.assertFalse(City.objects.filter(name__in=['Moncton', 'Atlantis']).exists())
+        
+        report = self.run_pipeline([' barrie ', 'Orillia', 'Atlantis', 'Guelph'])
+        self.assertEqual((report.cached, report.found), (3, 2))
+        self.assertEqual(self.stub.queries[6:], ['Guelph, Ontario, Canada'])
+    
+    def test_failures_are_not_cached(self):
+        """Test a place the provider keeps failing on is reported and asked again next run"""
+        self.stub.failures['kingston'] = 10
+        report = self.run_pipeline(['Kingston', 'Orillia'], retries=1)
+        self.assertEqual([name for name, _ in report.failed], ['Kingston'])
+        self.assertEqual(report.written, 1)
+        
+        self.stub.failures['kingston'] = 0
+        report = self.run_pipeline(['Kingston', 'Orillia'])
+        self.assertEqual((report.cached, report.found, report.failed), (1, 2, []))
+        self.assertTrue(City.objects.filter(name='Kingston', latitude__isnull=False).exists())
+    
+    def test_rate_limiter_spaces_calls(self):
+        """Test calls are spaced by the rate, however many arrive at once"""
+        from .geocoding import RateLimiter
+        now, slept = [100.0], []
+        limiter = RateLimiter(4, clock=lambda: now[0], sleep=slept.append)
+        for _ in range(3):
+            limiter.wait()
+        self.assertEqual(slept, [0.25, 0.5])
+    
+    def test_command_geocodes_cities_missing_coordinates(self):
+        """Test the command looks up only cities without coordinates by default"""
+        from django.core.management import call_command
+        City.objects.create(name='Orillia')
+        City.objects.create(name='Barrie', latitude=Decimal('44.0'), longitude=Decimal('-79.0'))
+        
+        call_command('geocode_cities', url=self.stub.url, cache=self.cache_path, rate=1000, stdout=io_sink())
+        self.assertEqual(self.stub.queries, ['Orillia, Ontario, Canada'])
+        self.assertEqual(City.objects.get(name='Orillia').latitude, Decimal('44.608246'))
+
+
+class GazetteerTest(TestCase):
+    """Test the offline gazetteer and location validation built on it"""
+    
+    def setUp(self):
+        from .gazetteer import get_gazetteer
+        self.gazetteer = get_gazetteer()
+    
+    def test_lookup_by_name_alias_and_free_text(self):
+        """Test places resolve by name, alias and inside longer text, without queries"""
+        g = self.gazetteer
+        with self.assertNumQueries(0):
+            self.assertEqual(g.name(g.lookup('port hope')), 'Port Hope')
+            self.assertEqual(g.name(g.lookup('Orleans')), 'Orléans')
+            self.assertEqual(g.name(g.lookup('Sault Ste Marie')), 'Sault Ste. Marie')
+            self.assertEqual(g.name(g.find('123 King St, Toronto, ON M5H 2N2')), 'Toronto')
+            self.assertEqual(g.name(g.find('University of Toronto')), 'Toronto')
+            self.assertEqual(g.name(g.find('Hamilton ON')), 'Hamilton')
+            self.assertEqual(g.name(g.municipality(g.lookup('Scarborough'))), 'Toronto')
+            self.assertIsNone(g.find('Atlantis, Ontario'))
+            self.assertTrue(g.outside_ontario('Montreal, Quebec'))
+            self.assertFalse(g.outside_ontario('Huntsville, ON'))
+        
+        latitude, longitude = g.coordinates(g.lookup('Huntsville'))
+        self.assertAlmostEqual(latitude, 45.3269, places=3)
+        self.assertAlmostEqual(longitude, -79.2183, places=3)
+        stats = g.stats()
+        self.assertEqual(stats['places'], len(g))
+        self.assertGreater(stats['bytes'], 0)
+        self.assertIsNotNone(stats['load_ms'])
+    
+    def test_validation_maps_places_to_serving_city(self):
+        """Test a place is served by itself, its municipality or a nearby city, in one query"""
+        from rides.views import validate_ontario_location
+        City.objects.create(name='Toronto', latitude=Decimal('43.653226'), longitude=Decimal('-79.383184'))
+        City.objects.create(name='Cobourg', latitude=Decimal('43.959732'), longitude=Decimal('-78.166435'))
+        
+        with self.assertNumQueries(1):
+            is_valid, city, error = validate_ontario_location('Scarborough, ON')
+        self.assertEqual((is_valid, city.name, error), (True, 'Toronto', None))
+        self.assertEqual(validate_ontario_location('Port Hope')[1].name, 'Cobourg')
+        
+        is_valid, city, error = validate_ontario_location('Huntsville, Ontario')
+        self.assertEqual((is_valid, city), (False, None))
+        self.assertIn('Huntsville', error)
+        City.objects.create(name='Huntsville')
+        self.assertEqual(validate_ontario_location('Huntsville, Ontario')[1].name, 'Huntsville')
+    
+    def test_gazetteer_geocoding_provider(self):
+        """Test the gazetteer answers geocoding offline"""
+        from .geocoding import GazetteerProvider, Place
+        provider = GazetteerProvider()
+        location = provider.geocode(Place('Port Hope', 'Ontario', 'Canada'))
+        self.assertEqual((round(location.latitude, 2), location.province), (43.95, 'Ontario'))
+        self.assertIsNone(provider.geocode(Place('Port Hope', 'Quebec', 'Canada')))
+
+
+class AddressGeocodingTest(TestCase):
+    """Test server-side geocoding of ride addresses through the cache table"""
+    
+    def setUp(self):
+        from . import addresses
+        addresses.cache.clear()
+        self.addCleanup(addresses.cache.clear)
+        self.driver = User.objects.create_user(
+            username='geodriver', password='testpass123', full_legal_name='Geo Driver', is_driver=True
+        )
+        self.toronto = City.objects.create(name='Toronto', latitude=Decimal('43.653226'), longitude=Decimal('-79.383184'))
+        self.barrie = City.objects.create(name='Barrie', latitude=Decimal('44.389355'), longitude=Decimal('-79.690331'))
+        self.route = Route.objects.create(driver=self.driver, origin_city=self.barrie, destination_city=self.toronto,
+                                          driver_price=Decimal('20.00'))
+    
+    def create_ride(self, pickup='Barrie GO Station', dropoff='Union Station'):
+        return Ride.objects.create(
+            route=self.route, driver=self.driver, departure_date=date.today() + timedelta(days=1),
+            departure_time=time(8, 0), available_seats=3, price_per_seat=Decimal('20.00'),
+            pickup_city=self.barrie, pickup_location=pickup, dropoff_city=self.toronto, dropoff_location=dropoff,
+        )
+    
+    def run_jobs(self):
+        from jobs.queue import Worker
+        Worker(pool='inline').run(once=True)
+    
+    def test_normalized_addresses_share_a_key(self):
+        """Test spelling, case and a repeated city do not change the key"""
+        from .addresses import normalize_address
+        self.assertEqual(normalize_address('123 King Street West', 'Toronto'),
+                         normalize_address('123 king st. w, Toronto, ON', 'Toronto'))
+        self.assertNotEqual(normalize_address('Main Street', 'Barrie'), normalize_address('Main Street', 'Toronto'))
+    
+    def test_new_rides_get_coordinates_from_the_job(self):
+        """Test creating a ride queues geocoding and the job stores coordinates on it"""
+        from jobs.models import Job
+        from .addresses import lookup_address
+        ride = self.create_ride()
+        self.assertIsNone(ride.pickup_latitude)
+        self.assertTrue(Job.objects.filter(name='rides.geocode_ride_addresses').exists())
+        changes = SyncChange.objects.filter(user=self.driver, kind='RIDE', object_id=ride.id)
+        logged = changes.count()
+        
+        self.run_jobs()
+        ride.refresh_from_db()
+        self.assertAlmostEqual(float(ride.dropoff_latitude), 43.653226, places=5)
+        self.assertEqual(changes.count(), logged + 1)  # Sync clients fetch the coordinates
+        self.assertAlmostEqual(float(ride.dropoff_longitude), -79.383184, places=5)
+        self.assertAlmostEqual(float(ride.pickup_latitude), 44.389355, places=5)
+        self.assertEqual(GeocodedAddress.objects.count(), 2)
+        
+        lookup_address('Union Station', 'Toronto')
+        with self.assertNumQueries(0):
+            self.assertEqual(lookup_address('union station, Toronto', 'Toronto')[0], ride.dropoff_latitude)
+        self.assertIsNone(lookup_address('Nowhere Road', 'Toronto'))
+    
+    def test_changed_address_is_geocoded_again(self):
+        """Test saving a ride with a new address (e.g. in the admin) queues geocoding, other edits do not"""
+        from jobs.models import Job
+        ride = self.create_ride()
+        self.run_jobs()
+        
+        ride = Ride.objects.get(pk=ride.pk)
+        ride.notes = 'Bring snacks'
+        ride.save()
+        self.assertFalse(Job.objects.exists())
+        
+        ride.dropoff_city = self.barrie
+        ride.dropoff_location = 'Georgian Mall'
+        ride.save()
+        self.assertEqual(Job.objects.get().payload, {'ride_ids': [ride.id]})
+        self.run_jobs()
+        ride.refresh_from_db()
+        self.assertAlmostEqual(float(ride.dropoff_latitude), 44.389355, places=5)
+    
+    def test_street_level_provider_and_cache_hits(self):
+        """Test a network provider is asked once per address and misses fall back to the city"""
+        from . import addresses
+        from .addresses import geocode_rides
+        from .geocode_stub import StubGeocoder
+        stub = StubGeocoder({'Union Station': (43.645474, -79.380922, 'Ontario')}).start()
+        self.addCleanup(stub.stop)
+        addresses._limiter = None
+        self.addCleanup(setattr, addresses, '_limiter', None)
+        
+        with override_settings(ADDRESS_GEOCODER='nominatim', GEOCODING_URL=stub.url, GEOCODING_RATE=1000):
+            first, second = self.create_ride(), self.create_ride(pickup='Barrie GO station')
+            geocode_rides([first.id, second.id])
+            self.assertEqual(len(stub.queries), 2)
+            first.refresh_from_db()
+            self.assertEqual(first.dropoff_latitude, Decimal('43.645474'))
+            self.assertEqual(first.pickup_latitude, self.barrie.latitude)  # Unknown to the stub
+            
+            addresses.cache.clear()
+            geocode_rides([self.create_ride().id])
+            self.assertEqual(len(stub.queries), 2)
+    
+    def test_lru_evicts_least_recently_used(self):
+        """Test the in-process front keeps the most recently used entries"""
+        from .addresses import LRUCache
+        lru = LRUCache(2)
+        lru.put('a', 1)
+        lru.put('b', 2)
+        lru.get('a')
+        lru.put('c', 3)
+        self.assertEqual((lru.get('a'), lru.get('b'), lru.get('c')), (1, None, 3))
+
+
+class NearbySearchTest(TestCase):
+    """Test radius search over geohashed pickup and drop-off points"""
+    
+    def setUp(self):
+        self.driver = User.objects.create_user(
+            username='neardriver', password='testpass123', full_legal_name='Near Driver', is_driver=True
+        )
+        User.objects.create_user(username='neartraveller', password='testpass123', is_traveller=True)
+        self.toronto = City.objects.create(name='Toronto', latitude=Decimal('43.653226'), longitude=Decimal('-79.383184'))
+        self.ottawa = City.objects.create(name='Ottawa', latitude=Decimal('45.421530'), longitude=Decimal('-75.697193'))
+        self.route = Route.objects.create(driver=self.driver, origin_city=self.toronto, destination_city=self.ottawa,
+                                          driver_price=Decimal('50.00'))
+        self.day = date.today() + timedelta(days=1)
+        self.client.login(username='neartraveller', password='testpass123')
+        self.url = reverse('rides:api_v1_nearby')
+    
+    def create_ride(self, pickup, hour=8, dropoff=(45.4215, -75.6972), **kwargs):
+        return Ride.objects.create(
+            route=self.route, driver=self.driver, departure_date=self.day, departure_time=time(hour, 0),
+            available_seats=3, price_per_seat=Decimal('40.00'),
+            pickup_city=self.toronto, pickup_location='Somewhere', dropoff_city=self.ottawa, dropoff_location='There',
+            pickup_latitude=Decimal(str(pickup[0])), pickup_longitude=Decimal(str(pickup[1])),
+            dropoff_latitude=Decimal(str(dropoff[0])), dropoff_longitude=Decimal(str(dropoff[1])), **kwargs
+        )
+    
+    def test_geohash_cells_and_ranges(self):
+        """Test encoding, and that covering cells' ranges contain the points in the box"""
+        from .geo import bounding_box, covering_cells, encode, prefix_range
+        self.assertEqual(encode(57.64911, 10.40744, 11), 'u4pruydqqvj')
+        point = encode(43.6453, -79.3806)
+        cells = covering_cells(*bounding_box(43.6453, -79.3806, 10), max_cells=16)
+        self.assertLessEqual(len(cells), 16)
+        self.assertTrue(any(prefix_range(cell)[0] <= point < prefix_range(cell)[1] for cell in cells))
+        
+        ride = self.create_ride((43.6453, -79.3806))
+        self.assertEqual(ride.pickup_geohash, point)
+        ride.pickup_latitude, ride.pickup_longitude = Decimal('45.4215'), Decimal('-75.6972')
+        ride.save(update_fields=['pickup_latitude', 'pickup_longitude'])
+        ride.refresh_from_db()
+        self.assertEqual(ride.pickup_geohash, encode(45.4215, -75.6972))
+    
+    def test_radius_search_refines_and_ranks(self):
+        """Test only pickups inside the circle are returned, ranked by departure and distance"""
+        from .models import combine_departure
+        from .nearby import nearby_rides
+        close_late = self.create_ride((43.6500, -79.3800), hour=10)           # ~0.5 km
+        farther_early = self.create_ride((43.6600, -79.4000), hour=8)         # ~2.3 km
+        self.create_ride((43.7731, -79.2578))                                 # Scarborough, ~17 km
+        self.create_ride((43.5890, -79.6441))                                 # Mississauga, ~22 km
+        self.create_ride((43.6510, -79.3810), status='CANCELLED')
+        
+        start = combine_departure(self.day, time.min)
+        with self.assertNumQueries(1):
+            matches = nearby_rides((43.6453, -79.3806), 10, start=start)
+        self.assertEqual([match.ride_id for match in matches], [farther_early.id, close_late.id])
+        self.assertAlmostEqual(matches[1].pickup_km, 0.53, places=1)
+        
+        matches = nearby_rides((43.6453, -79.3806), 25, dropoff=(43.6453, -79.3806), start=start)
+        self.assertEqual(matches, [])
+    
+    def test_nearby_endpoint(self):
+        """Test the API by coordinates and by place name, with drop-off filtering and distances"""
+        near = self.create_ride((43.6500, -79.3800))
+        self.create_ride((43.6510, -79.3810), dropoff=(44.3894, -79.6903))   # To Barrie
+        
+        response = self.client.get(self.url, {
+            'lat': '43.6453', 'lon': '-79.3806', 'dropoff_near': 'Ottawa', 'date': self.day.isoformat(),
+            'fields': 'id,pickup_city',
+        })
+        self.assertEqual(response.status_code, 200)
+        [row] = response.json()['data']
+        self.assertEqual((row['id'], row['pickup_city']), (near.id, 'Toronto'))
+        self.assertLess(row['distance_km'], 1)
+        self.assertLess(row['dropoff_distance_km'], 1)
+        
+        response = self.client.get(self.url, {'near': 'Toronto', 'radius_km': '5'})
+        self.assertEqual(len(response.json()['data']), 2)
+        
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'near': 'Atlantis'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'lat': '43.6', 'lon': '-79.4', 'radius_km': '500'}).status_code, 400)
+    
+    def test_nearby_skips_rides_gone_since_the_match(self):
+        """Test a matched ride deleted before its details are read is left out rather than a 500"""
+        from unittest import mock
+        from .nearby import nearby_rides
+        ride = self.create_ride((43.6500, -79.3800))
+        gone = self.create_ride((43.6510, -79.3810))
+        
+        def match_then_delete(*args, **kwargs):
+            matches = nearby_rides(*args, **kwargs)
+            gone.delete()
+            return matches
+        with mock.patch('rides.api.nearby_rides', match_then_delete):
+            response = self.client.get(self.url, {'lat': '43.6453', 'lon': '-79.3806'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.json()['data']], [ride.id])
+
+
+class SpatialQueryTest(TestCase):
+    """Test geohash columns on City and the bbox, radius and k-nearest queries over them"""
+    
+    PLACES = {
+        'Toronto': (43.653226, -79.383184),
+        'Mississauga': (43.589045, -79.644120),
+        'Brampton': (43.731548, -79.762418),
+        'Hamilton': (43.255721, -79.871102),
+        'Barrie': (44.389355, -79.690331),
+        'Ottawa': (45.421530, -75.697193),
+    }
+    
+    def setUp(self):
+        for name, (latitude, longitude) in self.PLACES.items():
+            City.objects.create(name=name, latitude=Decimal(str(latitude)), longitude=Decimal(str(longitude)))
+    
+    def test_geohash_columns_follow_coordinates(self):
+        """Test save(), save(update_fields=...) and the bulk upsert all keep the geohashes in sync"""
+        from .citydata import upsert_cities
+        from .geo import encode
+        toronto = City.objects.get(name='Toronto')
+        self.assertEqual(toronto.geohash, encode(43.653226, -79.383184))
+        self.assertEqual((toronto.geohash_4, toronto.geohash_6), (toronto.geohash[:4], toronto.geohash[:6]))
+        
+        toronto.latitude, toronto.longitude = Decimal('45.0'), Decimal('-75.0')
+        toronto.save(update_fields=['latitude', 'longitude'])
+        self.assertEqual(City.objects.get(name='Toronto').geohash, encode(45.0, -75.0))
+        
+        upsert_cities([{'name': 'Toronto', 'province': 'Ontario', 'country': 'Canada', 'is_active': True,
+                        'latitude': Decimal('43.653226'), 'longitude': Decimal('-79.383184')}],
+                      fields=('latitude', 'longitude'))
+        self.assertEqual(City.objects.get(name='Toronto').geohash_6, encode(43.653226, -79.383184, 6))
+    
+    def test_bbox_radius_and_nearest(self):
+        """Test each query against the exact answer, and that coarse cells use the level column"""
+        from .spatial import around, in_bbox, nearest, within_radius
+        cities = City.objects.all()
+        self.assertEqual(sorted(city.name for city in in_bbox(cities, City.LOCATION, 43.5, -79.8, 43.8, -79.3)),
+                         ['Brampton', 'Mississauga', 'Toronto'])
+        
+        found = within_radius(cities, City.LOCATION, 43.653226, -79.383184, 35)
+        self.assertEqual([city.name for city, _ in found], ['Toronto', 'Mississauga', 'Brampton'])
+        self.assertEqual(found[0][1], 0)
+        self.assertIn('geohash_4__in', str(around(City.LOCATION, 43.653226, -79.383184, 10)))
+        
+        found = nearest(cities, City.LOCATION, 44.0, -79.5, k=2)
+        self.assertEqual([city.name for city, _ in found], ['Brampton', 'Toronto'])
+        self.assertEqual(nearest(cities, City.LOCATION, 49.0, -85.0, k=1, max_radius_km=50), [])
+    
+    def test_admin_near_search(self):
+        """Test the admin changelist's near: search by place name and by coordinates"""
+        User.objects.create_superuser(username='admin', password='testpass123', full_legal_name='Admin')
+        self.client.login(username='admin', password='testpass123')
+        url = reverse('admin:rides_city_changelist')
+        
+        response = self.client.get(url, {'q': 'near:Toronto 35km'})
+        self.assertEqual(sorted(city.name for city in response.context['cl'].result_list),
+                         ['Brampton', 'Mississauga', 'Toronto'])
+        response = self.client.get(url, {'q': 'near:44.39,-79.69'})
+        self.assertEqual([city.name for city in response.context['cl'].result_list], ['Barrie'])
+        response = self.client.get(url, {'q': 'near:Atlantis'})
+        self.assertEqual(len(response.context['cl'].result_list), 0)
+
+
+class MapTilesTest(TestCase):
+    """Test the clustered GeoJSON map endpoint and its tile cache"""
+    
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.driver = User.objects.create_user(
+            username='mapdriver', password='testpass123', full_legal_name='Map Driver', is_driver=True
+        )
+        self.toronto = City.objects.create(name='Toronto', latitude=Decimal('43.653226'), longitude=Decimal('-79.383184'))
+        self.ottawa = City.objects.create(name='Ottawa', latitude=Decimal('45.421530'), longitude=Decimal('-75.697193'))
+        self.route = Route.objects.create(driver=self.driver, origin_city=self.toronto, destination_city=self.ottawa,
+                                          driver_price=Decimal('50.00'))
+        self.rides = [self.create_ride((43.6453 + n * 0.001, -79.3806)) for n in range(3)]
+        self.client.login(username='mapdriver', password='testpass123')
+        self.url = reverse('rides:api_map')
+    
+    def create_ride(self, pickup):
+        return Ride.objects.create(
+            route=self.route, driver=self.driver, departure_date=date.today() + timedelta(days=1),
+            departure_time=time(8, 0), available_seats=3, price_per_seat=Decimal('40.00'),
+            pickup_city=self.toronto, pickup_location='Union Station', dropoff_city=self.ottawa,
+            dropoff_location='Rideau Centre', pickup_latitude=Decimal(str(pickup[0])),
+            pickup_longitude=Decimal(str(pickup[1])),
+        )
+    
+    def get_map(self, zoom, bbox='-80.0,43.0,-75.0,46.0', **headers):
+        return self.client.get(self.url, {'zoom': zoom, 'bbox': bbox}, **headers)
+    
+    def test_clusters_by_zoom(self):
+        """Test nearby rides cluster when zoomed out and separate when zoomed in"""
+        data = self.get_map(6).json()
+        rides = [f['properties'] for f in data['features'] if f['properties']['layer'] == 'rides']
+        self.assertEqual(rides, [{'layer': 'rides', 'cluster': True, 'count': 3}])
+        cities = sorted(f['properties']['name'] for f in data['features'] if f['properties']['layer'] == 'cities')
+        self.assertEqual(cities, ['Ottawa', 'Toronto'])
+        
+        data = self.get_map(16, bbox='-79.385,43.644,-79.376,43.649').json()
+        ids = sorted(f['properties']['id'] for f in data['features'] if f['properties']['layer'] == 'rides')
+        self.assertEqual(ids, [ride.id for ride in self.rides])
+    
+    def test_etag_and_incremental_invalidation(self):
+        """Test cached tiles answer with 304 and a ride change invalidates only its own tiles"""
+        from .maptiles import generation, tile_cache, tile_key, tile_of
+        from .lifecycle import cancel_rides
+        first = self.get_map(6)
+        etag = first['ETag']
+        with self.assertNumQueries(2):  # Session and user only: every tile comes from the cache
+            self.assertEqual(self.get_map(6, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        
+        rides_tile = tile_key('rides', generation('rides'), 6, *tile_of(43.6453, -79.3806, 6))
+        ottawa_tile = tile_key('cities', generation('cities'), 6, *tile_of(45.42153, -75.697193, 6))
+        with self.captureOnCommitCallbacks(execute=True):
+            cancel_rides([self.rides[0].id], actor=self.driver, reason='test')
+        self.assertIsNone(tile_cache().get(rides_tile))
+        self.assertIsNotNone(tile_cache().get(ottawa_tile))
+        response = self.get_map(6, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        rides = [f['properties'] for f in response.json()['features'] if f['properties']['layer'] == 'rides']
+        self.assertEqual(rides[0]['count'], 2)
+    
+    def test_saved_ride_invalidates_old_and_new_tiles(self):
+        """Test a price change or a moved pickup through Ride.save() drops the tiles showing the ride"""
+        from .maptiles import generation, tile_cache, tile_key, tile_of
+        self.get_map(16, bbox='-79.385,43.644,-79.376,43.649')
+        old_tile = tile_key('rides', generation('rides'), 16, *tile_of(43.6453, -79.3806, 16))
+        self.assertIsNotNone(tile_cache().get(old_tile))
+        
+        ride = Ride.objects.get(pk=self.rides[0].pk)
+        ride.price_per_seat = Decimal('35.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            ride.save()
+        self.assertIsNone(tile_cache().get(old_tile))
+        data = self.get_map(16, bbox='-79.385,43.644,-79.376,43.649').json()
+        prices = {f['properties']['id']: f['properties']['price_per_seat'] for f in data['features']
+                  if f['properties']['layer'] == 'rides'}
+        self.assertEqual(prices[ride.id], '35.00')
+        
+        ride.pickup_latitude, ride.pickup_longitude = Decimal('45.4215'), Decimal('-75.6972')
+        with self.captureOnCommitCallbacks(execute=True):
+            ride.save()
+        self.assertIsNone(tile_cache().get(old_tile))
+        self.assertIsNone(tile_cache().get(
+            tile_key('rides', generation('rides'), 16, *tile_of(45.4215, -75.6972, 16))
+        ))
+    
+    def test_deploy_check_requires_shared_cache(self):
+        """Test check --deploy rejects a per-process tile cache"""
+        from django.core.checks import run_checks
+        errors = run_checks(include_deployment_checks=True, tags=['caches'])
+        self.assertIn('rides.E001', [error.id for error in errors])
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'cache'}}
+        with override_settings(CACHES=shared):
+            errors = run_checks(include_deployment_checks=True, tags=['caches'])
+        self.assertNotIn('rides.E001', [error.id for error in errors])
+    
+    def test_precompute_and_bad_requests(self):
+        """Test the build command fills the cache, and invalid queries are rejected"""
+        from django.core.management import call_command
+        from io import StringIO
+        out = StringIO()
+        call_command('build_map_tiles', '--max-zoom', '8', stdout=out)
+        self.assertIn('Stored', out.getvalue())
+        with self.assertNumQueries(2):  # Session and user: the tiles around Toronto were all precomputed
+            self.assertEqual(self.get_map(8, bbox='-79.4,43.64,-79.37,43.66').status_code, 200)
+        
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'zoom': 6, 'bbox': '1,2,3'}).status_code, 400)
+        self.assertEqual(self.get_map(14, bbox='-80.0,43.0,-75.0,46.0').status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'zoom': 6, 'bbox': '-80,43,-75,46', 'layers': 'x'}).status_code, 400)
@@ -1,7 +1,7 @@
 # rides/urls.py
 
-from django.urls import path
-from . import views
+from django.urls import path, re_path
+from . import api, views
 
 app_name = 'rides'
 
@@ -15,8 +15,15 @@ urlpatterns = [
     # Ride management
     path('create/', views.create_ride, name='create_ride'),
     path('ride/<int:ride_id>/', views.ride_detail, name='ride_detail'),
+    path('ride/<int:ride_id>/cancel/', views.cancel_ride, name='cancel_ride'),
+    path('ride/<int:ride_id>/seats/stream/', views.ride_seats_stream, name='ride_seats_stream'),
     path('my-rides/', views.my_rides, name='my_rides'),
     
+    # Recurring rides
+    path('series/create/', views.create_ride_series, name='create_ride_series'),
+    path('series/<int:series_id>/', views.series_detail, name='series_detail'),
+    path('series/<int:series_id>/cancel/', views.cancel_ride_series, name='cancel_ride_series'),
+    
     # Booking management
     path('booking/<int:booking_id>/', views.booking_detail, name='booking_detail'),
     
@@ -29,4 +36,15 @@ urlpatterns = [
     # API endpoints
     path('api/cities/', views.api_cities, name='api_cities'),
     path('api/validate-location/', views.api_validate_location, name='api_validate_location'),
+    path('api/map/', views.api_map, name='api_map'),
+    
+    # JSON API for the mobile app (see rides/api.py)
+    path('api/v1/rides/', api.search, name='api_v1_search'),
+    path('api/v1/rides/nearby/', api.nearby, name='api_v1_nearby'),
+    path('api/v1/rides/<int:ride_id>/', api.ride_detail, name='api_v1_ride_detail'),
+    path('api/v1/rides/<int:ride_id>/bookings/', api.create_booking, name='api_v1_create_booking'),
+    re_path(r'^api/v1/bookings/(?P<booking_id>[0-9]+)/(?P<action>confirm|reject|cancel)/$',
+        api.update_booking, name='api_v1_update_booking'),
+    path('api/v1/me/rides/', api.my_rides, name='api_v1_my_rides'),
+    path('api/v1/sync/', api.sync_changes, name='api_v1_sync'),
 ]
\ No newline at end of file
@@ -1,15 +1,35 @@
 # rides/views.py
 
+import hashlib
+import logging
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import HttpResponseForbidden, JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
 from django.core.paginator import Paginator
-from django.db.models import Q, Count, Sum
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.db.models import F, Q, Count, Sum
 from django.utils import timezone
-from datetime import date, timedelta
-from .models import Ride, Booking, City, Route, RideReview
+from datetime import date, time, timedelta
+from django.views.decorators.http import require_POST
+from django.core.exceptions import ValidationError
+from .models import Ride, Booking, City, Route, RideReview, RideSeries, combine_departure
+from .forms import RideFilterForm, RideSeriesEditForm, RideSeriesForm
+from . import series as ride_series
+from . import live
+from . import maptiles
+from .conditional import booking_version, conditional_page, ride_version
+from .gazetteer import get_gazetteer
+from .geo import haversine_km
+from .spatial import around
+from .lifecycle import booking_action, cancel_ride as cancel_ride_cascade
+from .search import annotate_results, filter_rides, rank_rides, seats_booked
 from django.conf import settings
+from pointRide.ratelimit import ratelimit
+
+logger = logging.getLogger(__name__)
 
 def home_search(request):
     """
@@ -18,8 +38,8 @@ def home_search(request):
     # Get recent rides to display
     recent_rides = Ride.objects.filter(
         status='ACTIVE',
-        departure_date__gte=date.today()
-    ).select_related('pickup_city', 'dropoff_city', 'driver')[:6]
+        departs_at__gte=timezone.now()
+    ).select_related('pickup_city', 'dropoff_city', 'driver').order_by('departs_at')[:6]
     
     # Get cities for dropdowns
     cities = City.objects.filter(is_active=True).order_by('name')
@@ -35,10 +55,12 @@ def home_search(request):
 def search_rides(request):
     """
     Search and display available rides - WORKING VERSION
+    Optional filters narrow the departs_at range and rank results in SQL
     """
     rides = Ride.objects.none()
     search_performed = False
     cities = City.objects.filter(is_active=True).order_by('name')
+    filter_form = RideFilterForm(request.POST or None)
     
     if request.method == 'POST':
         pickup_city_id = request.POST.get('pickup_city')
@@ -49,14 +71,48 @@ def search_rides(request):
             try:
                 departure_date = date.fromisoformat(departure_date)
                 
+                filters = {}
+                if filter_form.is_valid():
+                    filters = filter_form.cleaned_data
+                else:
+                    messages.error(request, "Some filters were invalid and have been ignored")
+                
+                # The departure window as one half-open departs_at range that
+                # ends after the latest minute (or at midnight); a latest time
+                # before the earliest one wraps past midnight
+                earliest = filters.get('earliest_time') or time.min
+                latest = filters.get('latest_time')
+                window_start = combine_departure(departure_date, earliest)
+                if latest is None:
+                    window_end = combine_departure(departure_date + timedelta(days=1), time.min)
+                else:
+                    end_date = departure_date + timedelta(days=1) if latest < earliest else departure_date
+                    window_end = combine_departure(end_date, latest) + timedelta(minutes=1)
+                
                 rides = Ride.objects.filter(
                     pickup_city_id=pickup_city_id,
                     dropoff_city_id=dropoff_city_id,
-                    departure_date=departure_date,
+                    departs_at__gte=max(window_start, timezone.now()),
+                    departs_at__lt=window_end,
                     status='ACTIVE'
-                ).select_related('pickup_city', 'dropoff_city', 'driver').order_by('departure_time')
+                ).select_related('pickup_city', 'dropoff_city', 'driver')
+                
+                rides = filter_rides(
+                    annotate_results(rides),
+                    max_price=filters.get('max_price'),
+                    min_rating=filters.get('min_rating'),
+                )
+                rides = rank_rides(
+                    rides,
+                    sort=filters.get('sort') or 'best',
+                    preferred_time=filter_form.preferred_time() if filters else None,
+                )
                 
                 search_performed = True
+                logger.debug("Ride search", extra={
+                    'pickup_city_id': pickup_city_id, 'dropoff_city_id': dropoff_city_id,
+                    'date': str(departure_date), 'sort': filters.get('sort') or 'best',
+                })
                 
             except ValueError:
                 messages.error(request, "Invalid date format")
@@ -64,6 +120,7 @@ def search_rides(request):
     context = {
         'rides': rides,
         'cities': cities,
+        'filter_form': filter_form,
         'search_performed': search_performed,
     }
     
@@ -135,10 +192,12 @@ def create_ride(request):
                 notes=notes
             )
             
+            logger.info("Ride created", extra={'ride_id': ride.id, 'driver_id': request.user.pk})
             messages.success(request, f'Ride created successfully! {pickup_city.name} → {dropoff_city.name} on {departure_date}')
             return redirect('rides:ride_detail', ride_id=ride.id)
             
         except (ValueError, City.DoesNotExist) as e:
+            logger.info("Ride creation rejected", extra={'driver_id': request.user.pk, 'error': str(e)})
             messages.error(request, f"Error creating ride: {str(e)}")
             return render(request, 'rides/create_ride.html', context)  # Now consistent!
     
@@ -146,6 +205,7 @@ def create_ride(request):
     return render(request, 'rides/create_ride.html', context)
 
 
+@conditional_page(ride_version, 'ride_id')
 def ride_detail(request, ride_id):
     """
     Display ride details and booking form - ENHANCED VERSION
@@ -187,6 +247,9 @@ def ride_detail(request, ride_id):
                     total_price=seats_booked * ride.price_per_seat,
                     booking_notes=booking_notes
                 )
+                logger.info("Booking requested", extra={
+                    'booking_id': booking.id, 'ride_id': ride.id, 'seats': seats_booked,
+                })
                 messages.success(request, 'Booking request sent successfully! The driver will review your request.')
                 return redirect('rides:booking_detail', booking_id=booking.id)
                 
@@ -197,12 +260,125 @@ def ride_detail(request, ride_id):
         'ride': ride,
         'can_book': can_book,
         'existing_booking': existing_booking,
-        'available_seats_range': range(1, min(5, ride.available_seats_count + 1))
+        'available_seats_range': range(1, min(5, ride.available_seats_count + 1)),
+        # Only ASGI servers can hold the seat stream open
+        'live_seats': isinstance(request, ASGIRequest),
     }
     
     return render(request, 'rides/ride_detail.html', context)
 
+async def ride_seats_stream(request, ride_id):
+    """
+    Server-sent events with seats left and status for a ride (see rides.live)
+    
+    Streams under ASGI only. Under WSGI a worker cannot be held open per
+    client, so the ride page leaves the stream out and this answers 204,
+    which tells an EventSource not to reconnect.
+    """
+    if not await Ride.objects.filter(id=ride_id).aexists():
+        raise Http404("Ride not found")
+    
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    
+    response = StreamingHttpResponse(live.seat_stream(ride_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # stop nginx from buffering the stream
+    return response
+
+@login_required
+@require_POST
+def cancel_ride(request, ride_id):
+    """
+    Cancel a ride (its driver only) together with all of its live bookings
+    """
+    ride = get_object_or_404(Ride, id=ride_id)
+    
+    if request.user != ride.driver:
+        return HttpResponseForbidden("Only the driver can cancel this ride")
+    
+    if cancel_ride_cascade(ride, actor=request.user, reason=request.POST.get('reason', '')):
+        logger.info("Ride cancelled by driver", extra={'ride_id': ride.id, 'driver_id': request.user.pk})
+        messages.success(request, 'Ride cancelled. Travellers with bookings will be notified.')
+    else:
+        messages.error(request, 'This ride can no longer be cancelled.')
+    
+    return redirect('rides:ride_detail', ride_id=ride.id)
+
+@login_required
+def create_ride_series(request):
+    """
+    Post the same ride on chosen weekdays over a date range (drivers only)
+    """
+    if not request.user.is_driver:
+        return HttpResponseForbidden("Only drivers can create rides")
+    
+    form = RideSeriesForm(request.POST or None)
+    if request.method == 'POST' and form.is_valid():
+        try:
+            series, rides = ride_series.create_series(request.user, **form.cleaned_data)
+        except ValidationError as e:
+            form.add_error(None, e)
+        else:
+            logger.info("Ride series created", extra={
+                'series_id': series.id, 'driver_id': request.user.pk, 'rides': len(rides),
+            })
+            messages.success(request, f'{len(rides)} rides created: {series}')
+            return redirect('rides:series_detail', series_id=series.id)
+    
+    return render(request, 'rides/create_series.html', {'form': form})
+
+@login_required
+def series_detail(request, series_id):
+    """
+    A series' rides, with edits applied to all of its upcoming rides at once
+    """
+    series = get_object_or_404(
+        RideSeries.objects.select_related('route__origin_city', 'route__destination_city'), id=series_id
+    )
+    if request.user != series.driver:
+        return HttpResponseForbidden("Only the driver can manage this series")
+    
+    upcoming = ride_series.upcoming_rides(series)
+    next_ride = upcoming.order_by('departs_at').first()
+    initial = {field: getattr(next_ride, field) for field in ride_series.EDITABLE_FIELDS} if next_ride else {}
+    form = RideSeriesEditForm(request.POST or None, initial=initial)
+    
+    if request.method == 'POST' and form.is_valid():
+        changes = {field: form.cleaned_data[field] for field in form.changed_data}
+        updated = ride_series.update_series(series, **changes)
+        logger.info("Ride series updated", extra={
+            'series_id': series.id, 'fields': sorted(changes), 'rides': updated,
+        })
+        messages.success(request, f'{updated} upcoming rides updated.')
+        return redirect('rides:series_detail', series_id=series.id)
+    
+    rides = series.rides.annotate(seats_left=F('available_seats') - seats_booked()).order_by('departs_at')
+    return render(request, 'rides/series_detail.html', {
+        'series': series,
+        'rides': rides,
+        'form': form,
+        'has_upcoming': next_ride is not None,
+    })
+
+@login_required
+@require_POST
+def cancel_ride_series(request, series_id):
+    """
+    Cancel every upcoming ride of a series (its driver only)
+    """
+    series = get_object_or_404(RideSeries, id=series_id)
+    
+    if request.user != series.driver:
+        return HttpResponseForbidden("Only the driver can cancel this series")
+    
+    cancelled = ride_series.cancel_series(series, actor=request.user, reason=request.POST.get('reason', ''))
+    logger.info("Ride series cancelled", extra={'series_id': series.id, 'rides': cancelled})
+    messages.success(request, f'Series cancelled: {cancelled} upcoming rides. Travellers with bookings will be notified.')
+    return redirect('rides:series_detail', series_id=series.id)
+
 @login_required
+@conditional_page(booking_version, 'booking_id')
 def booking_detail(request, booking_id):
     """
     Display booking details - ENHANCED VERSION with better seat tracking
@@ -216,34 +392,20 @@ def booking_detail(request, booking_id):
     # Handle booking actions
     if request.method == 'POST':
         action = request.POST.get('action')
+        refused = booking_action(booking, request.user, action)
         
-        if action == 'confirm' and request.user == booking.ride.driver and booking.status == 'PENDING':
-            # Check if there are enough seats available (using fixed calculation)
-            current_available = booking.ride.available_seats_count
-            if booking.seats_booked <= current_available:
-                booking.status = 'CONFIRMED'
-                booking.confirmed_at = timezone.now()
-                booking.save()
-                
-                # Check if ride is now full (using fixed calculation)
-                if booking.ride.available_seats_count <= 0:
-                    booking.ride.status = 'FULL'
-                    booking.ride.save()
-                
-                messages.success(request, f'Booking confirmed for {booking.traveller.full_legal_name}! {booking.seats_booked} seat(s) booked.')
-            else:
-                messages.error(request, f'Not enough seats available! Only {current_available} seats left.')
-                
-        elif action == 'reject' and request.user == booking.ride.driver and booking.status == 'PENDING':
-            booking.status = 'CANCELLED'
-            booking.save()
+        if refused is None and action == 'confirm':
+            messages.success(request, f'Booking confirmed for {booking.traveller.full_legal_name}! {booking.seats_booked} seat(s) booked.')
+        elif refused is None and action == 'reject':
             messages.success(request, 'Booking rejected!')
-            
-        elif action == 'cancel' and request.user == booking.traveller and booking.status == 'PENDING':
-            booking.status = 'CANCELLED'
-            booking.save()
+        elif refused is None:
             messages.success(request, 'Booking cancelled!')
+        elif refused == 'no_seats':
+            messages.error(request, f'Not enough seats available! Only {booking.ride.available_seats_count} seats left.')
         
+        logger.info("Booking action", extra={
+            'booking_id': booking.id, 'action': action, 'status': booking.status, 'user_id': request.user.pk,
+        })
         return redirect('rides:booking_detail', booking_id=booking.id)
     
     return render(request, 'rides/booking_detail.html', {'booking': booking})
@@ -286,7 +448,8 @@ def route_map(request):
     if not request.user.is_driver:
         return HttpResponseForbidden("Only drivers can access route planning")
     
-    cities = City.objects.filter(is_active=True).order_by('name')
+    # For the origin/destination pickers; the map loads its markers from api_map
+    cities = City.objects.filter(is_active=True).order_by('name').only('id', 'name', 'latitude', 'longitude')
     user_routes = Route.objects.filter(driver=request.user).select_related('origin_city', 'destination_city')
     
     # Note: Route creation is now handled directly in create_ride view
@@ -314,6 +477,7 @@ def leave_review(request, ride_id):
 
 # API endpoints
 @login_required
+@ratelimit('api_cities', '120/m', keys=('user_or_ip',), methods=('GET',))
 def api_cities(request):
     """
     API endpoint to get cities for autocomplete
@@ -327,29 +491,100 @@ def api_cities(request):
     data = [{'id': city.id, 'name': city.name} for city in cities]
     return JsonResponse(data, safe=False)
 
+def served_city(gazetteer, place):
+    """
+    The active City serving a gazetteer place, in one query: the place itself,
+    its municipality, or failing those the nearest city within SERVICE_RADIUS_KM.
+    """
+    names = [gazetteer.name(place), gazetteer.name(gazetteer.municipality(place))]
+    latitude, longitude = gazetteer.coordinates(place)
+    radius = settings.SERVICE_RADIUS_KM
+    candidates = list(City.objects.filter(is_active=True).filter(
+        Q(name__in=names) | around(City.LOCATION, latitude, longitude, radius)
+    ))
+    for name in names:
+        for city in candidates:
+            if city.name == name:
+                return city
+    distances = [
+        (haversine_km(latitude, longitude, float(city.latitude), float(city.longitude)), city.name, city)
+        for city in candidates if city.latitude is not None and city.longitude is not None
+    ]
+    distances = [entry for entry in distances if entry[0] <= radius]
+    return min(distances, key=lambda entry: entry[:2])[2] if distances else None
+
+def validate_ontario_location(location):
+    """
+    (is valid, serving City or None, error or None) for a free-text location.
+
+    The place is resolved offline with the gazetteer; only the serving City
+    is read from the database.
+    """
+    location = (location or '').strip()
+    if not location:
+        return False, None, "Location cannot be empty"
+    gazetteer = get_gazetteer()
+    if gazetteer.outside_ontario(location):
+        return False, None, "We currently only provide service in Ontario, Canada."
+    place = gazetteer.find(location)
+    if place is None:
+        return False, None, "We don't serve that location yet. Try the nearest city or town."
+    city = served_city(gazetteer, place)
+    if city is None:
+        return False, None, f"We don't serve that location yet: no pickup city near {gazetteer.name(place)}."
+    return True, city, None
+
 @login_required
+@ratelimit('api_validate_location', '60/m', keys=('user_or_ip',), methods=('GET',))
 def api_validate_location(request):
     """
-    API endpoint for location validation - ENHANCED VERSION
+    API endpoint for location validation
     """
-    location = request.GET.get('location', '')
-    
-    # Basic Ontario validation
-    ontario_keywords = ['ontario', 'on', 'canada', 'ca']
-    is_ontario = any(keyword in location.lower() for keyword in ontario_keywords)
+    is_valid, city, error = validate_ontario_location(request.GET.get('location', ''))
+    return JsonResponse({
+        'is_valid': is_valid,
+        'nearest_city': city.name if city else None,
+        'error': error,
+    })
+
+# Tiles one map request may span; a full-screen view needs about 40
+MAP_MAX_TILES = 64
+
+@login_required
+@ratelimit('api_map', '120/m', keys=('user_or_ip',), methods=('GET',))
+def api_map(request):
+    """
+    Clustered GeoJSON for a map view: ?zoom=&bbox=west,south,east,north&layers=rides,cities
+
+    The features come from cached tiles (rides.maptiles); the ETag is derived
+    from theirs, so an unchanged view is answered with 304.
+    """
+    try:
+        zoom = int(request.GET['zoom'])
+        west, south, east, north = (float(value) for value in request.GET['bbox'].split(','))
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'zoom and bbox=west,south,east,north are required'}, status=400)
+    layers = [layer for layer in request.GET.get('layers', 'rides,cities').split(',') if layer]
+    if not layers or set(layers) - set(maptiles.LAYERS):
+        return JsonResponse({'error': f"layers must be among: {', '.join(maptiles.LAYERS)}"}, status=400)
+    if zoom < 0 or south > north or west > east:
+        return JsonResponse({'error': 'Invalid zoom or bbox'}, status=400)
     
-    # Find nearest city
-    nearest_city = None
-    if location:
-        city_match = City.objects.filter(
-            name__icontains=location.split(',')[0].strip(),
-            is_active=True
-        ).first()
-        if city_match:
-            nearest_city = city_match.name
+    zoom = min(zoom, maptiles.MAX_ZOOM)
+    south, north = max(south, -maptiles.MAX_LATITUDE), min(north, maptiles.MAX_LATITUDE)
+    west, east = max(west, -180.0), min(east, 180.0)
+    tiles = maptiles.tiles_covering(south, west, north, east, zoom)
+    if len(tiles) > MAP_MAX_TILES:
+        return JsonResponse({'error': 'Area too large for this zoom level'}, status=400)
     
-    return JsonResponse({
-        'is_valid': is_ontario,
-        'nearest_city': nearest_city,
-        'error': None if is_ontario else 'Location must be in Ontario, Canada'
-    })
\ No newline at end of file
+    parts = [part for layer in layers for part in maptiles.get_tiles(layer, zoom, tiles)]
+    digest = hashlib.md5('|'.join(tag for tag, _ in parts).encode(), usedforsecurity=False).hexdigest()
+    etag = f'"{digest}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        features = ','.join(body for _, body in parts if body)
+        response = HttpResponse(f'{{"type":"FeatureCollection","features":[{features}]}}',
+                                content_type='application/geo+json')
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -99,7 +99,7 @@ def check_models():
         print_success(f"City model working - {city_count} cities found")
         
         if city_count == 0:
-            print_warning("No cities found - run 'python manage.py populate_verified_cities'")
+            print_warning("No cities found - run 'python manage.py load_cities'")
         
         route_count = Route.objects.count()
         print_info(f"Route model working - {route_count} routes found")
@@ -6,7 +6,7 @@ import django
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pointRide.settings')
 django.setup()
 
-from rides.views import enhanced_ontario_validation, quick_ontario_check
+from rides.views import validate_ontario_location
 
 def test_location_validation():
     """Test the location validation algorithm"""
@@ -34,7 +34,7 @@ def test_location_validation():
         ("Hamilton ON", "Should find Hamilton"),
     ]
     
-    print("\n🔍 Testing Enhanced Ontario Validation:")
+    print("\n🔍 Testing Ontario Validation:")
     print("-" * 40)
     
     for location, expected in test_cases:
@@ -42,48 +42,16 @@ def test_location_validation():
         print(f"Expected: {expected}")
         
         try:
-            is_valid, nearest_city, distance, error = enhanced_ontario_validation(location)
+            is_valid, city, error = validate_ontario_location(location)
             
             if is_valid:
-                city_name = nearest_city.name if nearest_city else "None"
-                distance_str = f"{distance}km" if distance else "0km"
-                print(f"✅ VALID: {city_name} ({distance_str})")
+                print(f"✅ VALID: served from {city.name}")
             else:
                 print(f"❌ INVALID: {error}")
                 
         except Exception as e:
             print(f"🔥 ERROR: {str(e)}")
     
-    print("\n" + "=" * 50)
-    print("🚀 Quick Ontario Check Tests:")
-    print("-" * 40)
-    
-    quick_test_cases = [
-        "Toronto",
-        "Tor",
-        "Ottawa",
-        "Quebec",
-        "Hamilton",
-        "",
-    ]
-    
-    for location in quick_test_cases:
-        print(f"\nQuick test: '{location}'")
-        try:
-            is_valid, suggested_cities, error = quick_ontario_check(location)
-            
-            if is_valid:
-                cities = [c.name for c in suggested_cities[:3]]
-                print(f"✅ VALID: Suggestions - {cities}")
-            else:
-                print(f"❌ INVALID: {error}")
-                if suggested_cities:
-                    cities = [c.name for c in suggested_cities[:3]]
-                    print(f"   Suggestions: {cities}")
-                    
-        except Exception as e:
-            print(f"🔥 ERROR: {str(e)}")
-    
     print("\n" + "=" * 50)
     print("✅ Location validation algorithm testing complete!")
     print("\n💡 Next steps:")